@@ -0,0 +1,127 @@
+#Copyright 2024 Politecnico di Torino.
+#
+#File: batch.py
+#Description: Generate the plots of many area reports in parallel
+
+
+import argparse
+import copy
+import glob
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from . import main as area_plot
+
+
+def get_args(argv = None):
+  parser = argparse.ArgumentParser(prog = 'area-plot batch', description = 'Generate the plots of many area reports in parallel. The plots of each report are stored in a subdirectory of --out-dir.')
+  parser.add_argument('reports', type = str, nargs = '*', help = 'Report files or glob patterns, e.g. "runs/*/area.rpt"')
+  parser.add_argument('--manifest', type = str, help = 'File listing one report path or glob pattern per line')
+  parser.add_argument('--workers', '-j', type = int, help = 'Number of worker processes (default: number of CPUs)', default = os.cpu_count())
+  parser.add_argument('--chunksize', type = int, help = 'Number of reports sent to a worker at once', default = 1)
+  area_plot.add_plot_arguments(parser)
+  args = parser.parse_args(argv)
+  if not args.reports and not args.manifest:
+    parser.error('no report given, list the reports or use --manifest')
+  return args
+
+
+def collect_reports(patterns, manifest = None):
+  '''
+  Expand the report paths and glob patterns, removing duplicates
+  @param patterns: list of str. Report files or glob patterns
+  @param manifest: str. File listing one report or glob pattern per line, '#' starts a comment
+  @return: list of str. Report files, in the given order
+  '''
+  patterns = list(patterns)
+  if manifest is not None:
+    with open(manifest) as file:
+      base_dir = os.path.dirname(manifest)
+      for line in file:
+        line = line.split('#', 1)[0].strip()
+        if line:
+          patterns.append(os.path.join(base_dir, line))
+  reports = []
+  for pattern in patterns:
+    matches = sorted(glob.glob(pattern, recursive=True))
+    reports += matches if matches else [pattern]
+  return list(dict.fromkeys(os.path.normpath(report) for report in reports))
+
+
+def report_out_dir(report, reports, out_dir):
+  '''
+  @param report: str. Report file
+  @param reports: list of str. All the reports of the batch
+  @param out_dir: str. Output directory of the batch
+  @return: str. Output directory of the report, mirroring the report path relative to the common directory
+  '''
+  common = os.path.commonpath([os.path.abspath(os.path.dirname(r)) for r in reports])
+  rel_path = os.path.relpath(os.path.abspath(report), common)
+  rel_path, ext = os.path.splitext(rel_path)
+  # Compressed reports are named after the uncompressed one, e.g. area.rpt.gz
+  from .report_parser import COMPRESSIONS
+  if any(ext.lower() in extensions for _, extensions in COMPRESSIONS.values()):
+    rel_path = os.path.splitext(rel_path)[0]
+  return os.path.join(out_dir, rel_path)
+
+
+def process_report(job):
+  '''
+  Generate the plots of one report, executed in the worker processes
+  @param job: tuple. Report file and argparse.Namespace with the plot options
+  @return: tuple. Report file, elapsed seconds and error message (None on success)
+  '''
+  filename, args = job
+  start = time.perf_counter()
+  try:
+    area_plot.run(args)
+    error = None
+  except Exception as e:
+    error = f'{type(e).__name__}: {e}'
+    traceback.print_exc()
+  return filename, time.perf_counter() - start, error
+
+
+def run_batch(reports, args):
+  '''
+  Generate the plots of all the reports over a pool of processes
+  @param reports: list of str. Report files
+  @param args: argparse.Namespace. Options as returned by get_args
+  @return: list of tuple. Report file, elapsed seconds and error message of each report
+  '''
+  jobs = []
+  for report in reports:
+    job_args = copy.copy(args)
+    job_args.filename = report
+    job_args.load_from_csv = None
+    job_args.show = False
+    job_args.out_dir = report_out_dir(report, reports, args.out_dir)
+    jobs.append((report, job_args))
+  if args.workers <= 1:
+    return [process_report(job) for job in jobs]
+  with ProcessPoolExecutor(max_workers = args.workers) as executor:
+    return list(executor.map(process_report, jobs, chunksize = args.chunksize))
+
+
+def print_summary(results, wall_time):
+  '''
+  @param results: list of tuple. Report file, elapsed seconds and error message of each report
+  @param wall_time: float. Elapsed seconds of the whole batch
+  '''
+  width = max([len(report) for report, _, _ in results] + [len('report')])
+  print(f"\n{'report':<{width}}  {'seconds':>9}  status")
+  for report, seconds, error in results:
+    print(f"{report:<{width}}  {seconds:>9.3f}  {error if error else 'ok'}")
+  failed = sum(1 for _, _, error in results if error)
+  print(f"{len(results)} reports, {failed} failed, {wall_time:.3f} s")
+
+
+def main(argv = None):
+  args = get_args(argv)
+  reports = collect_reports(args.reports, args.manifest)
+  start = time.perf_counter()
+  results = run_batch(reports, args)
+  print_summary(results, time.perf_counter() - start)
+  return 1 if any(error for _, _, error in results) else 0
@@ -0,0 +1,332 @@
+#Copyright 2024 Politecnico di Torino.
+#
+#File: bench.py
+#Description: Benchmarks of the area report processing pipeline
+
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from . import report_gen
+from . import report_parser
+from .profiler import peak_rss_mb
+
+
+# Extension of the synthetic reports compressed with each compression
+EXTENSIONS = {'none': '', 'gzip': '.gz', 'xz': '.xz', 'bz2': '.bz2', 'zstd': '.zst'}
+
+
+def compress_report(filename, compression):
+  '''
+  @param filename: str. Name of the report to compress, kept
+  @param compression: str. Compression among EXTENSIONS
+  @return: str. Name of the compressed report, written next to the report
+  '''
+  if compression == 'none':
+    return filename
+  compressed = filename + EXTENSIONS[compression]
+  if not os.path.exists(compressed):
+    if compression == 'zstd':
+      subprocess.run(['zstd', '-q', '-k', '-f', filename, '-o', compressed], check=True)
+    else:
+      import bz2, gzip, lzma
+      module = {'gzip': gzip, 'xz': lzma, 'bz2': bz2}[compression]
+      with open(filename, 'rb') as src, module.open(compressed, 'wb') as dst:
+        for chunk in iter(lambda: src.read(1 << 20), b''):
+          dst.write(chunk)
+  return compressed
+
+
+def bench_parser(n_lines, work_dir, use_mmap=False, repeat=1, fmt='dc', compression='none'):
+  '''
+  Measure the throughput of the report parser on a synthetic report.
+  @param n_lines: int. Number of instances of the synthetic report, about its number of lines for DC reports
+  @param work_dir: str. Directory where to write the synthetic report
+  @param use_mmap: bool. Parse through a memory map instead of buffered reads
+  @param repeat: int. Number of runs, the fastest one is reported
+  @param fmt: str. Format of the report, among report_gen.WRITERS
+  @param compression: str. Compression of the report, among EXTENSIONS
+  @return: dict. Lines, bytes (uncompressed), seconds, read (and decompression)
+  seconds, parse seconds, lines/s and MB/s of the fastest run
+  '''
+  filename = os.path.join(work_dir, f'synthetic_{n_lines}.{fmt}.rpt')
+  if not os.path.exists(filename):
+    report_gen.write_report(filename, n_lines, fmt=fmt)
+  size = os.path.getsize(filename)
+  with open(filename, 'rb') as file:
+    lines = sum(1 for _ in file)
+  filename = compress_report(filename, compression)
+  best = {'time': float('inf')}
+  for _ in range(repeat):
+    stats = {}
+    report_parser.parse_report(filename, use_mmap, fmt, stats)
+    if stats['time'] < best['time']:
+      best = stats
+  seconds = best['time']
+  return {'lines': lines, 'bytes': size, 'seconds': seconds, 'read_seconds': best['read_time'], 'parse_seconds': best['parse_time'],
+          'lines_per_s': lines / seconds, 'mb_per_s': size / seconds / 1e6}
+
+
+# Modules the CLI must not import at startup, see area_plot.main
+HEAVY_MODULES = ['plotly', 'pandas', 'kaleido', 'regex', 'numpy']
+# Maximum import time of the CLI in milliseconds
+STARTUP_BUDGET_MS = 150
+
+
+def bench_startup(module='area_plot.main', repeat=5):
+  '''
+  Measure the cold import time of a module through python -X importtime.
+  @param module: str. Module to import
+  @param repeat: int. Number of runs, the fastest one is reported
+  @return: dict. Seconds of the fastest import and heavy modules it imports
+  '''
+  src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+  env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [src_dir, os.environ.get('PYTHONPATH')])))
+  best = float('inf')
+  for _ in range(repeat):
+    # Run from src, where the area_plot.py script at the root of the repo does not shadow the package
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          env=env, cwd=src_dir, capture_output=True, text=True, check=True)
+    # import time: self [us] | cumulative | imported package
+    imported = {}
+    for line in proc.stderr.splitlines():
+      if line.startswith('import time:') and '|' in line:
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit():
+          imported[name.strip()] = int(cumulative)
+    best = min(best, imported[module] / 1e6)
+  heavy = sorted(name for name in imported if name.split('.')[0] in HEAVY_MODULES and '.' not in name)
+  return {'seconds': best, 'heavy': heavy}
+
+
+def check_startup(budget_ms, repeat=5):
+  '''
+  Check that the CLI starts within the budget without importing heavy modules
+  @param budget_ms: float. Maximum import time of area_plot.main in milliseconds
+  @param repeat: int. Number of runs, the fastest one is checked
+  @return: int. 0 if the check passes, 1 otherwise
+  '''
+  res = bench_startup('area_plot.main', repeat)
+  print(f"area_plot.main import: {res['seconds'] * 1e3:.1f} ms (budget {budget_ms:.0f} ms)")
+  failed = False
+  if res['heavy']:
+    print(f"heavy modules imported at startup: {', '.join(res['heavy'])}")
+    failed = True
+  if res['seconds'] * 1e3 > budget_ms:
+    print("startup time above the budget")
+    failed = True
+  return 1 if failed else 0
+
+
+def check_parser(fmt, work_dir, n_instances=2000, fanout=3):
+  '''
+  Check a parser backend against the hierarchy of a synthetic report. The report
+  is written by report_gen, so this only checks that the backend keeps up with the
+  generator at scale; the parsing of real reports is tested on the reports of
+  tests/data, see tests/test_report_parser.py
+  @param fmt: str. Format of the report, among report_gen.WRITERS
+  @param work_dir: str. Directory where to write the synthetic report
+  @param n_instances: int. Number of instances of the synthetic report
+  @param fanout: int. Number of children of each internal instance
+  @return: list of str. Mismatches found, empty if the backend is correct
+  '''
+  filename = os.path.join(work_dir, f'synthetic_{n_instances}.{fmt}.rpt')
+  report_gen.write_report(filename, n_instances, fanout, fmt=fmt)
+  errors = []
+  detected = report_parser.sniff_report(filename)
+  if detected != fmt:
+    errors.append(f'detected as {detected}')
+  columns = report_parser.parse_report(filename, fmt=fmt)
+  _, area, _, _ = report_gen.generate_hierarchy(n_instances, fanout)
+  nodes = [(node, path) for node, _, _, path in report_gen.iter_preorder(n_instances, fanout, 'top')]
+  if len(columns['path']) != n_instances:
+    return errors + [f'{len(columns["path"])} instances instead of {n_instances}']
+  # Yosys does not report the instance names, only the structure is checked
+  paths = [path for _, path in nodes]
+  if fmt == 'yosys':
+    depth = lambda paths: [path.count('/') + (path != paths[0]) for path in paths]
+    if depth(columns['path']) != depth(paths):
+      errors.append('hierarchy mismatch')
+  elif columns['path'] != paths:
+    errors.append('path mismatch')
+  expected = area[[node for node, _ in nodes]]
+  if not np.allclose(columns['value'], expected, rtol=0, atol=1e-3):
+    errors.append(f'area mismatch, max error {np.abs(columns["value"] - expected).max():.6f}')
+  for name, column in columns.items():
+    if name != 'path' and len(column) != n_instances:
+      errors.append(f'column {name} has {len(column)} rows')
+  return errors
+
+
+# Stages of the processing pipeline of area_plot.main.run, in order
+PIPELINE_STAGES = ['parse', 'rename_duplicates', 'compute_stats', 'hierarchical_metrics', 'plot_threshold',
+                   'remove_wrappers', 'level_of_detail', 'assign_colors', 'figure']
+
+
+def run_pipeline(filename, max_levels_hier=4, threshold=0.01):
+  '''
+  Run the stages of the processing pipeline on a report, timing each of them.
+  Run it in a fresh process (see bench_pipeline) for the peak RSS to be meaningful.
+  @param filename: str. Name of the report
+  @param max_levels_hier: int. Levels kept by the level of detail stage
+  @param threshold: float. Threshold of the plot_threshold stage
+  @return: list of dict. Stage, seconds and peak RSS in MB of the process after the stage
+  '''
+  from . import main as area_plot
+  from . import utils_area as utils
+  # Imported before timing, the figure stage measures only the figure
+  import plotly.graph_objects  # noqa: F401
+  results = []
+  def stage(name, function, *params):
+    start = time.perf_counter()
+    # The stages report their progress, keep the output machine readable
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+      out = function(*params)
+    results.append({'stage': name, 'seconds': time.perf_counter() - start, 'peak_rss_mb': peak_rss_mb()})
+    return out
+  df = stage('parse', utils.get_df_from_report, filename)
+  top_module = df['id'].iloc[0]
+  df = stage('rename_duplicates', utils.rename_duplicates, df, top_module)
+  stage('compute_stats', utils.compute_stats, df)
+  df = stage('hierarchical_metrics', utils.hierarchical_metrics, df)
+  df = stage('plot_threshold', utils.plot_threshold, df, top_module, threshold)
+  df = stage('remove_wrappers', utils.remove_wrappers, df)
+  df = stage('level_of_detail', utils.level_of_detail, df, top_module, max_levels_hier)
+  df = stage('assign_colors', utils.assign_colors, df, top_module, area_plot.DEFAULT_COLORMAP)
+  stage('figure', area_plot.treemap_figure, df, top_module, max_levels_hier, 'total', area_plot.DEFAULT_COLORMAP)
+  return results
+
+
+def bench_pipeline(n_instances, work_dir, fanout=4, depth=None, duplicate_ratio=1.0, wrapper_ratio=0.0, seed=0):
+  '''
+  Time the stages of the processing pipeline on a synthetic report, in a fresh process
+  @param n_instances: int. Number of instances of the synthetic report
+  @param work_dir: str. Directory where to write the synthetic report
+  @param fanout, depth, duplicate_ratio, wrapper_ratio, seed: shape of the synthetic report, see report_gen.write_report
+  @return: list of dict. Instances, stage, seconds and peak RSS in MB after the stage
+  '''
+  shape = f'{fanout if depth is None else f"d{depth}"}_{duplicate_ratio:g}_{wrapper_ratio:g}_{seed}'
+  filename = os.path.join(work_dir, f'pipeline_{n_instances}_{shape}.rpt')
+  if not os.path.exists(filename):
+    report_gen.write_report(filename, n_instances, fanout, seed, depth=depth, duplicate_ratio=duplicate_ratio, wrapper_ratio=wrapper_ratio)
+  src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+  env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [src_dir, os.environ.get('PYTHONPATH')])))
+  proc = subprocess.run([sys.executable, '-m', 'area_plot.bench', '--pipeline-worker', filename],
+                        env=env, capture_output=True, text=True, check=True)
+  results = json.loads(proc.stdout.splitlines()[-1])
+  return [{'instances': n_instances, **res} for res in results]
+
+
+def git_commit():
+  '''
+  @return: str. Commit of the source tree, None if not in a git repository
+  '''
+  try:
+    proc = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                          capture_output=True, text=True, check=True)
+    return proc.stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def print_pipeline(results, baseline=None):
+  '''
+  Print the pipeline results, and the ratio with the baseline results if given
+  @param results: list of dict. Results of bench_pipeline
+  @param baseline: list of dict. Results of a previous run, e.g. of another commit
+  '''
+  before = {(res['instances'], res['stage']): res for res in baseline} if baseline else {}
+  header = f"{'instances':>10}  {'stage':<22}  {'seconds':>9}  {'peak RSS MB':>11}"
+  print(header + (f"  {'baseline s':>10}  {'ratio':>6}" if baseline else ''))
+  for res in results:
+    rss = f"{res['peak_rss_mb']:>11.1f}" if res['peak_rss_mb'] is not None else f"{'-':>11}"
+    line = f"{res['instances']:>10}  {res['stage']:<22}  {res['seconds']:>9.3f}  {rss}"
+    old = before.get((res['instances'], res['stage']))
+    if old is not None:
+      line += f"  {old['seconds']:>10.3f}  {res['seconds'] / old['seconds'] if old['seconds'] > 0 else float('nan'):>6.2f}"
+    print(line)
+
+
+def get_args(argv = None):
+  parser = argparse.ArgumentParser(prog = 'area-plot bench', description = 'Benchmark the area report processing on synthetic reports: time each stage of the pipeline (default), or the parser throughput with --parser')
+  parser.add_argument('--instances', type = int, nargs = '+', help = 'Sizes of the synthetic hierarchies of the pipeline benchmark', default = [1_000, 100_000, 1_000_000])
+  parser.add_argument('--fanout', type = int, help = 'Number of children of each internal instance of the synthetic hierarchies', default = 4)
+  parser.add_argument('--depth', type = int, help = 'Number of levels of the synthetic hierarchies, sets the fanout')
+  parser.add_argument('--duplicate-ratio', type = float, help = 'Share of the instances with a name shared with their cousins', default = 1.0)
+  parser.add_argument('--wrapper-ratio', type = float, help = 'Share of the internal instances named as wrappers', default = 0.05)
+  parser.add_argument('--seed', type = int, help = 'Seed of the synthetic hierarchies', default = 0)
+  parser.add_argument('--output', type = str, help = 'Write the pipeline results to this JSON file')
+  parser.add_argument('--compare', type = str, help = 'JSON results of a previous run to compare with, e.g. of another commit')
+  parser.add_argument('--pipeline-worker', type = str, help = argparse.SUPPRESS)
+  parser.add_argument('--parser', action = 'store_true', help = 'Measure the parser throughput instead')
+  parser.add_argument('--lines', type = int, nargs = '+', help = 'Sizes of the synthetic reports in lines', default = [10_000, 1_000_000, 10_000_000])
+  parser.add_argument('--work-dir', type = str, help = 'Directory where to keep the synthetic reports (default: temporary directory)')
+  parser.add_argument('--mmap', action = 'store_true', help = 'Parse through a memory map')
+  parser.add_argument('--repeat', type = int, help = 'Number of runs per size of the parser and startup benchmarks, the fastest one is reported', default = 3)
+  parser.add_argument('--report-formats', type = str, nargs = '+', choices = list(report_gen.WRITERS), help = 'Formats of the synthetic reports', default = ['dc'])
+  parser.add_argument('--compressions', type = str, nargs = '+', choices = list(EXTENSIONS), help = 'Compressions of the synthetic reports, zstd requires the zstd command', default = ['none'])
+  parser.add_argument('--check', action = 'store_true', help = 'Check the parser backends against the synthetic hierarchy instead, exit with an error on mismatches')
+  parser.add_argument('--startup', action = 'store_true', help = 'Check the startup time of the CLI instead, exit with an error if above --startup-budget')
+  parser.add_argument('--startup-budget', type = float, help = 'Maximum import time of the CLI in milliseconds', default = STARTUP_BUDGET_MS)
+  return parser.parse_args(argv)
+
+
+def main(argv = None):
+  args = get_args(argv)
+  if args.pipeline_worker:
+    print(json.dumps(run_pipeline(args.pipeline_worker)))
+    return 0
+  if args.startup:
+    return check_startup(args.startup_budget, args.repeat)
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    work_dir = args.work_dir if args.work_dir else tmp_dir
+    os.makedirs(work_dir, exist_ok=True)
+    if args.check:
+      failed = False
+      for fmt in report_gen.WRITERS:
+        errors = check_parser(fmt, work_dir)
+        print(f"{fmt:<8}  {'; '.join(errors) if errors else 'ok'}")
+        failed |= bool(errors)
+      return 1 if failed else 0
+    if not args.parser:
+      baseline = None
+      if args.compare:
+        with open(args.compare) as file:
+          baseline = json.load(file)['results']
+      results = []
+      for n_instances in args.instances:
+        results += bench_pipeline(n_instances, work_dir, args.fanout, args.depth, args.duplicate_ratio, args.wrapper_ratio, args.seed)
+      print_pipeline(results, baseline)
+      if args.output:
+        with open(args.output, 'w') as file:
+          json.dump({
+            'commit': git_commit(),
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'shape': {'fanout': args.fanout, 'depth': args.depth, 'duplicate_ratio': args.duplicate_ratio,
+                      'wrapper_ratio': args.wrapper_ratio, 'seed': args.seed},
+            'results': results,
+          }, file, indent=2)
+        print(f"Results written to {args.output}")
+      return 0
+    print(f"{'format':<8}  {'compress':<8}  {'lines':>12}  {'MB':>9}  {'seconds':>9}  {'read s':>9}  {'parse s':>9}  {'lines/s':>12}  {'MB/s':>8}")
+    for fmt in args.report_formats:
+      for compression in args.compressions:
+        for n_lines in args.lines:
+          res = bench_parser(n_lines, work_dir, args.mmap, args.repeat, fmt, compression)
+          print(f"{fmt:<8}  {compression:<8}  {res['lines']:>12}  {res['bytes'] / 1e6:>9.1f}  {res['seconds']:>9.3f}  {res['read_seconds']:>9.3f}  {res['parse_seconds']:>9.3f}  {res['lines_per_s']:>12.0f}  {res['mb_per_s']:>8.1f}")
+
+
+if __name__ == '__main__':
+  sys.exit(main())
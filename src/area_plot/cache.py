@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+from .report_parser import PARSER_VERSION
+
+try:
+  import pyarrow  # noqa: F401
+  CACHE_FORMAT = 'parquet'
+except ImportError:
+  CACHE_FORMAT = 'pkl'
+
+
+def default_cache_dir():
+  '''
+  @return: str. $XDG_CACHE_HOME/area-plot, or ~/.cache/area-plot
+  '''
+  base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+  return os.path.join(base, 'area-plot')
+
+
+def file_digest(filename, chunk_size=1 << 20):
+  '''
+  @param filename: str. Name of the file to hash
+  @param chunk_size: int. Size of the chunks read from the file
+  @return: str. BLAKE2b digest of the file content
+  '''
+  digest = hashlib.blake2b(digest_size=16)
+  with open(filename, 'rb') as file:
+    for chunk in iter(lambda: file.read(chunk_size), b''):
+      digest.update(chunk)
+  return digest.hexdigest()
+
+
+class ReportCache:
+  '''
+  On-disk cache of the parsed hierarchy of the area reports.
+  Entries are stored as Parquet files (pickle if pyarrow is not installed) keyed
+  by the content hash of the report, the parser version and the processing
+  options. The content hash is recomputed only when the path, size or mtime of
+  the report change. The least recently used entries are evicted once the
+  cache grows above max_size bytes.
+  '''
+
+  def __init__(self, cache_dir=None, max_size=2 << 30):
+    '''
+    @param cache_dir: str. Directory of the cache (default: default_cache_dir())
+    @param max_size: int. Maximum size of the cache in bytes
+    '''
+    self.cache_dir = cache_dir if cache_dir else default_cache_dir()
+    self.max_size = max_size
+    self.index_path = os.path.join(self.cache_dir, 'index.json')
+
+  def _load_index(self):
+    try:
+      with open(self.index_path) as file:
+        return json.load(file)
+    except (OSError, ValueError):
+      return {}
+
+  def _store_index(self, index):
+    def write(path):
+      with open(path, 'w') as file:
+        json.dump(index, file)
+    self._atomic_write(self.index_path, write)
+
+  def _atomic_write(self, path, write):
+    os.makedirs(self.cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+    os.close(fd)
+    try:
+      write(tmp_path)
+      os.replace(tmp_path, path)
+    except BaseException:
+      os.remove(tmp_path)
+      raise
+
+  def key(self, filename, **options):
+    '''
+    @param filename: str. Name of the report
+    @param options: processing options affecting the cached content
+    @return: str. Key of the cache entry of the report
+    '''
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    index = self._load_index()
+    entry = index.get(path)
+    if entry is None or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+      entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': file_digest(path)}
+      index[path] = entry
+      self._store_index(index)
+    fields = [entry['digest'], f'v{PARSER_VERSION}'] + [f'{k}={options[k]}' for k in sorted(options)]
+    return hashlib.blake2b('|'.join(fields).encode(), digest_size=16).hexdigest()
+
+  def _entry_path(self, key):
+    return os.path.join(self.cache_dir, f'{key}.{CACHE_FORMAT}')
+
+  def load(self, key):
+    '''
+    @param key: str. Key of the cache entry
+    @return: pd.DataFrame, or None if the entry is not cached
+    '''
+    path = self._entry_path(key)
+    try:
+      df = pd.read_parquet(path) if CACHE_FORMAT == 'parquet' else pd.read_pickle(path)
+      # Refresh the entry for the LRU policy
+      os.utime(path)
+    except FileNotFoundError:
+      return None
+    except Exception as e:
+      print(f"Ignoring invalid cache entry {path}: {e}")
+      return None
+    return df
+
+  def store(self, key, df):
+    '''
+    @param key: str. Key of the cache entry
+    @param df: pd.DataFrame. Hierarchy to store
+    '''
+    path = self._entry_path(key)
+    if CACHE_FORMAT == 'parquet':
+      self._atomic_write(path, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+    else:
+      self._atomic_write(path, lambda tmp_path: df.to_pickle(tmp_path))
+    self.evict()
+
+  def evict(self):
+    '''
+    Remove the least recently used entries until the cache fits in max_size
+    '''
+    entries = []
+    for name in os.listdir(self.cache_dir):
+      if name.endswith(('.parquet', '.pkl')):
+        stat = os.stat(os.path.join(self.cache_dir, name))
+        entries.append((stat.st_mtime_ns, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+      if total <= self.max_size:
+        break
+      try:
+        os.remove(os.path.join(self.cache_dir, name))
+      except OSError:
+        pass
+      total -= size
@@ -0,0 +1,166 @@
+import base64
+import gzip
+import os
+import tempfile
+
+import numpy as np
+
+
+PLOTLYJS_NAME = 'plotly.min.js'
+
+HTML_TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<script src="{plotlyjs}"></script>
+</head>
+<body style="margin:0">
+<div id="plot"></div>
+<script>
+(function() {{
+  var fig = {figure};
+  function decode(packed) {{
+    var bytes = atob(packed.index), buf = new Uint8Array(bytes.length);
+    for (var i = 0; i < bytes.length; i++) buf[i] = bytes.charCodeAt(i);
+    var index = new Int32Array(buf.buffer), out = new Array(index.length);
+    for (var j = 0; j < index.length; j++) out[j] = index[j] < 0 ? '' : packed.table[index[j]];
+    return out;
+  }}
+  fig.data.forEach(function(trace) {{
+    if (trace.parents && typeof trace.parents.index === 'string') {{
+      trace.parents.table = trace.ids;
+      trace.parents = decode(trace.parents);
+    }}
+    if (trace.labels && typeof trace.labels.index === 'string') trace.labels = decode(trace.labels);
+    if (trace.marker && trace.marker.colors && typeof trace.marker.colors.index === 'string') trace.marker.colors = decode(trace.marker.colors);
+  }});
+  Plotly.newPlot('plot', fig.data, fig.layout, {{responsive: true}});
+}})();
+{post_script}
+</script>
+</body>
+</html>
+'''
+
+
+def pack_strings(values, table=None):
+  '''
+  Dictionary-encode an array of strings as int32 indices, base64 packed
+  @param values: array of str. Strings to encode
+  @param table: array of str. Table to index, must contain all the values (default: the unique values)
+  @return: dict. 'index' with the packed indices (-1 for empty strings) and 'table', unless given
+  '''
+  values = np.asarray(values, dtype=object)
+  if table is None:
+    table, index = np.unique(values.astype(str), return_inverse=True)
+    packed = {'table': table.tolist()}
+  else:
+    lookup = {name: i for i, name in enumerate(table)}
+    index = np.fromiter((lookup.get(value, -1) for value in values), dtype=np.int64, count=len(values))
+    packed = {}
+  packed['index'] = base64.b64encode(index.astype('<i4').tobytes()).decode()
+  return packed
+
+
+def pack_numbers(values):
+  '''
+  Encode a numeric array as a plotly.js typed array, decoded by plotly.js itself
+  @param values: array of float. Numbers to encode
+  @return: dict. 'dtype' and 'bdata' with the base64 packed float64 values
+  '''
+  return {'dtype': 'f8', 'bdata': base64.b64encode(np.asarray(values, dtype='<f8').tobytes()).decode()}
+
+
+def plotlyjs_src(plotlyjs, html_path):
+  '''
+  Resolve where the HTML page loads plotly.js from
+  @param plotlyjs: str. 'directory' to share one plotly.min.js per output directory,
+  'cdn', or the path or URL of a plotly.js bundle
+  @param html_path: str. Path of the HTML file
+  @return: str. Value of the src attribute of the script tag
+  '''
+  out_dir = os.path.dirname(os.path.abspath(html_path))
+  if plotlyjs == 'directory':
+    write_plotlyjs(os.path.join(out_dir, PLOTLYJS_NAME))
+    return PLOTLYJS_NAME
+  if plotlyjs == 'cdn':
+    from plotly.offline import get_plotlyjs_version
+    return f'https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js'
+  if os.path.exists(plotlyjs):
+    return os.path.relpath(os.path.abspath(plotlyjs), out_dir)
+  return plotlyjs
+
+
+def write_plotlyjs(path):
+  '''
+  Write the plotly.js bundle, once per directory
+  @param path: str. Path of the bundle
+  '''
+  if os.path.exists(path):
+    return
+  from plotly.offline import get_plotlyjs
+  # Atomic, other processes of a batch may write the same directory
+  fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+  with os.fdopen(fd, 'w', encoding='utf-8') as file:
+    file.write(get_plotlyjs())
+  os.chmod(tmp_path, 0o644)
+  os.replace(tmp_path, path)
+
+
+def to_compact_html(fig, plotlyjs_src, post_script=None):
+  '''
+  Generate a light HTML page of the figure: plotly.js is loaded from plotlyjs_src
+  instead of being embedded, numeric arrays (numeric colors included) are base64
+  packed as plotly.js typed arrays, parents, labels and string colors are dictionary-encoded.
+  @param fig: go.Figure. Figure to convert
+  @param plotlyjs_src: str. Value of the src attribute of the plotly.js script tag
+  @param post_script: str. JavaScript run after the plot is created, '{plot_id}' is replaced with the id of the plot div
+  @return: str. HTML page
+  '''
+  import plotly.io as pio
+  fig_dict = fig.to_dict()
+  for trace in fig_dict['data']:
+    if trace.get('ids') is None:
+      continue
+    ids = np.asarray(trace['ids'], dtype=object)
+    trace['ids'] = ids.tolist()
+    if trace.get('parents') is not None:
+      trace['parents'] = pack_strings(trace['parents'], trace['ids'])
+    if trace.get('labels') is not None:
+      trace['labels'] = pack_strings(trace['labels'])
+    marker = trace.get('marker', {})
+    colors = marker.get('colors')
+    # Numeric colors, e.g. mapped on a colorscale, may already be a typed array packed by plotly
+    if colors is not None and not isinstance(colors, dict):
+      if np.asarray(colors).dtype.kind in 'biuf':
+        marker['colors'] = pack_numbers(colors)
+      else:
+        marker['colors'] = pack_strings(colors)
+  figure = pio.to_json(fig_dict, validate=False).replace('</', '<\\/')
+  post_script = post_script.replace('{plot_id}', 'plot') if post_script else ''
+  return HTML_TEMPLATE.format(plotlyjs=plotlyjs_src, figure=figure, post_script=post_script)
+
+
+def write_html(fig, path, compact=False, plotlyjs='directory', compress=False, post_script=None):
+  '''
+  Write the figure as HTML
+  @param fig: go.Figure. Figure to write
+  @param path: str. Path of the HTML file, '.gz' is appended if compressed
+  @param compact: bool. Write a light page (see to_compact_html) instead of embedding plotly.js
+  @param plotlyjs: str. Where the compact page loads plotly.js from, see plotlyjs_src
+  @param compress: bool. Gzip the HTML file
+  @param post_script: str. JavaScript run after the plot is created, see to_compact_html
+  @return: str. Path of the written file
+  '''
+  if compact:
+    page = to_compact_html(fig, plotlyjs_src(plotlyjs, path), post_script)
+  else:
+    page = fig.to_html(post_script=post_script)
+  if compress:
+    path += '.gz'
+    with gzip.open(path, 'wt', encoding='utf-8') as file:
+      file.write(page)
+  else:
+    with open(path, 'w', encoding='utf-8') as file:
+      file.write(page)
+  return path
@@ -0,0 +1,154 @@
+#Copyright 2024 Politecnico di Torino.
+#
+#File: diff.py
+#Description: Area difference between the reports of two synthesis runs
+
+
+import argparse
+import os
+
+from . import main as area_plot
+from .export import Exporter, parse_formats
+
+
+def get_args(argv = None):
+  parser = argparse.ArgumentParser(prog = 'area-plot diff', description = 'Compare the area of two reports: plot the area difference of each component instance and list the largest regressions.')
+  parser.add_argument('old', type = str, help = 'Report of the reference run')
+  parser.add_argument('new', type = str, help = 'Report of the new run')
+  parser.add_argument('--out-dir', '-o', type = str, help = 'Output directory where to store the plot and the CSV files.', default = '.')
+  parser.add_argument('--max-levels-hier', '-d', type = int, help = 'Maximum number of levels to plot', default = 4)
+  parser.add_argument('--max-nodes', type = int, help = 'Maximum number of components in the plot, the smallest ones are left out')
+  parser.add_argument('--color-range', type = float, help = 'Relative difference mapped to the ends of the color scale, e.g. 0.2 for +/-20%%', default = 0.2)
+  parser.add_argument('--top-n', type = int, help = 'Number of regressions listed in the regressions CSV, 0 for all', default = 100)
+  parser.add_argument('--no-plot', action = 'store_true', help = 'Only write the regressions CSV')
+  parser.add_argument('--formats', type = parse_formats, help = 'Comma separated list of output formats among png,svg,pdf,jpg,webp,html', default = 'png,svg,html')
+  parser.add_argument('--html-mode', choices = ['standalone', 'compact'], help = 'standalone: embed plotly.js in the HTML file, compact: load a shared plotly.js and pack the data', default = 'standalone')
+  parser.add_argument('--plotlyjs', type = str, help = "Where compact HTML files load plotly.js from: 'directory', 'cdn', or a path/URL", default = 'directory')
+  parser.add_argument('--html-gzip', action = 'store_true', help = 'Gzip the HTML file')
+  parser.add_argument('--no-cache', action = 'store_true', help = 'Do not read nor write the cache of the parsed reports')
+  parser.add_argument('--cache-dir', type = str, help = 'Directory of the cache of the parsed reports (default: ~/.cache/area-plot)')
+  parser.add_argument('--cache-max-size', type = int, help = 'Maximum size of the cache in MB', default = 2048)
+  return parser.parse_args(argv)
+
+
+def diff_hierarchies(df_old, df_new):
+  '''
+  Align two hierarchies by full instance path and compute the area difference of each node.
+  Instances missing in one of the two runs have area 0 in that run.
+  @param df_old: pd.DataFrame. Hierarchy of the reference run, as returned by get_df_from_report
+  @param df_new: pd.DataFrame. Hierarchy of the new run, as returned by get_df_from_report
+  @return: pd.DataFrame. One row per instance, top module first, with the columns:
+  - id: str. Full hierarchical path of the component instance
+  - parent: str. Full hierarchical path of the parent, '' for the top module
+  - label: str. Pretty name of the component instance
+  - old, new: float. Area in the two runs
+  - delta: float. new - old
+  - delta_rel: float. delta / old, inf for the new instances
+  '''
+  import numpy as np
+  import pandas as pd
+  from .hier_tree import resolve_path_parents
+  old = df_old[['path', 'label', 'value']].rename(columns={'value': 'old'})
+  new = df_new[['path', 'label', 'value']].rename(columns={'value': 'new'})
+  # First level instances are reported without the top module: align the top
+  # modules even if the design was renamed
+  new.loc[new.index[0], 'path'] = old['path'].iloc[0]
+  old['old_row'] = np.arange(len(old))
+  new['new_row'] = np.arange(len(new))
+  # Outer merges sort the keys: restore the depth first order of the old run,
+  # followed by the instances only in the new run, so that the top module is first
+  df = old.merge(new, on='path', how='outer', suffixes=('', '_new'))
+  df = df.sort_values(['old_row', 'new_row'], na_position='last', kind='stable', ignore_index=True)
+  assert df['path'].iloc[0] == old['path'].iloc[0]
+  # The labels of the two reports have different categories
+  df['label'] = df['label'].astype(object).fillna(df['label_new'].astype(object))
+  df[['old', 'new']] = df[['old', 'new']].fillna(0.0)
+  paths = df['path'].to_numpy(dtype=object)
+  parent = resolve_path_parents(paths)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    delta = df['new'].to_numpy() - df['old'].to_numpy()
+    delta_rel = np.where(delta == 0, 0.0, delta / df['old'].to_numpy())
+  return pd.DataFrame({
+    'id': paths,
+    'parent': np.where(parent >= 0, paths[parent], ''),
+    'label': df['label'].to_numpy(),
+    'old': df['old'].to_numpy(),
+    'new': df['new'].to_numpy(),
+    'delta': delta,
+    'delta_rel': delta_rel,
+  })
+
+
+def diff_figure(df_diff, max_levels_hier, color_range):
+  '''
+  Treemap of the new areas, colored by the relative difference with a diverging color scale
+  @param df_diff: pd.DataFrame. Difference as returned by diff_hierarchies
+  @param max_levels_hier: int. Maximum number of levels to plot
+  @param color_range: float. Relative difference mapped to the ends of the color scale
+  @return: go.Figure
+  '''
+  import numpy as np
+  import plotly.graph_objects as go
+  fig = go.Figure()
+  fig.add_trace(go.Treemap(
+      name='',
+      ids = df_diff['id'],
+      labels = df_diff['label'],
+      values = df_diff['new'],
+      parents = df_diff['parent'],
+      root_color="lightgrey",
+      maxdepth=max_levels_hier,
+      marker=dict(
+        colors = np.clip(df_diff['delta_rel'].to_numpy(), -color_range, color_range),
+        colorscale='RdBu_r',
+        cmin=-color_range,
+        cmid=0,
+        cmax=color_range,
+        colorbar=dict(title='Area change', tickformat='+.0%'),
+      ),
+      customdata = df_diff[['old', 'delta', 'delta_rel']].to_numpy(),
+      textinfo = 'label',
+      branchvalues = 'total',
+      hovertemplate='<b>%{label}</b><br>Area: %{customdata[0]:.1f} -> %{value:.1f}<br>Change: %{customdata[1]:+.1f} (%{customdata[2]:+.2%})',
+  ))
+  fig.update_layout(
+    uniformtext=dict(minsize=10, mode='hide'),
+    font=dict(size=14),
+    width=1700,
+    height=1000,
+  )
+  return fig
+
+
+def main(argv = None):
+  args = get_args(argv)
+  from .cache import ReportCache
+  from .hier_tree import HierTree
+  cache = None if args.no_cache else ReportCache(args.cache_dir, args.cache_max_size << 20)
+  df_old = area_plot.load_report(args.old, True, cache)
+  df_new = area_plot.load_report(args.new, True, cache)
+  if df_old.empty or df_new.empty:
+    raise ValueError(f"No component found in {args.old if df_old.empty else args.new}")
+  df_diff = diff_hierarchies(df_old, df_new)
+  top_module = df_diff['id'].iloc[0]
+  os.makedirs(args.out_dir, exist_ok=True)
+
+  # Largest regressions first
+  regressions = df_diff[df_diff['delta'] > 0]
+  regressions = regressions.nlargest(args.top_n, 'delta') if args.top_n > 0 else regressions.sort_values('delta', ascending=False, kind='stable')
+  csv_path = os.path.join(args.out_dir, f"{top_module}_regressions.csv")
+  regressions.to_csv(csv_path, index=False)
+  total = df_diff.iloc[0]
+  print(f"{top_module}: {total['old']:.1f} -> {total['new']:.1f} ({total['delta']:+.1f}, {total['delta_rel']:+.2%})")
+  print(f"Largest regressions written to {csv_path}")
+  if args.no_plot:
+    return 0
+
+  # Plot only the displayed levels
+  tree = HierTree.from_dataframe(df_diff.rename(columns={'new': 'value'}))
+  nodes, _ = tree.level_of_detail(0, args.max_levels_hier, args.max_nodes)
+  html_options = {'compact': args.html_mode == 'compact', 'plotlyjs': args.plotlyjs, 'compress': args.html_gzip}
+  with Exporter(args.formats, html_options) as exporter:
+    fig = diff_figure(df_diff.iloc[nodes], args.max_levels_hier, args.color_range)
+    exporter.add(fig, os.path.join(args.out_dir, f"{top_module}_diff_treemap"))
+  return 0
@@ -0,0 +1,123 @@
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+IMAGE_FORMATS = ['png', 'svg', 'pdf', 'jpg', 'webp']
+EXPORT_FORMATS = IMAGE_FORMATS + ['html']
+
+
+def parse_formats(value):
+  '''
+  argparse type of the --formats option
+  @param value: str. Comma separated list of formats, e.g. png,svg,html
+  @return: list of str. Formats, without duplicates
+  '''
+  formats = [fmt.strip().lower() for fmt in value.split(',') if fmt.strip()]
+  unknown = [fmt for fmt in formats if fmt not in EXPORT_FORMATS]
+  if unknown or not formats:
+    raise argparse.ArgumentTypeError(f"invalid formats '{value}', choose among {','.join(EXPORT_FORMATS)}")
+  return list(dict.fromkeys(formats))
+
+
+class Exporter:
+  '''
+  Export stage shared by all the figures of a run.
+  Each figure is serialized once for all the image formats, the images are
+  rendered through a single kaleido session while the HTML files and the
+  image files are written concurrently by a pool of threads. kaleido is not
+  used at all if only HTML is requested. Figures can be added from several threads.
+  '''
+
+  def __init__(self, formats, html_options = None):
+    '''
+    @param formats: list of str. Formats to export, among EXPORT_FORMATS
+    @param html_options: dict. Keyword arguments of compact_html.write_html (compact, plotlyjs, compress)
+    '''
+    self.formats = list(formats)
+    self.html_options = html_options if html_options else {}
+    self.images = [fmt for fmt in self.formats if fmt in IMAGE_FORMATS]
+    # Number of files and total seconds spent on each format
+    self.timings = {fmt: [0, 0.0] for fmt in self.formats}
+    # Path, format, start, seconds and thread of each file written, see Profiler.add_spans
+    self.spans = []
+    self._timings_lock = threading.Lock()
+    self._render_lock = threading.Lock()
+    self._session_lock = threading.Lock()
+    self._pool = ThreadPoolExecutor(max_workers=len(self.formats))
+    self._futures = []
+    self._session = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+  def _start_session(self):
+    # kaleido >= 1.1 starts a new browser for every image unless a server is running
+    self._session = False
+    try:
+      import kaleido
+      if hasattr(kaleido, 'start_sync_server'):
+        kaleido.start_sync_server(silence_warnings=True)
+        self._session = True
+    except Exception:
+      pass
+
+  def add(self, fig, base_path, formats = None, post_script = None):
+    '''
+    Export a figure in all the formats
+    @param fig: go.Figure. Figure to export
+    @param base_path: str. Path of the output files, without extension
+    @param formats: list of str. Subset of the formats of the exporter to use (default: all)
+    @param post_script: str. JavaScript run by the HTML page after the plot is created
+    '''
+    formats = self.formats if formats is None else [fmt for fmt in self.formats if fmt in formats]
+    fig_dict = None
+    if any(fmt in IMAGE_FORMATS for fmt in formats):
+      with self._session_lock:
+        if self._session is None:
+          self._start_session()
+      fig_dict = fig.to_dict()
+    for fmt in formats:
+      self._futures.append(self._pool.submit(self._export, fig, fig_dict, f'{base_path}.{fmt}', fmt, post_script))
+
+  def _export(self, fig, fig_dict, path, fmt, post_script = None):
+    if fmt == 'html':
+      from . import compact_html
+      start = time.perf_counter()
+      compact_html.write_html(fig, path, post_script=post_script, **self.html_options)
+    else:
+      import plotly.io as pio
+      # Do not account the time waiting for the session
+      with self._render_lock:
+        start = time.perf_counter()
+        image = pio.to_image(fig_dict, format=fmt, validate=False)
+      with open(path, 'wb') as file:
+        file.write(image)
+    elapsed = time.perf_counter() - start
+    with self._timings_lock:
+      self.timings[fmt][0] += 1
+      self.timings[fmt][1] += elapsed
+      self.spans.append((os.path.basename(path), fmt, start, elapsed, threading.get_ident()))
+
+  def close(self):
+    '''
+    Wait for all the exports, raising the first error if any
+    '''
+    self._pool.shutdown(wait=True)
+    if self._session:
+      import kaleido
+      kaleido.stop_sync_server(silence_warnings=True)
+      self._session = None
+    futures, self._futures = self._futures, []
+    for future in futures:
+      future.result()
+
+  def print_timings(self):
+    print(f"{'format':<8}  {'files':>5}  {'seconds':>9}")
+    for fmt, (files, seconds) in self.timings.items():
+      print(f"{fmt:<8}  {files:>5}  {seconds:>9.3f}")
@@ -0,0 +1,267 @@
+import numpy as np
+import pandas as pd
+
+from .hier_tree import resolve_parents
+
+
+# Columns kept up to date by the edits, the others are carried along unchanged
+CORE_COLUMNS = ['id', 'parent', 'label', 'value', 'color']
+
+
+class EditableHierarchy:
+  '''
+  Mutable component hierarchy for what-if editing sessions, e.g. in notebooks:
+  add an estimated macro, drop a block, move a component under another parent,
+  then update the plot.
+  Nodes are stored in per-node lists with the children of each node in an
+  insertion ordered dict, so that each edit costs O(depth) (O(children) more to
+  hoist the children of a removed node) instead of copying the DataFrame:
+  - the area of the ancestors is updated along the parent chain, so that the
+  area of each node stays the total area of its subtree
+  - removed nodes are detached from their parent, their descendants become
+  unreachable and are left out of to_dataframe
+  Ids are expected to be unique, see utils_area.rename_duplicates.
+  '''
+
+  def __init__(self, df):
+    '''
+    @param df: pd.DataFrame. DataFrame with the area of the components instance,
+    with at least the columns id, parent and value
+    '''
+    n = len(df)
+    ids = df['id'].to_numpy(dtype=object)
+    parent = resolve_parents(ids, df['parent'].to_numpy(dtype=object))
+    self.ids = ids.tolist()
+    self.labels = df['label'].tolist() if 'label' in df.columns else list(self.ids)
+    self.values = pd.to_numeric(df['value'], errors='coerce').fillna(0.0).tolist()
+    self.colors = df['color'].tolist() if 'color' in df.columns else [None] * n
+    self.parent = parent.tolist()
+    self.children = [{} for _ in range(n)]
+    self.roots = {}
+    for node, parent_node in enumerate(self.parent):
+      (self.children[parent_node] if parent_node >= 0 else self.roots)[node] = None
+    self.detached = [False] * n
+    self.index = {}
+    for node, node_id in enumerate(self.ids):
+      self.index.setdefault(node_id, node)
+    # Other columns of the original rows, e.g. the area breakdown, NaN for the added nodes
+    self.extra = df[[col for col in df.columns if col not in CORE_COLUMNS]].reset_index(drop=True)
+    if 'color' not in df.columns:
+      # Parsed reports have no colors, they are assigned as in the plots
+      self.recolor()
+
+  def __len__(self):
+    return len(self.to_nodes())
+
+  def _alive(self, node):
+    while node >= 0:
+      if self.detached[node]:
+        return False
+      node = self.parent[node]
+    return True
+
+  def find(self, node_id):
+    '''
+    @param node_id: str. Id of the component instance
+    @return: int. Index of the node
+    '''
+    node = self.index.get(node_id, -1)
+    if node < 0 or not self._alive(node):
+      raise ValueError(f"Module '{node_id}' not found.")
+    return node
+
+  def _propagate(self, node, delta):
+    # Update the area of node and of all its ancestors
+    while node >= 0:
+      self.values[node] += delta
+      node = self.parent[node]
+
+  def _siblings(self, parent_node):
+    return self.children[parent_node] if parent_node >= 0 else self.roots
+
+  def add(self, module_id, parent_id, value, label=None, color=None):
+    '''
+    Add a module, the area of its ancestors grows accordingly
+    @param module_id: str. Id of the module to add, unique
+    @param parent_id: str. Id of the parent module
+    @param value: float. Area of the module
+    @param label: str. Label of the module (default: module_id)
+    @param color: str. Color of the module (default: the color of the parent)
+    @return: int. Index of the new node
+    '''
+    if module_id in self.index and self._alive(self.index[module_id]):
+      raise ValueError(f"Module '{module_id}' already exists.")
+    parent_node = self.find(parent_id)
+    node = len(self.ids)
+    self.ids.append(module_id)
+    self.labels.append(label if label is not None else module_id)
+    self.values.append(0.0)
+    self.colors.append(color if color is not None else self.colors[parent_node])
+    self.parent.append(parent_node)
+    self.children.append({})
+    self.detached.append(False)
+    self.children[parent_node][node] = None
+    self.index[module_id] = node
+    self._propagate(node, float(value))
+    return node
+
+  def remove(self, module_id, keep_children=False):
+    '''
+    Remove a module
+    @param module_id: str. Id of the module to remove
+    @param keep_children: bool. Move the children of the module to its parent, as
+    remove_wrappers does, instead of removing the whole subtree. Only the area of
+    the module itself, without its children, is then removed from the ancestors
+    '''
+    node = self.find(module_id)
+    parent_node = self.parent[node]
+    siblings = self._siblings(parent_node)
+    del siblings[node]
+    if keep_children:
+      children = self.children[node]
+      removed = self.values[node] - sum(self.values[child] for child in children)
+      for child in children:
+        self.parent[child] = parent_node
+        siblings[child] = None
+      self.children[node] = {}
+    else:
+      removed = self.values[node]
+    self.detached[node] = True
+    del self.index[module_id]
+    self._propagate(parent_node, -removed)
+
+  def reparent(self, module_id, parent_id):
+    '''
+    Move a module, with its subtree, under another parent
+    @param module_id: str. Id of the module to move
+    @param parent_id: str. Id of the new parent
+    '''
+    node = self.find(module_id)
+    parent_node = self.find(parent_id)
+    ancestor = parent_node
+    while ancestor >= 0:
+      if ancestor == node:
+        raise ValueError(f"Cannot move '{module_id}' under its own subtree.")
+      ancestor = self.parent[ancestor]
+    old_parent = self.parent[node]
+    value = self.values[node]
+    del self._siblings(old_parent)[node]
+    self._propagate(old_parent, -value)
+    self.parent[node] = parent_node
+    self.children[parent_node][node] = None
+    self._propagate(parent_node, value)
+
+  def apply(self, edits):
+    '''
+    Apply a batch of edits
+    @param edits: iterable of tuple. Each edit is the name of the method among add,
+    remove and reparent followed by its arguments, e.g. ('add', 'u_sram', 'u_core', 1200.0)
+    @return: EditableHierarchy. self
+    '''
+    for op, *params in edits:
+      if op not in ('add', 'remove', 'reparent'):
+        raise ValueError(f"Unknown edit '{op}', choose among add, remove, reparent")
+      getattr(self, op)(*params)
+    return self
+
+  def to_nodes(self):
+    '''
+    @return: np.ndarray of int. Nodes of the hierarchy in depth first order
+    '''
+    nodes = []
+    stack = list(reversed(self.roots))
+    while stack:
+      node = stack.pop()
+      nodes.append(node)
+      stack.extend(reversed(self.children[node]))
+    return np.array(nodes, dtype=np.int64)
+
+  def to_dataframe(self):
+    '''
+    @return: pd.DataFrame. Current hierarchy in depth first order, with the columns
+    id, parent, label, value and color followed by the other columns of the original DataFrame
+    '''
+    nodes = self.to_nodes()
+    ids = np.array(self.ids, dtype=object)
+    parent = np.array(self.parent, dtype=np.int64)[nodes]
+    df = pd.DataFrame({
+      'id': ids[nodes],
+      'parent': np.where(parent >= 0, ids[parent], ''),
+      'label': np.array(self.labels, dtype=object)[nodes],
+      'value': np.array(self.values, dtype=np.float64)[nodes],
+      'color': np.array(self.colors, dtype=object)[nodes],
+    })
+    if len(self.extra.columns):
+      df = pd.concat([df, self.extra.reindex(nodes).reset_index(drop=True)], axis=1)
+    return df
+
+  def recolor(self, top_module=None, colormap=None):
+    '''
+    Assign the colors of the nodes as the plots do, see utils_area.assign_colors
+    @param top_module: str. Id of the top module (default: the first root)
+    @param colormap: list of str. Colors of the first level modules (default: the colormap of the CLI)
+    '''
+    from . import main as area_plot
+    from . import utils_area as utils
+    nodes = self.to_nodes()
+    df = self.to_dataframe()
+    if df.empty:
+      return
+    top_module = top_module if top_module is not None else df['id'].iloc[0]
+    df = utils.assign_colors(df, top_module, colormap if colormap else area_plot.DEFAULT_COLORMAP)
+    for node, color in zip(nodes.tolist(), df['color'].tolist()):
+      self.colors[node] = color
+
+  def figure(self, top_module=None, max_levels_hier=4, plot_mode='total', colormap=None, kind='treemap'):
+    '''
+    Plot the hierarchy, to be updated in place with update_figure
+    @param top_module: str. Id of the top module (default: the first root)
+    @param max_levels_hier: int. Maximum number of levels to plot
+    @param plot_mode: str. 'total' or 'remainder', see plotly branchvalues
+    @param colormap: list of str. Colors of the first level modules (default: the colormap of the CLI)
+    @param kind: str. treemap or sunburst
+    @return: go.Figure
+    '''
+    from . import main as area_plot
+    from . import utils_area as utils
+    # Keep the colors of the plot, so that update_figure does not change them
+    self.recolor(top_module, colormap)
+    df = utils.hierarchical_metrics(self.to_dataframe())
+    top_module = top_module if top_module is not None else df['id'].iloc[0]
+    figure = area_plot.treemap_figure if kind == 'treemap' else area_plot.sunburst_figure
+    return figure(df, top_module, max_levels_hier, plot_mode, colormap if colormap else area_plot.DEFAULT_COLORMAP)
+
+  def figure_widget(self, top_module=None, max_levels_hier=4, plot_mode='total', colormap=None, kind='treemap'):
+    '''
+    Plot the hierarchy in a FigureWidget, see figure
+    @return: go.FigureWidget
+    '''
+    import plotly.graph_objects as go
+    return go.FigureWidget(self.figure(top_module, max_levels_hier, plot_mode, colormap, kind))
+
+  def update_figure(self, fig, top_module=None, colormap=None):
+    '''
+    Update the treemap and sunburst traces of a figure in place, in a single
+    batch, keeping its layout and state
+    @param fig: go.FigureWidget or go.Figure. Figure to update
+    @param top_module: str. Id of the top module used to assign the colors (default: the first root)
+    @param colormap: list of str. Recolor the first level modules and their
+    subtrees (default: keep the colors of the nodes, added modules take the color of their parent)
+    @return: go.FigureWidget or go.Figure. fig
+    '''
+    from .main import breakdown_hover
+    from . import utils_area as utils
+    if colormap:
+      self.recolor(top_module, colormap)
+    df = utils.hierarchical_metrics(self.to_dataframe())
+    customdata, _ = breakdown_hover(df)
+    with fig.batch_update():
+      for trace in fig.select_traces(selector=lambda trace: trace.type in ('treemap', 'sunburst')):
+        trace.ids = df['id']
+        trace.labels = df['label']
+        trace.parents = df['parent']
+        trace.values = df['value']
+        trace.marker.colors = df['color']
+        if trace.customdata is not None:
+          trace.customdata = customdata
+    return fig
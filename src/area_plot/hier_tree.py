@@ -0,0 +1,300 @@
+import numpy as np
+import pandas as pd
+
+
+class HierTree:
+  '''
+  Compact, index based representation of the component hierarchy.
+  Nodes are identified by integers, i.e. the position of the row they are built from.
+  - parent: np.ndarray of int64. Index of the parent node, -1 for roots
+  - values: np.ndarray of float64. Area of each node
+  - child_offsets, child_index: CSR adjacency, the children of node i are
+    child_index[child_offsets[i]:child_offsets[i+1]], in row order
+  - depth: np.ndarray of int64. Distance from the root of the node
+  - tin, size: np.ndarray of int64. Preorder position and subtree size, so that
+    the subtree of node i is preorder[tin[i]:tin[i]+size[i]]
+  - preorder: np.ndarray of int64. Nodes in depth first order
+  - columns: dict of np.ndarray. All the columns of the originating DataFrame
+  '''
+
+  def __init__(self, parent, values, columns, index=None):
+    '''
+    @param parent: array of int. Index of the parent node, -1 for roots
+    @param values: array of float. Area of each node
+    @param columns: dict of array. Columns to carry along (id, parent, label, color, ...)
+    @param index: pd.Index. Index of the rows, defaults to a RangeIndex
+    '''
+    self.parent = np.asarray(parent, dtype=np.int64)
+    self.values = np.asarray(values, dtype=np.float64)
+    self.columns = columns
+    self.index = index if index is not None else pd.RangeIndex(len(self.parent))
+    self._id_index = None
+    self._build_index()
+
+  def __len__(self):
+    return len(self.parent)
+
+  @property
+  def ids(self):
+    return self.columns['id']
+
+  @classmethod
+  def from_dataframe(cls, df):
+    '''
+    Build the tree from a DataFrame with at least the columns id, parent and value.
+    Parents are matched by id. If ids are not unique, the parent of a row is the
+    closest of its preceding ancestors with that id, as the report lists the
+    hierarchy depth first.
+    @param df: pd.DataFrame. DataFrame with the area of the components instance
+    @return: HierTree
+    '''
+    columns = {col: df[col].to_numpy(dtype=object) if col in ('id', 'parent') else df[col].to_numpy() for col in df.columns}
+    parent = resolve_parents(columns['id'], columns['parent'])
+    values = pd.to_numeric(df['value'], errors='coerce').to_numpy(dtype=np.float64)
+    return cls(parent, values, columns, df.index)
+
+  def to_dataframe(self, nodes=None, index=False):
+    '''
+    Convert (a subset of) the tree back to a DataFrame
+    @param nodes: array of int. Nodes to export, in the desired order (default: all, in row order)
+    @param index: bool. Keep the index of the originating DataFrame instead of a RangeIndex
+    @return: pd.DataFrame
+    '''
+    if nodes is None:
+      nodes = np.arange(len(self))
+    data = {col: (self.values if col == 'value' else arr)[nodes] for col, arr in self.columns.items()}
+    return pd.DataFrame(data, index=self.index[nodes] if index else None)
+
+  def _build_index(self):
+    n = len(self.parent)
+    has_parent = self.parent >= 0
+    child_rows = np.flatnonzero(has_parent)
+    # Counting sort of the children by parent, stable to keep the row order
+    self.child_index = child_rows[np.argsort(self.parent[child_rows], kind='stable')]
+    self.child_offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(self.parent[child_rows], minlength=n), out=self.child_offsets[1:])
+    self.roots = np.flatnonzero(~has_parent)
+
+    # Visit the tree one level at a time
+    self.depth = np.full(n, -1, dtype=np.int64)
+    self.levels = []
+    frontier = self.roots
+    while frontier.size:
+      self.depth[frontier] = len(self.levels)
+      self.levels.append(frontier)
+      frontier = self.children_of(frontier)
+    if n and (self.depth < 0).any():
+      raise ValueError("The hierarchy contains a cycle.")
+
+    # Subtree sizes, bottom-up
+    self.size = np.ones(n, dtype=np.int64)
+    for level in reversed(self.levels[1:]):
+      self.size += np.bincount(self.parent[level], weights=self.size[level], minlength=n).astype(np.int64)
+
+    # Preorder position: parent position + 1 + size of the previous siblings
+    sizes_csr = np.zeros(len(self.child_index) + 1, dtype=np.int64)
+    np.cumsum(self.size[self.child_index], out=sizes_csr[1:])
+    sibling_offset = np.empty(n, dtype=np.int64)
+    sibling_offset[self.child_index] = sizes_csr[:-1] - sizes_csr[self.child_offsets[self.parent[self.child_index]]]
+    self.tin = np.empty(n, dtype=np.int64)
+    root_sizes = self.size[self.roots]
+    self.tin[self.roots] = np.cumsum(root_sizes) - root_sizes
+    for level in self.levels[1:]:
+      self.tin[level] = self.tin[self.parent[level]] + 1 + sibling_offset[level]
+    self.preorder = np.empty(n, dtype=np.int64)
+    self.preorder[self.tin] = np.arange(n)
+
+  def children(self, node):
+    '''
+    @param node: int. Node index
+    @return: np.ndarray. Children of the node, in row order
+    '''
+    return self.child_index[self.child_offsets[node]:self.child_offsets[node + 1]]
+
+  def children_of(self, nodes):
+    '''
+    @param nodes: np.ndarray of int. Node indices
+    @return: np.ndarray. Children of all the nodes, concatenated
+    '''
+    starts = self.child_offsets[nodes]
+    counts = self.child_offsets[nodes + 1] - starts
+    total = counts.sum()
+    if total == 0:
+      return np.empty(0, dtype=np.int64)
+    shift = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return self.child_index[shift + np.arange(total)]
+
+  def subtree(self, node):
+    '''
+    @param node: int. Node index
+    @return: np.ndarray. The node followed by all its descendants, in depth first order
+    '''
+    return self.preorder[self.tin[node]:self.tin[node] + self.size[node]]
+
+  def ancestors(self, node):
+    '''
+    @param node: int. Node index
+    @return: list of int. Ancestors of the node, from the parent up to the root
+    '''
+    chain = []
+    node = self.parent[node]
+    while node >= 0:
+      chain.append(node)
+      node = self.parent[node]
+    return chain
+
+  def prune(self, top, pruned, folded=None):
+    '''
+    Remove the pruned nodes from the subtree of top, together with their descendants.
+    @param top: int. Index of the top node
+    @param pruned: np.ndarray of int. Nodes to remove, descendants of top
+    @param folded: np.ndarray of bool. For each pruned node, whether its area is
+    merged into the 'others' of its parent (default: all of them)
+    @return: tuple of np.ndarray. Kept nodes in depth first order, and for each
+    node the total area of its pruned children
+    '''
+    subtree = self.subtree(top)
+    # Mask the preorder interval of each pruned node
+    first = self.tin[top]
+    start = self.tin[pruned] - first
+    cover = np.bincount(start, minlength=len(subtree) + 1) - np.bincount(start + self.size[pruned], minlength=len(subtree) + 1)
+    removed = np.cumsum(cover[:-1]) > 0
+    # Only the pruned nodes whose parent is kept are merged into the parent 'others'
+    top_pruned = ~removed[self.tin[self.parent[pruned]] - first]
+    if folded is not None:
+      top_pruned &= folded
+    top_pruned = pruned[top_pruned]
+    others = np.bincount(self.parent[top_pruned], weights=self.values[top_pruned], minlength=len(self))
+    return subtree[~removed], others
+
+  def threshold(self, top, threshold):
+    '''
+    Prune the subtree of top, removing the nodes with area < threshold * parent area
+    together with their descendants.
+    @param top: int. Index of the top node
+    @param threshold: float. Minimum area ratio with respect to the parent
+    @return: tuple of np.ndarray. Kept nodes in depth first order, and for each
+    node the total area of its pruned children
+    '''
+    children = self.subtree(top)[1:]
+    # Share of each child with respect to its parent, computed once for the whole subtree
+    pruned = children[self.values[children] < threshold * self.values[self.parent[children]]]
+    return self.prune(top, pruned)
+
+  def level_of_detail(self, top, max_depth=None, max_nodes=None):
+    '''
+    Prune the subtree of top to max_depth levels and, among them, keep the largest
+    nodes so that at most max_nodes nodes, 'others' included, are left. The area of
+    the nodes removed because of the budget is merged into the parent 'others'.
+    @param top: int. Index of the top node
+    @param max_depth: int. Number of levels to keep, top included (default: all)
+    @param max_nodes: int. Maximum number of nodes (default: no limit)
+    @return: tuple of np.ndarray. Kept nodes in depth first order, and for each
+    node the total area of its pruned children
+    '''
+    children = self.subtree(top)[1:]
+    # Nodes beyond max_depth are simply cut, their area is part of their ancestors
+    if max_depth is not None:
+      depth_cut = children[self.depth[children] - self.depth[top] == max(max_depth, 1)]
+    else:
+      depth_cut = np.empty(0, dtype=np.int64)
+    nodes, others = self.prune(top, depth_cut, np.zeros(len(depth_cut), dtype=bool))
+    if max_nodes is None or len(nodes) <= max_nodes:
+      return nodes, others
+
+    # Keep the k largest nodes, with the largest k fitting in the budget
+    candidates = nodes[1:]
+    by_area = candidates[np.argsort(-self.values[candidates], kind='stable')]
+    def attempt(k):
+      pruned = np.concatenate([depth_cut, by_area[k:]])
+      folded = np.arange(len(pruned)) >= len(depth_cut)
+      kept, others = self.prune(top, pruned, folded)
+      return kept, others, len(kept) + np.count_nonzero(others[kept] > 0)
+    lo, hi = 0, len(by_area)
+    best = attempt(0)[:2]
+    while lo < hi:
+      mid = (lo + hi + 1) // 2
+      kept, others, count = attempt(mid)
+      if count <= max_nodes:
+        lo, best = mid, (kept, others)
+      else:
+        hi = mid - 1
+    return best
+
+  def kept_ancestors(self, removed):
+    '''
+    Nearest ancestor of each node that is not removed, by pointer jumping: each
+    round replaces the pointers to removed nodes with the pointers of those nodes,
+    doubling the skipped distance, so that O(log depth) rounds are needed
+    @param removed: np.ndarray of bool. Removed nodes
+    @return: np.ndarray of int64. Nearest kept proper ancestor of each node, -1 if none
+    '''
+    jump = self.parent.copy()
+    while True:
+      hop = jump >= 0
+      hop[hop] = removed[jump[hop]]
+      if not hop.any():
+        return jump
+      jump[hop] = jump[jump[hop]]
+
+  def find(self, node_id):
+    '''
+    @param node_id: str. Id of the component instance
+    @return: np.ndarray. Indices of the nodes with the given id
+    '''
+    # Hash the ids on the first lookup, instead of scanning them at each one
+    if self._id_index is None:
+      self._id_index = pd.Index(self.ids)
+    nodes = self._id_index.get_indexer_for([node_id])
+    return nodes[nodes >= 0]
+
+
+def resolve_parents(ids, parents):
+  '''
+  Resolve the parent names into node indices
+  @param ids: np.ndarray of str. Id of each node
+  @param parents: np.ndarray of str. Parent id of each node
+  @return: np.ndarray of int64. Index of the parent node, -1 if not found
+  '''
+  index = pd.Index(ids)
+  if index.is_unique:
+    parent = index.get_indexer(parents).astype(np.int64)
+    # A node cannot be its own parent
+    parent[parent == np.arange(len(ids))] = -1
+    return parent
+  # Depth first order: the parent is the closest row with that id in the chain
+  # of ancestors of the previous row, rows out of order fall back to the last
+  # row with that id
+  last = {}
+  chain = []
+  parent = np.full(len(ids), -1, dtype=np.int64)
+  for i, (name, parent_name) in enumerate(zip(ids, parents)):
+    k = len(chain) - 1
+    while k >= 0 and ids[chain[k]] != parent_name:
+      k -= 1
+    if k >= 0:
+      parent[i] = chain[k]
+      del chain[k + 1:]
+    else:
+      parent[i] = last.get(parent_name, -1)
+      chain.clear()
+    chain.append(i)
+    last[name] = i
+  return parent
+
+
+def resolve_path_parents(paths):
+  '''
+  Resolve the parents from the full hierarchical paths, e.g. top/u_core/u_alu.
+  First level instances are reported without the top module, so that paths
+  without a separator are children of the first row.
+  @param paths: np.ndarray of str. Full hierarchical path of each node
+  @return: np.ndarray of int64. Index of the parent node, -1 if not found
+  '''
+  if len(paths) == 0:
+    return np.empty(0, dtype=np.int64)
+  top_path = paths[0]
+  parent_paths = [(path.rpartition('/')[0] or top_path) if isinstance(path, str) else '' for path in paths]
+  parent = pd.Index(paths).get_indexer(parent_paths).astype(np.int64)
+  parent[parent == np.arange(len(paths))] = -1
+  return parent
@@ -0,0 +1,201 @@
+#Copyright 2024 Politecnico di Torino.
+#
+#File: history.py
+#Description: Area of the component instances across many synthesis runs
+
+
+import argparse
+import datetime
+import os
+import sqlite3
+
+from . import report_parser
+from .export import Exporter, parse_formats
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+  id INTEGER PRIMARY KEY,
+  name TEXT NOT NULL UNIQUE,
+  date TEXT NOT NULL,
+  report TEXT NOT NULL,
+  digest TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_date ON runs (date);
+CREATE TABLE IF NOT EXISTS instances (
+  id INTEGER PRIMARY KEY,
+  path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS areas (
+  instance_id INTEGER NOT NULL REFERENCES instances (id),
+  run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+  value REAL NOT NULL,
+  PRIMARY KEY (instance_id, run_id)
+) WITHOUT ROWID;
+'''
+
+
+def default_db():
+  '''
+  @return: str. Database of the area history, $AREA_PLOT_HISTORY or area-history.db
+  '''
+  return os.environ.get('AREA_PLOT_HISTORY', 'area-history.db')
+
+
+class AreaHistory:
+  '''
+  Store of the area of the component instances of many reports, e.g. nightly runs.
+  Each report is parsed once when ingested; the areas are stored in SQLite,
+  clustered by instance path, so that the area of an instance over time is read
+  with an index range scan, without touching the reports.
+  '''
+
+  def __init__(self, db_path=None):
+    '''
+    @param db_path: str. Path of the SQLite database, created if missing (default: default_db())
+    '''
+    self.db_path = db_path if db_path else default_db()
+    self.conn = sqlite3.connect(self.db_path)
+    self.conn.execute('PRAGMA foreign_keys = ON')
+    self.conn.executescript(SCHEMA)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+  def close(self):
+    self.conn.close()
+
+  def ingest(self, filename, run=None, date=None, replace=False, fmt=None):
+    '''
+    Parse a report and append its hierarchy to the store
+    @param filename: str. Name of the report
+    @param run: str. Name of the run, unique (default: the report path)
+    @param date: str. ISO date of the run, used to sort the runs (default: modification time of the report)
+    @param replace: bool. Replace the run if already ingested
+    @param fmt: str. Format of the report, among report_parser.PARSERS (default: detected)
+    @return: int. Number of instances stored, 0 if the run was already ingested
+    '''
+    from .cache import file_digest
+    run = run if run else os.path.normpath(filename)
+    if date is None:
+      date = datetime.datetime.fromtimestamp(os.path.getmtime(filename)).isoformat(timespec='seconds')
+    existing = self.conn.execute('SELECT id FROM runs WHERE name = ?', (run,)).fetchone()
+    if existing is not None and not replace:
+      return 0
+    # Parse before touching the store, so that a failure keeps the run being replaced
+    columns = report_parser.parse_report(filename, fmt=fmt)
+    rows = list(zip(columns['path'], columns['value'].tolist()))
+    digest = file_digest(filename)
+    # The replaced run is deleted in the same transaction inserting the new one
+    with self.conn:
+      if existing is not None:
+        self.conn.execute('DELETE FROM runs WHERE id = ?', existing)
+      run_id = self.conn.execute('INSERT INTO runs (name, date, report, digest) VALUES (?, ?, ?, ?)',
+                                 (run, date, os.path.abspath(filename), digest)).lastrowid
+      # Bulk load through a staging table, the joins are done by SQLite
+      self.conn.execute('CREATE TEMP TABLE staging (path TEXT, value REAL)')
+      self.conn.executemany('INSERT INTO staging VALUES (?, ?)', rows)
+      self.conn.execute('INSERT OR IGNORE INTO instances (path) SELECT path FROM staging')
+      # Duplicated paths cannot be told apart, the first one is kept
+      self.conn.execute('INSERT OR IGNORE INTO areas (instance_id, run_id, value) '
+                        'SELECT instances.id, ?, staging.value FROM staging JOIN instances USING (path) '
+                        'ORDER BY staging.rowid', (run_id,))
+      self.conn.execute('DROP TABLE staging')
+    return len(rows)
+
+  def runs(self):
+    '''
+    @return: pd.DataFrame. Ingested runs sorted by date, with the columns name, date, report and digest
+    '''
+    import pandas as pd
+    return pd.read_sql_query('SELECT name, date, report, digest FROM runs ORDER BY date, id', self.conn)
+
+  def query(self, paths, since=None, last=None):
+    '''
+    Area of component instances over time
+    @param paths: str or list of str. Full hierarchical paths of the instances, e.g. u_core/u_alu
+    @param since: str. ISO date of the first run to consider
+    @param last: int. Consider only the last runs
+    @return: pd.DataFrame. One row per run sorted by date, indexed by run name, with
+    the date column and one column of area per instance (NaN if missing in the run)
+    '''
+    import pandas as pd
+    if isinstance(paths, str):
+      paths = [paths]
+    runs = 'SELECT id, name, date FROM runs'
+    if since is not None:
+      runs += ' WHERE date >= :since'
+    runs += ' ORDER BY date DESC, id DESC'
+    if last is not None:
+      runs += ' LIMIT :last'
+    df_runs = pd.read_sql_query(runs, self.conn, params={'since': since, 'last': last})
+    df = df_runs.iloc[::-1].set_index('name')[['date']]
+    for path in paths:
+      df_path = pd.read_sql_query(
+        'SELECT runs.name, areas.value FROM instances JOIN areas ON areas.instance_id = instances.id '
+        'JOIN runs ON runs.id = areas.run_id WHERE instances.path = ?', self.conn, params=(path,))
+      df[path] = df_path.set_index('name')['value'].reindex(df.index)
+    df.index.name = 'run'
+    return df
+
+
+def history_figure(df_history):
+  '''
+  @param df_history: pd.DataFrame. Area over time as returned by AreaHistory.query
+  @return: go.Figure. One line per instance
+  '''
+  import plotly.graph_objects as go
+  fig = go.Figure()
+  for path in df_history.columns.drop('date'):
+    fig.add_trace(go.Scatter(
+      x = df_history['date'],
+      y = df_history[path],
+      name = path,
+      mode = 'lines+markers',
+      text = df_history.index,
+      hovertemplate = '<b>%{text}</b><br>%{x}<br>Area: %{y}',
+    ))
+  fig.update_layout(
+    xaxis_title = 'Run date',
+    yaxis_title = 'Area',
+    font = dict(size=14),
+    width = 1200,
+    height = 600,
+  )
+  return fig
+
+
+def get_args(argv = None):
+  parser = argparse.ArgumentParser(prog = 'area-plot history', description = 'Area of component instances over the runs ingested with area-plot ingest.')
+  parser.add_argument('--db', type = str, help = 'History database (default: $AREA_PLOT_HISTORY or area-history.db)')
+  parser.add_argument('--instance', '-i', type = str, nargs = '+', help = 'Full hierarchical paths of the instances, e.g. u_core/u_alu')
+  parser.add_argument('--since', type = str, help = 'ISO date of the first run to consider')
+  parser.add_argument('--last', type = int, help = 'Consider only the last runs')
+  parser.add_argument('--runs', action = 'store_true', help = 'List the ingested runs')
+  parser.add_argument('--csv', type = str, help = 'Write the area over time to this CSV file')
+  parser.add_argument('--plot', type = str, help = 'Plot the area over time to this path, without extension')
+  parser.add_argument('--formats', type = parse_formats, help = 'Comma separated list of plot formats among png,svg,pdf,jpg,webp,html', default = 'html')
+  args = parser.parse_args(argv)
+  if not args.instance and not args.runs:
+    parser.error('nothing to show, use --instance or --runs')
+  return args
+
+
+def main(argv = None):
+  args = get_args(argv)
+  with AreaHistory(args.db) as history:
+    if args.runs:
+      print(history.runs().to_string(index=False))
+    if not args.instance:
+      return 0
+    df_history = history.query(args.instance, args.since, args.last)
+  print(df_history.to_string())
+  if args.csv:
+    df_history.to_csv(args.csv)
+  if args.plot:
+    with Exporter(args.formats) as exporter:
+      exporter.add(history_figure(df_history), args.plot)
+  return 0
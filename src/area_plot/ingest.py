@@ -0,0 +1,42 @@
+#Copyright 2024 Politecnico di Torino.
+#
+#File: ingest.py
+#Description: Store the area of many reports in the history database
+
+
+import argparse
+import time
+
+from .batch import collect_reports
+from .history import AreaHistory
+
+
+def get_args(argv = None):
+  parser = argparse.ArgumentParser(prog = 'area-plot ingest', description = 'Parse reports and append their hierarchy to the history database queried by area-plot history.')
+  parser.add_argument('reports', type = str, nargs = '*', help = 'Report files or glob patterns, e.g. "nightly/*/area.rpt"')
+  parser.add_argument('--manifest', type = str, help = 'File listing one report path or glob pattern per line')
+  parser.add_argument('--db', type = str, help = 'History database (default: $AREA_PLOT_HISTORY or area-history.db)')
+  parser.add_argument('--run', type = str, help = 'Name of the run, only with a single report (default: the report path)')
+  parser.add_argument('--date', type = str, help = 'ISO date of the run, only with a single report (default: modification time of the report)')
+  parser.add_argument('--report-format', choices = ['auto', 'dc', 'genus', 'yosys', 'openroad'], help = 'Format of the reports (default: detected from the first bytes)', default = 'auto')
+  parser.add_argument('--replace', action = 'store_true', help = 'Replace the runs already ingested')
+  args = parser.parse_args(argv)
+  if not args.reports and not args.manifest:
+    parser.error('no report given, list the reports or use --manifest')
+  return args
+
+
+def main(argv = None):
+  args = get_args(argv)
+  reports = collect_reports(args.reports, args.manifest)
+  if len(reports) > 1 and (args.run or args.date):
+    raise ValueError("--run and --date require a single report")
+  with AreaHistory(args.db) as history:
+    for report in reports:
+      start = time.perf_counter()
+      count = history.ingest(report, args.run, args.date, args.replace, args.report_format)
+      if count:
+        print(f"{report}: {count} instances, {time.perf_counter() - start:.3f} s")
+      else:
+        print(f"{report}: already ingested")
+  return 0
@@ -6,35 +6,139 @@
 #Description: Treemap and sunburst plot starting from area report
 
 
-import plotly.graph_objects as go
 import argparse
-import pandas as pd
-from . import utils_area as utils
+from .export import Exporter, parse_formats
 import os
+import sys
+import json
+import importlib
 
 
-def get_args():
-  # Create an argument parser object
-  parser = argparse.ArgumentParser()
-  # Add mutually arguments
-  group = parser.add_mutually_exclusive_group(required=True)
-  group.add_argument('--filename', '-f', type = str, help = 'Name of the report file to parse', default = './area.rpt')
-  group.add_argument('--load-from-csv', type = str, help = 'Load the hierarchy from the specified csv file')
-  # Add arguments
+# plotly, pandas and kaleido are imported only by the stages using them, so
+# that --help, --no-plot runs and the subcommands start fast
+
+# Subcommands of area-plot, each one is a module with a main(argv) function
+COMMANDS = {
+  'batch': 'batch',
+  'bench': 'bench',
+  'diff': 'diff',
+  'history': 'history',
+  'ingest': 'ingest',
+  'serve': 'serve',
+}
+
+# Colors of the first level modules
+DEFAULT_COLORMAP = ['#d58936', '#39393a','#90C290','#6d1a36','#39393a','#007480']
+
+
+def add_plot_arguments(parser):
+  '''
+  Add the options shared by all the commands generating plots from a report
+  @param parser: argparse.ArgumentParser. Parser to extend
+  '''
+  parser.add_argument('--report-format', choices=['auto', 'dc', 'genus', 'yosys', 'openroad'], help = 'Format of the report: Synopsys DC, Cadence Genus, Yosys stat or OpenROAD flow (Yosys) (default: detected from the first bytes)', default = 'auto')
   parser.add_argument('--out-dir', '-o', type = str, help = 'Output directory where to store the generated plots.', default = '.')
-  parser.add_argument('--skip_rename', action='store_true', help = 'Skip looking for duplicates in the hierarchy. This may break the plot if duplicates are present, but it is faster.')
-  parser.add_argument('--top-module', '-t', type = str, nargs='?', const='', help = 'Name of the top module to plot')
+  parser.add_argument('--skip_rename', action='store_true', help = 'Skip looking for duplicates in the hierarchy. This may break the plot if duplicates are present.')
+  parser.add_argument('--top-module', '-t', type = str, nargs='*', help = 'Name of the top module to plot, one plot for each one if many (default: the top of the report)')
+  parser.add_argument('--top-depth', type = int, help = 'Plot each component this number of levels below the top modules, e.g. 1 for the subsystems of the top; collapsed components are not counted')
+  parser.add_argument('--plot-workers', type = int, help = 'Number of threads plotting the top modules (default: 1). The plots mostly hold the GIL, the threads only overlap the waits on the export stage')
   parser.add_argument('--max-levels-hier', '-d', type = int, help = 'Maximum number of levels to consider in the hierarchy', default = 4)
   parser.add_argument('--threshold', type = float, help = 'Minimum area percentage with respect to the parent to plot a component', default = 0)
+  parser.add_argument('--collapse', type = str, nargs = '*', help = 'Remove the components whose id matches any of these patterns, moving their children to the nearest kept ancestor; no pattern keeps all the components', default = ['wrapper'])
+  parser.add_argument('--collapse-match', choices = ['substring', 'regex', 'glob'], help = 'How the --collapse patterns are matched against the ids, ignoring the case', default = 'substring')
+  parser.add_argument('--lod', action='store_true', help = 'Level of detail: keep in the plot data only the levels displayed according to --max-levels-hier')
+  parser.add_argument('--max-nodes', type = int, help = 'Level of detail: maximum number of components in the plot, the smallest ones are merged into an "others" component of their parent')
+  parser.add_argument('--drill-down', action='store_true', help = 'Level of detail, with one linked HTML page per subtree beyond --max-levels-hier')
+  parser.add_argument('--drill-down-max-pages', type = int, help = 'Maximum number of drill-down pages', default = 1000)
+  parser.add_argument('--metric', choices=['total', 'combinational', 'sequential', 'black_box', 'buf_inv'], help = 'Area to plot: the total one or one of the breakdowns of the report', default = 'total')
   parser.add_argument('--plot-mode', choices=['total','remainder'], default = 'total')
   parser.add_argument('--plot-type', type = str, help = 'Type of plot to generate, for now support only treemap and sunburst', default = 'treemap')
   parser.add_argument('--show', action='store_true', help = 'Show the plot')
-  parser.add_argument('--colormap', type = str, nargs="+",  help = 'Colormap to use for the plot', default = ['#d58936', '#39393a','#90C290','#6d1a36','#39393a','#007480'])
-  return parser.parse_args()
+  parser.add_argument('--colormap', type = str, nargs="+",  help = 'Colormap to use for the plot', default = DEFAULT_COLORMAP)
+  parser.add_argument('--no-plot', action='store_true', help = 'Only write the processed hierarchy as CSV and JSON, without plotting (plotly is not even imported)')
+  parser.add_argument('--stats', action='store_true', help = 'Add the statistics of each component (percentage of the parent and root area, depth, number of instances, self area, rank among siblings) to the exported hierarchy')
+  parser.add_argument('--table-format', choices=['csv', 'parquet'], help = 'Format of the exported hierarchy, parquet requires pyarrow', default = 'csv')
+  parser.add_argument('--formats', type = parse_formats, help = 'Comma separated list of output formats among png,svg,pdf,jpg,webp,html', default = 'png,svg,html')
+  parser.add_argument('--html-mode', choices=['standalone', 'compact'], help = 'standalone: embed plotly.js in every HTML file, compact: load a shared plotly.js and pack the data', default = 'standalone')
+  parser.add_argument('--plotlyjs', type = str, help = "Where compact HTML files load plotly.js from: 'directory' (one plotly.min.js per output directory), 'cdn', or a path/URL", default = 'directory')
+  parser.add_argument('--html-gzip', action='store_true', help = 'Gzip the HTML files (not with --drill-down)')
+  parser.add_argument('--profile', action='store_true', help = 'Record the wall time, CPU time, rows and peak memory of each stage, written as a Chrome trace to profile.json in the output directory')
+  parser.add_argument('--profile-stages', type = str, nargs = '+', help = "Run these stages under cProfile (implies --profile), 'all' for every stage; the statistics are written to profile_<stage>.prof", choices = ['all', 'load', 'rename_duplicates', 'write_table', 'hierarchical_metrics', 'plot_threshold', 'remove_wrappers', 'level_of_detail', 'write_json', 'plot', 'export'])
+  parser.add_argument('--export-timings', action='store_true', help = 'Print the time spent exporting each format')
+  parser.add_argument('--no-cache', action='store_true', help = 'Do not read nor write the cache of the parsed reports')
+  parser.add_argument('--cache-dir', type = str, help = 'Directory of the cache of the parsed reports (default: ~/.cache/area-plot)')
+  parser.add_argument('--cache-max-size', type = int, help = 'Maximum size of the cache in MB, least recently used reports are evicted first', default = 2048)
+
+def get_args(argv = None):
+  # Create an argument parser object
+  parser = argparse.ArgumentParser(epilog = 'Other commands: ' + ', '.join(f'area-plot {cmd} --help' for cmd in COMMANDS))
+  # Add mutually arguments
+  group = parser.add_mutually_exclusive_group(required=True)
+  group.add_argument('--filename', '-f', type = str, help = 'Name of the report file to parse', default = './area.rpt')
+  group.add_argument('--load-from-csv', type = str, help = 'Load the hierarchy from the specified csv file')
+  # Add arguments
+  add_plot_arguments(parser)
+  return parser.parse_args(argv)
+
+def load_report(filename, skip_rename, cache = None, fmt = 'auto'):
+  '''
+  Parse the report, or load its hierarchy from the cache
+  @param filename: str. Name of the report to parse
+  @param skip_rename: bool. Do not rename the duplicated ids
+  @param cache: ReportCache. Cache of the parsed reports, None to disable it
+  @param fmt: str. Format of the report, 'auto' to detect it
+  @return: pd.DataFrame. DataFrame with the area of the components instance
+  '''
+  from . import utils_area as utils
+  if cache is not None:
+    key = cache.key(filename, renamed = not skip_rename, fmt = fmt)
+    df_tree = cache.load(key)
+    if df_tree is not None:
+      print(f"Loaded {filename} from cache")
+      return df_tree
+  df_tree = utils.get_df_from_report(filename, fmt = fmt)
+  # Find duplicate and rename them and all their children 'parent' field
+  # Note: renaming is required not to break the plotly plot
+  if not skip_rename:
+    df_tree = utils.rename_duplicates(df_tree, None)
+  if cache is not None:
+    cache.store(key, df_tree)
+  return df_tree
+
+def export_figure(fig, base_path, exporter = None):
+  '''
+  Export the figure through the exporter of the run, or as PNG, SVG and HTML if not given
+  '''
+  if exporter is not None:
+    exporter.add(fig, base_path)
+  else:
+    with Exporter(['png', 'svg', 'html']) as exporter:
+      exporter.add(fig, base_path)
 
-def treemap_plot(df_tree, top_module, max_levels_hier, plot_mode, colormap, show = False, out_dir = "."):
+def breakdown_hover(df_tree):
+  '''
+  Hover showing the area breakdown of each component, if available in the report
+  @param df_tree: pd.DataFrame. DataFrame with the area of the components instance
+  @return: tuple. customdata (None if no breakdown) and hovertemplate lines
+  '''
+  import numpy as np
+  from . import utils_area as utils
+  metrics = utils.metric_columns(df_tree)
+  if not metrics:
+    return None, ''
+  breakdown = df_tree[metrics].to_numpy(dtype=float)
+  total = breakdown.sum(axis=1, keepdims=True)
+  share = np.divide(breakdown, total, out=np.full_like(breakdown, np.nan), where=total > 0)
+  lines = ''.join(f'<br>{col.replace("_", " ").capitalize()}: %{{customdata[{i}]:.1f}} (%{{customdata[{i + len(metrics)}]:.1%}})'
+                  for i, col in enumerate(metrics))
+  return np.hstack([breakdown, share]), lines
+
+def treemap_figure(df_tree, top_module, max_levels_hier, plot_mode, colormap):
+  import plotly.graph_objects as go
+  from . import utils_area as utils
   # adjust colormap
   df_tree = utils.assign_colors(df_tree, top_module, colormap)
+  customdata, breakdown = breakdown_hover(df_tree)
   
   fig = go.Figure()
   fig.add_trace(go.Treemap(
@@ -49,7 +153,8 @@ def treemap_plot(df_tree, top_module, max_levels_hier, plot_mode, colormap, show
       marker_colors = df_tree['color'],
       textinfo = 'label+percent parent',
       branchvalues = plot_mode,
-      hovertemplate='<b>%{label}</b><br>Area: %{value}<br>%{percentParent:.2%} of parent<br>%{percentRoot:.2%} of total',
+      customdata = customdata,
+      hovertemplate='<b>%{label}</b><br>Area: %{value}<br>%{percentParent:.2%} of parent<br>%{percentRoot:.2%} of total' + breakdown,
       #sort=True
   ))
   fig.update_layout(
@@ -64,19 +169,24 @@ def treemap_plot(df_tree, top_module, max_levels_hier, plot_mode, colormap, show
     outsidetextfont=dict(color='white'),
     selector=dict(type='treemap')
   )
+  return fig
 
+def treemap_plot(df_tree, top_module, max_levels_hier, plot_mode, colormap, show = False, out_dir = ".", exporter = None):
+  fig = treemap_figure(df_tree, top_module, max_levels_hier, plot_mode, colormap)
   if show:
     fig.show()
   # save figure
   base_path = os.path.join(out_dir, str(top_module) + "_treemap")
-  fig.write_image(str(base_path) + ".png", engine="kaleido")
-  fig.write_image(str(base_path) + ".svg", engine="kaleido")
-  fig.write_html(str(base_path) + ".html")
+  export_figure(fig, base_path, exporter)
+  return fig
 
 
-def sunburst_plot(df_tree, top_module, max_levels_hier, plot_mode, colormap, show = False, out_dir = "."):
+def sunburst_figure(df_tree, top_module, max_levels_hier, plot_mode, colormap):
+  import plotly.graph_objects as go
+  from . import utils_area as utils
   # adjust colormap
   df_tree = utils.assign_colors(df_tree, top_module, colormap)
+  customdata, breakdown = breakdown_hover(df_tree)
   
   fig = go.Figure()
   fig.add_trace(go.Sunburst(
@@ -91,6 +201,8 @@ def sunburst_plot(df_tree, top_module, max_levels_hier, plot_mode, colormap, sho
       level= top_module, # should be equal to the id or else the label of the starting component
       marker_colors = df_tree['color'],
       branchvalues = plot_mode,
+      customdata = customdata,
+      hovertemplate = '<b>%{label}</b><br>Area: %{value}<br>%{percentParent:.2%} of parent' + breakdown if customdata is not None else None,
       #sort=True
   ))
   fig.update_layout(
@@ -99,35 +211,128 @@ def sunburst_plot(df_tree, top_module, max_levels_hier, plot_mode, colormap, sho
     width=500,
     height=500,
   )
+  return fig
+
+def sunburst_plot(df_tree, top_module, max_levels_hier, plot_mode, colormap, show = False, out_dir = ".", exporter = None):
+  fig = sunburst_figure(df_tree, top_module, max_levels_hier, plot_mode, colormap)
   if show:
     fig.show()
   # save figure
   base_path = os.path.join(out_dir, str(top_module) + "_sunburst")
-  fig.write_image(base_path + ".png", engine="kaleido")
-  fig.write_image(base_path + ".svg", engine="kaleido")
-  fig.write_html(base_path + ".html")
+  export_figure(fig, base_path, exporter)
+  return fig
 
-def main():
-  args = get_args()
+# Open the drill-down page of a sector, if any, instead of zooming into it
+DRILL_DOWN_SCRIPT = '''
+var gd = document.getElementById('{plot_id}');
+var links = %s;
+function follow(event) {
+  var point = event.points && event.points[0];
+  if (point && links[point.id]) {
+    window.location.href = links[point.id];
+    return false;
+  }
+}
+gd.on('plotly_treemapclick', follow);
+gd.on('plotly_sunburstclick', follow);
+'''
+
+def drill_down_plots(df_tree, top_module, args, exporter):
+  '''
+  Plot the hierarchy as linked pages: each page shows max_levels_hier levels
+  (and at most max_nodes components) and clicking one of its deepest components
+  opens the page of its subtree. Only the page of the top_module is exported in
+  all the formats, the other ones are HTML only.
+  @param df_tree: pd.DataFrame. DataFrame with the area of the components instance
+  @param top_module: str. Name of the top module
+  @param args: argparse.Namespace. Options as returned by get_args
+  @param exporter: Exporter. Export stage of the run
+  '''
+  from . import utils_area as utils
+  from .hier_tree import HierTree
+  if 'html' not in args.formats:
+    raise ValueError("--drill-down requires the html format.")
+  if args.html_gzip:
+    # Browsers download the gzipped pages instead of following the links to them
+    raise ValueError("--drill-down cannot be used with --html-gzip.")
+  figure = treemap_figure if args.plot_type == 'treemap' else sunburst_figure
+  tree = HierTree.from_dataframe(df_tree)
+  top = tree.find(top_module)
+  if len(top) == 0:
+    raise ValueError(f"Top module '{top_module}' not found.")
+  name = f"{top_module}_{args.plot_type}"
+  pages_dir = name + "_pages"
+  # Page path of each node, relative to the output directory
+  page = {top[0]: name}
+  queue = [top[0]]
+  while queue:
+    node = queue.pop(0)
+    nodes, others = tree.level_of_detail(node, args.max_levels_hier, args.max_nodes)
+    df_page = utils.subtree_frame(df_tree, tree, nodes, others)
+    # Deepest components of the page, with hidden children
+    boundary = nodes[(tree.depth[nodes] - tree.depth[node] == args.max_levels_hier - 1) & (tree.size[nodes] > 1)]
+    page_dir = os.path.dirname(page[node])
+    links = {}
+    for child in boundary:
+      if len(page) >= args.drill_down_max_pages:
+        break
+      page[child] = os.path.join(pages_dir, str(tree.ids[child]))
+      links[tree.ids[child]] = os.path.relpath(page[child], page_dir) + ".html"
+      queue.append(child)
+    fig = figure(df_page, tree.ids[node], args.max_levels_hier, args.plot_mode, args.colormap)
+    if node != top[0]:
+      # Closest ancestor with a page
+      ancestor = next(a for a in tree.ancestors(node) if a in page)
+      up = os.path.relpath(page[ancestor], page_dir) + ".html"
+      fig.update_layout(title=dict(text=f'<a href="{up}">&#8593; {tree.columns["label"][ancestor]}</a>  /  {tree.columns["label"][node]}'))
+    os.makedirs(os.path.join(args.out_dir, page_dir), exist_ok=True)
+    post_script = DRILL_DOWN_SCRIPT % json.dumps(links) if links else None
+    exporter.add(fig, os.path.join(args.out_dir, page[node]), formats = None if node == top[0] else ['html'], post_script = post_script)
+
+def run(args):
+  '''
+  Generate the plots of a report
+  @param args: argparse.Namespace. Options as returned by get_args
+  '''
+  from .profiler import Profiler
+  profiler = Profiler(args.profile or bool(args.profile_stages), args.profile_stages)
+  try:
+    run_stages(args, profiler)
+  finally:
+    for path in profiler.write(args.out_dir):
+      print(f"Profile written to {path}")
+    if profiler.enabled:
+      profiler.print_summary()
+
+def run_stages(args, profiler):
+  '''
+  Stages of run, each one measured by the profiler
+  @param args: argparse.Namespace. Options as returned by get_args
+  @param profiler: Profiler. Profiler of the run
+  '''
+  import functools
+  import pandas as pd
+  from . import utils_area as utils
+  from .cache import ReportCache
   filename = args.filename
 
-  # define colormap as a list of hex colors
-  colormap = args.colormap
-  if (args.load_from_csv != None):
-    df_tree = pd.read_csv(args.load_from_csv)
-  else:
-    df_tree = utils.get_df_from_report(filename)
+  with profiler.stage('load') as stage:
+    if (args.load_from_csv != None):
+      df_tree = pd.read_csv(args.load_from_csv)
+    else:
+      cache = None if args.no_cache else ReportCache(args.cache_dir, args.cache_max_size << 20)
+      df_tree = load_report(filename, args.skip_rename, cache, args.report_format)
+    stage.rows = len(df_tree)
+  if df_tree.empty:
+    raise ValueError(f"No component found in {filename if args.load_from_csv is None else args.load_from_csv}")
   
   # Remove rows with value 0
   #df_tree = df_tree[df_tree['value'] != 0]
 
   # Infer top module if not provided
-  if (args.top_module == None or args.top_module == ""):
-    top_module = df_tree['id'].iloc[0]
-  else:
-    top_module = args.top_module
-  
-  print("Selected top-level module: ", top_module)
+  top_modules = [top for top in args.top_module if top] if args.top_module else []
+  if not top_modules:
+    top_modules = [df_tree['id'].iloc[0]]
 
   # Create the output directory
   if not os.path.exists(args.out_dir):
@@ -135,31 +340,166 @@ def main():
   
   # Find duplicate and rename them and all their children 'parent' field
   # Note: renaming is required not to break the plotly plot
+  # Reports are renamed when parsed, so that the renamed hierarchy is cached
   if not args.skip_rename:
-    df_tree = utils.rename_duplicates(df_tree, top_module)
-    # save not to call it every time
+    with profiler.stage('rename_duplicates') as stage:
+      df_tree = utils.rename_duplicates(df_tree, top_modules)
+      for top_module in top_modules:
+        utils.check_top_module(df_tree, top_module)
+      stage.rows = len(df_tree)
+
+  # The table of the whole hierarchy is named after the top module, or the top of the report
+  table_name = top_modules[0] if len(top_modules) == 1 else df_tree['id'].iloc[0]
+  if args.top_depth is not None:
+    top_modules = utils.modules_at_depth(df_tree, top_modules, args.top_depth, args.collapse, args.collapse_match)
+  print("Selected top-level module: ", ', '.join(map(str, top_modules)))
   
-  csv_path = os.path.join(args.out_dir, str(top_module) + ".csv")
-  df_tree.to_csv(csv_path, index=False)
+  # Per component statistics, as extra columns of the exported hierarchy
+  with profiler.stage('write_table') as stage:
+    df_export = utils.compute_stats(df_tree) if args.stats else df_tree
+    table_path = os.path.join(args.out_dir, str(table_name) + "." + args.table_format)
+    if args.table_format == 'parquet':
+      df_export.to_parquet(table_path, index=False)
+    else:
+      df_export.to_csv(table_path, index=False)
+    stage.rows = len(df_export)
   
-  # Ensure the values are numeric
-  df_tree['value'] = pd.to_numeric(df_tree['value'], errors='coerce')
+  with profiler.stage('hierarchical_metrics') as stage:
+    # Ensure the values are numeric
+    df_tree['value'] = pd.to_numeric(df_tree['value'], errors='coerce')
+
+    # The breakdown of the report is local, include the children in it
+    df_tree = utils.hierarchical_metrics(df_tree)
+    if args.metric != 'total':
+      if args.metric not in df_tree.columns:
+        raise ValueError(f"No {args.metric} area found in {filename if args.load_from_csv is None else args.load_from_csv}")
+      df_tree['value'] = df_tree[args.metric]
+    stage.rows = len(df_tree)
 
-  # Merge entries lower than the threshold into a single entry called 'others'
-  if (args.threshold != None and args.threshold > 0 and args.threshold < 1):
-    df_tree = utils.plot_threshold(df_tree, top_module, args.threshold)
+  # Without a threshold the collapsed hierarchy is the same for all the top modules
+  threshold = get_threshold(args)
+  if len(top_modules) > 1:
+    ids = set(df_tree['id'])
+    missing = [top_module for top_module in top_modules if top_module not in ids]
+    if missing:
+      raise ValueError(f"Top module '{missing[0]}' not found.")
+  if threshold is None:
+    with profiler.stage('remove_wrappers') as stage:
+      df_tree = utils.collapse_modules(df_tree, args.collapse, args.collapse_match)
+      stage.rows = len(df_tree)
 
-  # Remove wrappers
-  df_tree = utils.remove_wrappers(df_tree)
+  # Many top modules: index the hierarchy once, the subtree of each top module
+  # is then extracted from the shared tree, that the threads only read
+  tree = None
+  if len(top_modules) > 1:
+    from .hier_tree import HierTree
+    tree = HierTree.from_dataframe(df_tree)
+  workers = min(len(top_modules), args.plot_workers or 1)
+  if profiler.cprofile_stages:
+    # cProfile cannot profile concurrent threads
+    workers = 1
+  plot_top = functools.partial(plot_top_module, df_tree, args = args, profiler = profiler, tree = tree)
+
+  if args.no_plot:
+    for_each_top_module(functools.partial(plot_top, exporter = None), top_modules, workers)
+    print(f"Hierarchy written to {table_path}")
+    return
+
+  # Plot the treemaps, the export stage includes waiting for the files being written
+  html_options = {'compact': args.html_mode == 'compact', 'plotlyjs': args.plotlyjs, 'compress': args.html_gzip}
+  with profiler.stage('export') as export_stage:
+    with Exporter(args.formats, html_options) as exporter:
+      for_each_top_module(functools.partial(plot_top, exporter = exporter), top_modules, workers)
+    export_stage.rows = len(exporter.spans)
+  profiler.add_spans(exporter.spans)
+  if args.export_timings:
+    exporter.print_timings()
+
+def for_each_top_module(function, top_modules, workers):
+  '''
+  Call function on each top module, over a pool of threads if workers > 1
+  @param function: callable. Function of the top module
+  @param top_modules: list of str. Names of the top modules
+  @param workers: int. Number of threads
+  '''
+  if workers <= 1:
+    for top_module in top_modules:
+      function(top_module)
+    return
+  from concurrent.futures import ThreadPoolExecutor
+  with ThreadPoolExecutor(max_workers = workers) as pool:
+    # Raise the first error, if any, once all the top modules are done
+    list(pool.map(function, top_modules))
+
+def get_threshold(args):
+  '''
+  @param args: argparse.Namespace. Options as returned by get_args
+  @return: float. Threshold of the plots, None if not set or out of ]0, 1[
+  '''
+  return args.threshold if args.threshold != None and args.threshold > 0 and args.threshold < 1 else None
+
+def plot_top_module(df_tree, top_module, args, exporter, profiler, tree = None):
+  '''
+  Stages of run specific to a top module: subtree and threshold, collapse, level of detail and plot
+  @param df_tree: pd.DataFrame. DataFrame with the area of the components instance, not modified,
+  already collapsed if no threshold is set
+  @param top_module: str. Name of the top module
+  @param args: argparse.Namespace. Options as returned by get_args
+  @param exporter: Exporter. Export stage of the run, None with --no-plot
+  @param profiler: Profiler. Profiler of the run
+  @param tree: HierTree. Tree of df_tree shared by the top modules
+  '''
+  from . import utils_area as utils
+  # The stages are tagged with the top module if there are many
+  detail = None if tree is None else top_module
+  threshold = get_threshold(args)
+
+  # Keep only the subtree of the top module, merging the entries lower than the
+  # threshold into a single entry called 'others'
+  with profiler.stage('plot_threshold', detail) as stage:
+    df_tree = utils.plot_threshold(df_tree, top_module, threshold or 0, tree)
+    stage.rows = len(df_tree)
+
+  if threshold is not None:
+    # Remove the wrappers, and the other collapsed components
+    with profiler.stage('remove_wrappers', detail) as stage:
+      df_tree = utils.collapse_modules(df_tree, args.collapse, args.collapse_match)
+      stage.rows = len(df_tree)
   # Not required, total mode works for < area of children than parent
   #df_tree = utils.make_dataset_complete(df_tree)
 
-  # Plot the treemap
-  if (args.plot_type == 'treemap'):
-    treemap_plot(df_tree, top_module, args.max_levels_hier, args.plot_mode, colormap, args.show, args.out_dir)
-  elif (args.plot_type == 'sunburst'):
-    sunburst_plot(df_tree, top_module, args.max_levels_hier, args.plot_mode, colormap, args.show, args.out_dir)
+  # Level of detail: ship to the plot only what is displayed
+  if (args.lod or args.max_nodes is not None) and not args.drill_down:
+    with profiler.stage('level_of_detail', detail) as stage:
+      df_tree = utils.level_of_detail(df_tree, top_module, args.max_levels_hier, args.max_nodes)
+      stage.rows = len(df_tree)
+
+  if exporter is None:
+    with profiler.stage('write_json', detail) as stage:
+      json_path = os.path.join(args.out_dir, str(top_module) + ".json")
+      if args.stats:
+        df_tree = utils.compute_stats(df_tree)
+      df_tree.to_json(json_path, orient='records')
+      stage.rows = len(df_tree)
+    print(f"Hierarchy of {top_module} written to {json_path}")
+    return
+
+  with profiler.stage('plot', detail) as stage:
+    if args.drill_down:
+      drill_down_plots(df_tree, top_module, args, exporter)
+    elif (args.plot_type == 'treemap'):
+      treemap_plot(df_tree, top_module, args.max_levels_hier, args.plot_mode, args.colormap, args.show, args.out_dir, exporter)
+    elif (args.plot_type == 'sunburst'):
+      sunburst_plot(df_tree, top_module, args.max_levels_hier, args.plot_mode, args.colormap, args.show, args.out_dir, exporter)
+    stage.rows = len(df_tree)
   
+def main():
+  # Dispatch the subcommands, e.g. area-plot batch ...
+  if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+    command = importlib.import_module('.' + COMMANDS[sys.argv[1]], __package__)
+    return command.main(sys.argv[2:])
+  run(get_args())
+
 if __name__ == '__main__':
   main()
 
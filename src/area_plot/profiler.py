@@ -0,0 +1,155 @@
+#Copyright 2024 Politecnico di Torino.
+#
+#File: profiler.py
+#Description: Per stage timing and memory instrumentation of the pipeline
+
+
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+
+def peak_rss_mb():
+  '''
+  @return: float. Peak resident set size of the process in MB, None if not available
+  '''
+  try:
+    import resource
+  except ImportError:
+    return None
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # Bytes on macOS, kB elsewhere
+  return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+class StageRecord:
+  '''
+  Measures of a stage, rows is set by the stage itself
+  '''
+
+  def __init__(self, name, start, detail=None):
+    self.name = name
+    self.detail = detail
+    self.start = start
+    self.thread = threading.get_ident()
+    self.wall = 0.0
+    self.cpu = 0.0
+    self.rows = None
+    self.peak_rss_mb = None
+
+
+class Profiler:
+  '''
+  Records the wall time, CPU time, output rows and peak memory of each stage of
+  a run, and writes them as a Chrome trace-event file, to be opened with
+  chrome://tracing or https://ui.perfetto.dev. Selected stages can also be run
+  under cProfile, their statistics are dumped for pstats or snakeviz.
+  A disabled profiler only runs the stages. Stages can run in several threads,
+  e.g. one per top module, each thread is a track of the trace.
+  '''
+
+  def __init__(self, enabled=False, cprofile_stages=None):
+    '''
+    @param enabled: bool. Record the stages
+    @param cprofile_stages: list of str. Stages to run under cProfile, 'all' for every stage
+    '''
+    self.enabled = enabled
+    self.cprofile_stages = set(cprofile_stages or [])
+    self.records = []
+    self.spans = []
+    self.profiles = {}
+    self._origin = time.perf_counter()
+
+  @contextlib.contextmanager
+  def stage(self, name, detail=None):
+    '''
+    Measure a stage, e.g.:
+      with profiler.stage('parse') as stage:
+        df = parse()
+        stage.rows = len(df)
+    @param name: str. Name of the stage
+    @param detail: str. What the stage is run on, e.g. the top module, if it runs more than once
+    @return: context manager yielding the StageRecord of the stage
+    '''
+    record = StageRecord(name, time.perf_counter(), detail)
+    if not self.enabled:
+      yield record
+      return
+    profile = None
+    if name in self.cprofile_stages or 'all' in self.cprofile_stages:
+      import cProfile
+      profile = cProfile.Profile()
+    cpu = time.process_time()
+    try:
+      if profile is not None:
+        profile.enable()
+      yield record
+    finally:
+      if profile is not None:
+        profile.disable()
+        self.profiles[name if detail is None else f'{name}_{detail}'] = profile
+      record.wall = time.perf_counter() - record.start
+      record.cpu = time.process_time() - cpu
+      record.peak_rss_mb = peak_rss_mb()
+      self.records.append(record)
+
+  def add_spans(self, spans):
+    '''
+    Add the spans measured by other threads, e.g. the files written by the Exporter
+    @param spans: list of tuple. Name, category, start (time.perf_counter), seconds and thread id
+    '''
+    self.spans += spans
+
+  def trace(self):
+    '''
+    @return: dict. Chrome trace-event document of the recorded stages and spans
+    '''
+    pid = os.getpid()
+    to_us = lambda t: round((t - self._origin) * 1e6, 1)
+    events = []
+    for record in self.records:
+      events.append({
+        'name': record.name, 'cat': 'stage', 'ph': 'X', 'pid': pid, 'tid': record.thread,
+        'ts': to_us(record.start), 'dur': round(record.wall * 1e6, 1),
+        'args': {'cpu_ms': round(record.cpu * 1e3, 3), 'rows': record.rows, 'peak_rss_mb': record.peak_rss_mb},
+      })
+      if record.detail is not None:
+        events[-1]['args']['detail'] = record.detail
+      if record.peak_rss_mb is not None:
+        events.append({'name': 'peak RSS', 'ph': 'C', 'pid': pid, 'ts': to_us(record.start + record.wall),
+                       'args': {'MB': round(record.peak_rss_mb, 1)}})
+    for name, category, start, seconds, thread in self.spans:
+      events.append({'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': thread,
+                     'ts': to_us(start), 'dur': round(seconds * 1e6, 1)})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+  def write(self, out_dir, name='profile'):
+    '''
+    Write the trace as <out_dir>/<name>.json and the cProfile statistics as <out_dir>/<name>_<stage>.prof
+    @param out_dir: str. Output directory
+    @param name: str. Base name of the output files
+    @return: list of str. Files written
+    '''
+    if not self.enabled:
+      return []
+    os.makedirs(out_dir, exist_ok=True)
+    trace_path = os.path.join(out_dir, f'{name}.json')
+    with open(trace_path, 'w') as file:
+      json.dump(self.trace(), file)
+    paths = [trace_path]
+    for stage, profile in self.profiles.items():
+      path = os.path.join(out_dir, f'{name}_{stage}.prof')
+      profile.dump_stats(path)
+      paths.append(path)
+    return paths
+
+  def print_summary(self):
+    print(f"{'stage':<32}  {'wall s':>9}  {'cpu s':>9}  {'rows':>10}  {'peak RSS MB':>11}")
+    for record in self.records:
+      rows = record.rows if record.rows is not None else '-'
+      rss = f'{record.peak_rss_mb:.1f}' if record.peak_rss_mb is not None else '-'
+      name = record.name if record.detail is None else f'{record.name} {record.detail}'
+      print(f"{name:<32}  {record.wall:>9.3f}  {record.cpu:>9.3f}  {rows:>10}  {rss:>11}")
@@ -0,0 +1,268 @@
+import argparse
+import sys
+
+import numpy as np
+
+
+HEADER = '''****************************************
+Report : area
+Design : {top}
+Version: synthetic
+Date   : synthetic
+****************************************
+
+Library(s) Used:
+
+    synthetic_lib (File: /dev/null)
+
+Number of ports:                         {ports}
+Number of cells:                         {cells}
+
+Combinational area:              {comb:.6f}
+Noncombinational area:           {noncomb:.6f}
+Total cell area:                 {total:.6f}
+
+Hierarchical area distribution
+------------------------------
+
+                                  Global cell area          Local cell area
+                                  ------------------  ---------------------------
+Hierarchical cell                 Absolute   Percent  Combi-    Noncombi-  Black-
+                                  Total      Total    national  national   boxes   Design
+--------------------------------  ---------  -------  --------  ---------  ------  ------
+'''
+SEPARATOR = '--------------------------------  ---------  -------  --------  ---------  ------  ------\n'
+
+
+def generate_hierarchy(n_instances, fanout=4, seed=0):
+  '''
+  Generate a synthetic hierarchy shaped as a complete tree.
+  @param n_instances: int. Number of component instances, including the top module
+  @param fanout: int. Number of children of each internal instance
+  @param seed: int. Seed of the random generator
+  @return: tuple of np.ndarray. Parent index (-1 for the top module), total area, combinational and sequential local area
+  '''
+  if fanout < 2:
+    raise ValueError("fanout must be at least 2")
+  rng = np.random.default_rng(seed)
+  idx = np.arange(n_instances)
+  parent = np.where(idx > 0, (idx - 1) // fanout, -1)
+  # Siblings share 90% of the parent area, the rest is local logic
+  share = rng.random(n_instances) + 0.05
+  share_sum = np.bincount(parent[1:], weights=share[1:], minlength=n_instances)
+  area = np.empty(n_instances)
+  area[0] = 1e6
+  start, width = 1, fanout
+  while start < n_instances:
+    stop = min(start + width, n_instances)
+    level = idx[start:stop]
+    area[level] = area[parent[level]] * 0.9 * share[level] / share_sum[parent[level]]
+    start, width = stop, width * fanout
+  children_area = np.bincount(parent[1:], weights=area[1:], minlength=n_instances)
+  local = area - children_area
+  comb_ratio = rng.uniform(0.3, 0.9, n_instances)
+  return parent, area, local * comb_ratio, local * (1 - comb_ratio)
+
+
+GENUS_HEADER = '''============================================================
+  Generated by:           Genus(TM) Synthesis Solution synthetic
+  Generated on:           synthetic
+  Module:                 {top}
+  Technology library:     synthetic_lib
+  Operating conditions:   synthetic
+  Wireload mode:          enclosed
+  Area mode:              timing library
+============================================================
+
+  Instance       Module       Cell Count  Cell Area  Net Area  Total Area  Wireload  
+------------------------------------------------------------------------------------
+'''
+
+
+def fanout_for_depth(n_instances, depth):
+  '''
+  @param n_instances: int. Number of component instances, including the top module
+  @param depth: int. Number of levels of the hierarchy, top module included
+  @return: int. Smallest fanout (at least 2) fitting the instances in depth levels
+  '''
+  if depth < 2:
+    raise ValueError("depth must be at least 2")
+  fanout = 2
+  while (fanout ** depth - 1) // (fanout - 1) < n_instances:
+    fanout += 1
+  return fanout
+
+
+def generate_names(n_instances, fanout, duplicate_ratio=1.0, wrapper_ratio=0.0, seed=0):
+  '''
+  Generate the instance names of the complete tree of generate_hierarchy.
+  Names are unique among siblings, so that the paths are unique.
+  @param n_instances: int. Number of component instances, including the top module
+  @param fanout: int. Number of children of each internal instance
+  @param duplicate_ratio: float. Share of the instances named after their position
+  among the siblings (u_blk_<k>), a name shared with the cousins; the others
+  have a unique name (u_inst_<node>)
+  @param wrapper_ratio: float. Share of the internal instances named as wrappers (<name>_wrapper)
+  @param seed: int. Seed of the random generator
+  @return: np.ndarray of str. Name of each instance, None for the top module
+  '''
+  rng = np.random.default_rng([seed, 1])
+  idx = np.arange(n_instances)
+  sibling = (idx - 1) % fanout
+  duplicate = rng.random(n_instances) < duplicate_ratio
+  names = np.where(duplicate, np.char.add('u_blk_', sibling.astype(str)), np.char.add('u_inst_', idx.astype(str))).astype(object)
+  internal = idx * fanout + 1 < n_instances
+  wrapper = internal & (rng.random(n_instances) < wrapper_ratio)
+  names[wrapper] = names[wrapper] + '_wrapper'
+  names[0] = None
+  return names
+
+
+def iter_preorder(n_instances, fanout, top, names=None):
+  '''
+  Visit the complete tree of generate_hierarchy depth first.
+  @param n_instances: int. Number of component instances, including the top module
+  @param fanout: int. Number of children of each internal instance
+  @param top: str. Name of the top module
+  @param names: np.ndarray of str. Name of each instance, see generate_names (default: u_blk_<k> for the k-th sibling)
+  @return: generator of tuple. Node index, instance name, depth and path (first level instances without the top module)
+  '''
+  # Children of node p are p * fanout + 1 ... p * fanout + fanout
+  stack = [(0, top, 0, top)]
+  while stack:
+    node, name, depth, path = stack.pop()
+    yield node, name, depth, path
+    first = node * fanout + 1
+    last = min(first + fanout, n_instances)
+    prefix = '' if node == 0 else path + '/'
+    for child in range(last - 1, first - 1, -1):
+      child_name = f'u_blk_{child - first}' if names is None else names[child]
+      stack.append((child, child_name, depth + 1, prefix + child_name))
+
+
+def write_chunked(file, lines):
+  '''
+  Write the lines in chunks
+  @param file: file object. File to write
+  @param lines: iterable of str. Lines to write, including the line terminator
+  @return: int. Number of lines written
+  '''
+  n_lines = 0
+  chunk = []
+  for line in lines:
+    chunk.append(line)
+    if len(chunk) >= 65536:
+      file.write(''.join(chunk))
+      n_lines += len(chunk)
+      chunk = []
+  file.write(''.join(chunk))
+  return n_lines + len(chunk)
+
+
+def write_dc(file, n_instances, fanout, seed, top, names=None):
+  parent, area, comb, noncomb = generate_hierarchy(n_instances, fanout, seed)
+  total = area[0]
+  header = HEADER.format(top=top, ports=1024, cells=n_instances, comb=comb.sum(), noncomb=noncomb.sum(), total=total)
+  file.write(header)
+  n_lines = header.count('\n')
+  n_lines += write_chunked(file, (
+    f'{path:<32}  {area[node]:>9.4f}  {100 * area[node] / total:>7.1f}  {comb[node]:>8.4f}  {noncomb[node]:>9.4f}  0.0000  mod_l{depth}\n'
+    for node, _, depth, path in iter_preorder(n_instances, fanout, top, names)))
+  file.write(SEPARATOR)
+  file.write(f'{"Total":<32}  {total:>9.4f}  {100.0:>7.1f}  {comb.sum():>8.4f}  {noncomb.sum():>9.4f}  0.0000\n')
+  return n_lines + 2
+
+
+def write_genus(file, n_instances, fanout, seed, top, names=None):
+  parent, area, _, _ = generate_hierarchy(n_instances, fanout, seed)
+  cells = np.ones(n_instances, dtype=np.int64)
+  for level in range(n_instances - 1, 0, -1):
+    cells[parent[level]] += cells[level]
+  file.write(GENUS_HEADER.format(top=top))
+  n_lines = GENUS_HEADER.count('\n')
+  # Hierarchy by indentation, the top module has no module name
+  n_lines += write_chunked(file, (
+    f'{"  " * depth}{name:<{max(1, 14 - 2 * depth)}} {"" if node == 0 else f"mod_l{depth}":<12} {cells[node]:>10} {area[node]:>10.3f} {0:>9.3f} {area[node]:>11.3f}  <none> (D)\n'
+    for node, name, depth, _ in iter_preorder(n_instances, fanout, top, names)))
+  file.write('\n  (D) = wireload is default in technology library\n')
+  return n_lines + 2
+
+
+def write_yosys(file, n_instances, fanout, seed, top, names=None):
+  parent, area, _, _ = generate_hierarchy(n_instances, fanout, seed)
+  children_area = np.bincount(parent[1:], weights=area[1:], minlength=n_instances)
+  local = area - children_area
+  # One module per instance, instantiated once by its parent module: Yosys
+  # reports no instance names, the names are not used
+  name = lambda node: top if node == 0 else f'mod_{node}'
+  lines = []
+  for node in range(n_instances - 1, -1, -1):
+    first = node * fanout + 1
+    submodules = range(first, min(first + fanout, n_instances))
+    lines.append(f'\n=== {name(node)} ===\n\n')
+    lines.append(f'   Number of wires:                 {4 * (len(submodules) + 1)}\n')
+    lines.append(f'   Number of cells:                 {len(submodules) + 1}\n')
+    lines.append(f'     $_AND_                          1\n')
+    lines += [f'     {name(child)}                          1\n' for child in submodules]
+    lines.append(f"\n   Chip area for module '\\{name(node)}': {local[node]:.6f}\n")
+  lines.append('\n=== design hierarchy ===\n\n')
+  lines.append(f'   {top}                                1\n')
+  lines.append(f"\n   Chip area for top module '\\{top}': {area[0]:.6f}\n")
+  return write_chunked(file, lines)
+
+
+# Synthetic report writers, by format
+WRITERS = {
+  'dc': write_dc,
+  'genus': write_genus,
+  'yosys': write_yosys,
+}
+
+
+def write_report(filename, n_instances, fanout=4, seed=0, top='top', fmt='dc', depth=None, duplicate_ratio=1.0, wrapper_ratio=0.0):
+  '''
+  Write a synthetic hierarchical area report.
+  @param filename: str. Name of the report to write
+  @param n_instances: int. Number of component instances, including the top module
+  @param fanout: int. Number of children of each internal instance
+  @param seed: int. Seed of the random generator
+  @param top: str. Name of the top module
+  @param fmt: str. Format of the report, among WRITERS
+  @param depth: int. Number of levels of the hierarchy, overrides fanout with fanout_for_depth
+  @param duplicate_ratio: float. Share of the instances with a name shared with their cousins, see generate_names
+  @param wrapper_ratio: float. Share of the internal instances named as wrappers
+  @return: int. Number of lines written
+  '''
+  if depth is not None:
+    fanout = fanout_for_depth(n_instances, depth)
+  names = None
+  if duplicate_ratio < 1 or wrapper_ratio > 0:
+    names = generate_names(n_instances, fanout, duplicate_ratio, wrapper_ratio, seed)
+  with open(filename, 'w') as file:
+    return WRITERS[fmt](file, n_instances, fanout, seed, top, names)
+
+
+def get_args(argv = None):
+  parser = argparse.ArgumentParser(prog = 'python -m area_plot.report_gen', description = 'Write a synthetic hierarchical area report')
+  parser.add_argument('filename', type = str, help = 'Name of the report to write')
+  parser.add_argument('--instances', '-n', type = int, help = 'Number of component instances, including the top module', default = 100_000)
+  parser.add_argument('--fanout', type = int, help = 'Number of children of each internal instance', default = 4)
+  parser.add_argument('--depth', type = int, help = 'Number of levels of the hierarchy, sets the fanout')
+  parser.add_argument('--duplicate-ratio', type = float, help = 'Share of the instances with a name shared with their cousins', default = 1.0)
+  parser.add_argument('--wrapper-ratio', type = float, help = 'Share of the internal instances named as wrappers', default = 0.0)
+  parser.add_argument('--report-format', choices = list(WRITERS), help = 'Format of the report', default = 'dc')
+  parser.add_argument('--top', type = str, help = 'Name of the top module', default = 'top')
+  parser.add_argument('--seed', type = int, help = 'Seed of the random generator', default = 0)
+  return parser.parse_args(argv)
+
+
+def main(argv = None):
+  args = get_args(argv)
+  n_lines = write_report(args.filename, args.instances, args.fanout, args.seed, args.top, args.report_format,
+                         args.depth, args.duplicate_ratio, args.wrapper_ratio)
+  print(f"{args.filename}: {n_lines} lines")
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,603 @@
+import io
+import os
+import re
+import mmap
+import time
+import bisect
+import functools
+import warnings
+from array import array
+
+import numpy as np
+
+
+# Bump when the parsed content changes, to invalidate the cached reports
+PARSER_VERSION = 4
+
+# Synopsys DC hierarchical area line: instance path, absolute area, the other
+# numeric columns and the design name. Anchored at the beginning of the line,
+# compiled once and matched on raw bytes so that non matching lines (headers,
+# separators, library section) are never decoded.
+DC_LINE = re.compile(rb'[ \t]*([A-Za-z_\[]+[/\[A-Za-z0-9_]*\]*)[ \t]+(\d+\.+\d+)([\s\d.]*)[A-Za-z_]')
+
+# Start of the header of the hierarchical area table, and the dashed line closing it
+DC_HEADER = b'Hierarchical cell'
+DC_HEADER_RULE = re.compile(rb'[ \t]*-+(?:[ \t]+-+)+[ \t]*$')
+# Separators of the numeric columns, lookup table by byte value
+BLANKS = np.zeros(256, dtype=bool)
+BLANKS[list(b' \t\r\n\x0b\x0c')] = True
+
+# Names of the numeric columns following the absolute area, by header title
+# (lowercase, without spaces and hyphens), and in the default DC order
+COLUMN_NAMES = {
+  'percenttotal': 'percent_total',
+  'combinational': 'combinational',
+  'noncombinational': 'sequential',
+  'blackboxes': 'black_box',
+  'bufferinverter': 'buf_inv',
+  'bufinv': 'buf_inv',
+}
+DC_COLUMNS = ['percent_total', 'combinational', 'sequential', 'black_box']
+
+# Local area breakdowns that can be plotted instead of the absolute area
+METRICS = ['combinational', 'sequential', 'black_box', 'buf_inv']
+
+# Cadence Genus report_area line: indentation (2 spaces per level), instance,
+# module (missing for the top module), cell count, cell area, net area and total area
+GENUS_LINE = re.compile(rb'( *)(\S+)(?:[ \t]+([A-Za-z_\\$]\S*))?[ \t]+(\d+)[ \t]+(\d+\.?\d*)[ \t]+(\d+\.?\d*)[ \t]+(\d+\.?\d*)')
+
+# Yosys stat: module sections, cell counts (type then count, or count then type
+# in recent versions) and local area of each module
+YOSYS_MODULE = re.compile(rb'=== (.+) ===\s*$')
+YOSYS_CELLS = re.compile(rb'[ \t]+(?:([^\s:]+)[ \t]+(\d+)|(\d+)[ \t]+(?:[\d.eE+-]+[ \t]+)?([^\s:]+))[ \t]*\r?$')
+YOSYS_AREA = re.compile(rb"[ \t]+Chip area for module '([^']+)': *([\d.eE+-]+)")
+YOSYS_HIERARCHY = b'design hierarchy'
+
+# Any name followed by an area, as searched by get_area_from_component_name.
+# Numbers are not names, they are skipped early
+AREA_PAIR = re.compile(rb'([^\s\d.]\S*)[ \t]+(\d+\.+\d+)')
+
+# Bytes read from the beginning of a report to detect its format
+SNIFF_SIZE = 1 << 16
+
+
+# Compressed reports, detected by magic bytes or else by extension
+COMPRESSIONS = {
+  'gzip': (b'\x1f\x8b', ('.gz', '.gzip')),
+  'xz': (b'\xfd7zXZ\x00', ('.xz', '.lzma')),
+  'zstd': (b'\x28\xb5\x2f\xfd', ('.zst', '.zstd')),
+  'bz2': (b'BZh', ('.bz2',)),
+}
+
+# Size of the chunks of decompressed data handed to the line splitter
+READ_CHUNK = 1 << 20
+
+
+def detect_compression(filename):
+  '''
+  @param filename: str. Name of the report
+  @return: str. Compression of the report among COMPRESSIONS, None if not compressed
+  '''
+  with open(filename, 'rb') as file:
+    head = file.read(8)
+  for name, (magic, _) in COMPRESSIONS.items():
+    if head.startswith(magic):
+      return name
+  # Plain text reports start with a printable character, trust the extension
+  # only for files that are not readable as text
+  if head and head.isascii():
+    return None
+  for name, (_, extensions) in COMPRESSIONS.items():
+    if filename.lower().endswith(extensions):
+      return name
+  return None
+
+
+class TimedReader(io.RawIOBase):
+  '''
+  Raw stream accounting the time spent reading (and decompressing) the wrapped stream,
+  to tell the decompression time apart from the parsing time.
+  '''
+
+  def __init__(self, stream):
+    self.stream = stream
+    self.seconds = 0.0
+    self.size = 0
+
+  def readable(self):
+    return True
+
+  def readinto(self, buffer):
+    start = time.perf_counter()
+    n = self.stream.readinto(buffer)
+    self.seconds += time.perf_counter() - start
+    self.size += n
+    return n
+
+  def close(self):
+    self.stream.close()
+    super().close()
+
+
+def open_compressed(filename, compression):
+  '''
+  @param filename: str. Name of the report
+  @param compression: str. Compression of the report among COMPRESSIONS
+  @return: binary file object decompressing the report on the fly
+  '''
+  if compression == 'gzip':
+    import gzip
+    return gzip.open(filename, 'rb')
+  if compression == 'xz':
+    import lzma
+    return lzma.open(filename, 'rb')
+  if compression == 'bz2':
+    import bz2
+    return bz2.open(filename, 'rb')
+  if compression == 'zstd':
+    try:
+      from compression import zstd
+      return zstd.open(filename, 'rb')
+    except ImportError:
+      pass
+    try:
+      import zstandard
+    except ImportError:
+      raise ImportError(f"Reading the zstd compressed report {filename} requires the zstandard package") from None
+    return zstandard.ZstdDecompressor().stream_reader(open(filename, 'rb'), read_size=READ_CHUNK, closefd=True)
+  raise ValueError(f"Unknown compression '{compression}', choose among {', '.join(COMPRESSIONS)}")
+
+
+def open_report(filename):
+  '''
+  Open a report for streaming reads, decompressing it on the fly if compressed.
+  @param filename: str. Name of the report
+  @return: io.BufferedReader. Binary stream of the (decompressed) report, its raw
+  stream is a TimedReader accounting the time spent reading and decompressing
+  '''
+  compression = detect_compression(filename)
+  stream = open(filename, 'rb', buffering=0) if compression is None else open_compressed(filename, compression)
+  reader = io.BufferedReader(TimedReader(stream), READ_CHUNK)
+  reader.compression = compression
+  return reader
+
+
+def iter_report_lines(filename, use_mmap=False, stats=None):
+  '''
+  Iterate over the lines of a report without loading it in memory.
+  Compressed reports (see COMPRESSIONS) are decompressed on the fly.
+  @param filename: str. Name of the report to read
+  @param use_mmap: bool. Read the file through a memory map instead of buffered reads,
+  ignored for compressed reports
+  @param stats: dict. If given, filled with the compression of the report, the
+  bytes read after decompression and the seconds spent reading and decompressing
+  (read_time, not measured through a memory map) once the report is consumed
+  @return: generator of bytes. Lines of the report, including the line terminator
+  '''
+  if use_mmap and detect_compression(filename) is None:
+    if stats is not None:
+      stats.update(compression=None, size=0, read_time=0.0)
+    with open(filename, 'rb') as file:
+      try:
+        mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+      except ValueError:
+        # Empty files cannot be mapped
+        return
+      with mm:
+        if stats is not None:
+          stats['size'] = len(mm)
+        yield from iter(mm.readline, b'')
+    return
+  with open_report(filename) as file:
+    try:
+      yield from file
+    finally:
+      if stats is not None:
+        stats.update(compression=file.compression, size=file.raw.size, read_time=file.raw.seconds)
+
+
+def column_names(header, n_columns):
+  '''
+  Name the numeric columns following the absolute area from the table header.
+  The titles span several lines, each column is delimited by the dashed rule
+  closing the header, e.g. 'Combi-' and 'national' make 'combinational'.
+  @param header: list of bytes. Lines from the 'Hierarchical cell' one to the dashed rule
+  @param n_columns: int. Number of numeric columns following the absolute area
+  @return: list of str. Name of each column, the DC ones if the header cannot be used
+  '''
+  names = []
+  if header and DC_HEADER_RULE.match(header[-1]):
+    spans = [match.span() for match in re.finditer(rb'-+', header[-1])]
+    titles = [b''.join(line[start:end].strip() for line in header[:-1]).decode(errors='replace') for start, end in spans]
+    # Skip the instance and the absolute area columns
+    for title in titles[2:2 + n_columns]:
+      key = re.sub(r'[\s\-/]', '', title).lower()
+      names.append(COLUMN_NAMES.get(key, re.sub(r'\W', '_', title).lower() or None))
+  if len(names) != n_columns or None in names or len(set(names)) != n_columns:
+    names = DC_COLUMNS[:n_columns] + [f'column_{i}' for i in range(len(DC_COLUMNS), n_columns)]
+  return names
+
+
+def detect_format(head):
+  '''
+  Detect the format of a report from its first bytes
+  @param head: bytes. Beginning of the report, see SNIFF_SIZE
+  @return: str. Format of the report, among PARSERS (default: dc)
+  '''
+  if b'Genus' in head or (b'Cell Area' in head and b'Net Area' in head):
+    return 'genus'
+  if b'Chip area for' in head or re.search(rb'^=== .+ ===\s*$', head, re.MULTILINE):
+    return 'yosys'
+  return 'dc'
+
+
+def sniff_report(filename):
+  '''
+  @param filename: str. Name of the report
+  @return: str. Format of the report, see detect_format
+  '''
+  with open_report(filename) as file:
+    return detect_format(file.read(SNIFF_SIZE))
+
+
+def dc_columns(numbers, n_rows, header):
+  '''
+  Convert the numeric columns following the absolute area at once, rows with less columns are padded with NaN.
+  The numbers are parsed from a single buffer, without a bytes object per value.
+  @param numbers: bytes. Numeric columns of each row, separated by blanks, each row starting with a line break
+  @param n_rows: int. Number of rows
+  @param header: list of bytes. Header of the table, see column_names
+  @return: dict of np.ndarray of float64. Columns by name
+  '''
+  data = np.frombuffer(numbers, dtype=np.uint8)
+  blank = BLANKS[data]
+  # Values start after a blank, the first byte is a line break
+  starts = np.flatnonzero(blank[:-1] > blank[1:]) + 1
+  del blank
+  # Row of each value, from the line breaks preceding it
+  rows = np.searchsorted(np.flatnonzero(data == ord('\n')), starts) - 1
+  counts = np.bincount(rows, minlength=n_rows)
+  n_columns = int(counts.max()) if len(counts) else 0
+  try:
+    # Malformed values stop the parsing, with a warning or an error depending on numpy
+    with warnings.catch_warnings():
+      warnings.simplefilter('ignore', DeprecationWarning)
+      flat = np.fromstring(numbers, dtype=np.float64, sep=' ') if len(starts) else np.empty(0)
+  except ValueError:
+    flat = None
+  if flat is None or len(flat) != len(starts):
+    # Malformed value, e.g. a lone dot: convert value by value
+    flat = np.array(numbers.split(), dtype=np.bytes_).astype(np.float64)
+  if len(counts) and counts.min() == n_columns:
+    # Same number of values on every row
+    table = flat.reshape(n_rows, n_columns)
+  else:
+    table = np.full((n_rows, n_columns), np.nan)
+    column = np.arange(len(flat))
+    column -= (np.cumsum(counts) - counts)[rows]
+    table[rows, column] = flat
+  return {name: np.ascontiguousarray(table[:, i]) for i, name in enumerate(column_names(header, n_columns))}
+
+
+def parse_dc(lines):
+  '''
+  Parse a Synopsys DC hierarchical area report (report_area -hierarchy).
+  The instances are read until the dashed rule closing the table, so that the
+  Total row is never taken as an instance.
+  @param lines: iterable of bytes. Lines of the report
+  @return: dict of columns, see parse_report
+  '''
+  paths = []
+  values = array('d')
+  numbers = bytearray()
+  header = None
+  match_line = DC_LINE.match
+  append_path = paths.append
+  append_value = values.append
+  for line in lines:
+    match = match_line(line)
+    if match:
+      path, value, other = match.group(1, 2, 3)
+      append_path(path.decode())
+      append_value(float(value))
+      numbers += b'\n'
+      numbers += other
+    elif not paths:
+      # Header of the table, until the first instance
+      if line.lstrip().startswith(DC_HEADER):
+        header = []
+      if header is not None and line.strip() and not (header and DC_HEADER_RULE.match(header[-1])):
+        header.append(line.rstrip(b'\r\n'))
+    elif DC_HEADER_RULE.match(line):
+      # End of the table
+      break
+  if paths and paths[-1] == 'Total':
+    del paths[-1], values[-1], numbers[numbers.rfind(b'\n'):]
+  columns = {'path': paths, 'value': np.frombuffer(values, dtype=np.float64) if values else np.empty(0)}
+  numbers = bytes(numbers)
+  columns.update(dc_columns(numbers, len(paths), header))
+  return columns
+
+
+def parse_genus(lines):
+  '''
+  Parse a Cadence Genus hierarchical area report (report_area), where the
+  hierarchy is given by the indentation of the instances.
+  @param lines: iterable of bytes. Lines of the report
+  @return: dict of columns, see parse_report. The value is the cell area, the
+  other columns are cell_count, net_area and total_area
+  '''
+  paths = []
+  values = array('d')
+  cell_count = array('d')
+  net_area = array('d')
+  total_area = array('d')
+  # Indentation and path of the ancestors of the current instance
+  stack = []
+  match_line = GENUS_LINE.match
+  for line in lines:
+    match = match_line(line)
+    if not match:
+      continue
+    indent, name, _, cells, cell, net, total = match.groups()
+    indent = len(indent)
+    while stack and stack[-1][0] >= indent:
+      stack.pop()
+    name = name.decode()
+    # First level instances without the top module, as in DC reports
+    path = stack[-1][1] + '/' + name if len(stack) > 1 else name
+    stack.append((indent, path))
+    paths.append(path)
+    values.append(float(cell))
+    cell_count.append(float(cells))
+    net_area.append(float(net))
+    total_area.append(float(total))
+  to_array = lambda column: np.frombuffer(column, dtype=np.float64) if column else np.empty(0)
+  return {'path': paths, 'value': to_array(values), 'cell_count': to_array(cell_count),
+          'net_area': to_array(net_area), 'total_area': to_array(total_area)}
+
+
+def parse_yosys(lines):
+  '''
+  Parse a Yosys stat report, e.g. the synthesis report of the OpenROAD flow.
+  Yosys reports the cells of each module, the hierarchy is rebuilt expanding
+  the submodule instances from the top module. Instance names are not
+  reported: instances are named after their module, with a suffix _<k> if
+  the module is instantiated more than once by the same parent.
+  @param lines: iterable of bytes. Lines of the report
+  @return: dict of columns, see parse_report. The value is the area of the
+  module including its submodules, the other column is local_area
+  '''
+  modules = {}
+  module = None
+  top = None
+  in_hierarchy = False
+  for line in lines:
+    match = YOSYS_MODULE.match(line)
+    if match:
+      name = match.group(1).strip()
+      in_hierarchy = name == YOSYS_HIERARCHY
+      module = None if in_hierarchy else name.lstrip(b'\\').decode()
+      if module is not None:
+        modules[module] = [0.0, {}]
+      continue
+    if in_hierarchy:
+      # The first line of the hierarchy is the top module
+      if top is None and line.strip():
+        top = line.split()[0].lstrip(b'\\').decode()
+      continue
+    if module is None:
+      continue
+    match = YOSYS_AREA.match(line)
+    if match:
+      modules[module][0] = float(match.group(2))
+      continue
+    match = YOSYS_CELLS.match(line)
+    if match:
+      cell_type, count = (match.group(1), match.group(2)) if match.group(1) else (match.group(4), match.group(3))
+      cell_type = cell_type.lstrip(b'\\').decode()
+      modules[module][1][cell_type] = modules[module][1].get(cell_type, 0) + int(count)
+  if not modules:
+    return {'path': [], 'value': np.empty(0), 'local_area': np.empty(0)}
+  # Keep only the submodules among the cells
+  submodules = {name: [(cell, count) for cell, count in cells.items() if cell in modules and cell != name]
+                for name, (_, cells) in modules.items()}
+  if top not in modules:
+    instantiated = {cell for cells in submodules.values() for cell, _ in cells}
+    top = [name for name in modules if name not in instantiated][-1]
+
+  # Area of each module including its submodules, children first
+  total = {}
+  pending = [top]
+  while pending:
+    name = pending[-1]
+    missing = [cell for cell, _ in submodules[name] if cell not in total]
+    if missing:
+      pending += missing
+      continue
+    pending.pop()
+    total[name] = modules[name][0] + sum(count * total[cell] for cell, count in submodules[name])
+
+  # Expand the instances depth first
+  paths = []
+  module_of = []
+  stack = [(top, top, 0)]
+  while stack:
+    name, path, depth = stack.pop()
+    paths.append(path)
+    module_of.append(name)
+    prefix = '' if depth == 0 else path + '/'
+    children = []
+    for cell, count in submodules[name]:
+      children += [(cell, prefix + (cell if count == 1 else f'{cell}_{k}'), depth + 1) for k in range(count)]
+    stack += children[::-1]
+  return {'path': paths, 'value': np.array([total[name] for name in module_of], dtype=np.float64),
+          'local_area': np.array([modules[name][0] for name in module_of], dtype=np.float64)}
+
+
+# Parser backends by report format, each one streams the lines of the report
+# and returns the same columns, see parse_report
+PARSERS = {
+  'dc': parse_dc,
+  'genus': parse_genus,
+  'yosys': parse_yosys,
+  # The OpenROAD flow synthesizes with Yosys, its hierarchical area is the Yosys stat report
+  'openroad': parse_yosys,
+}
+
+
+def parse_report(filename, use_mmap=False, fmt=None, stats=None):
+  '''
+  Parse the report file in a single streaming pass.
+  Compressed reports are decompressed on the fly, see iter_report_lines.
+  @param filename: str. Name of the report to parse
+  @param use_mmap: bool. Read the file through a memory map instead of buffered reads
+  @param fmt: str. Format of the report, among PARSERS (default: detected from the first bytes)
+  @param stats: dict. If given, filled as in iter_report_lines, plus the total
+  seconds (time) and the seconds spent parsing (parse_time = time - read_time)
+  @return: dict of columns, one row per component instance in depth first order,
+  the top module first:
+  - path: list of str. Full hierarchical path of the component instance, first
+  level instances are reported without the top module
+  - value: np.ndarray of float64. Area of the component instance
+  - one np.ndarray of float64 per other numeric column of the report, e.g. for DC
+  reports named after the header (percent_total, combinational, sequential,
+  black_box, buf_inv), NaN where missing
+  '''
+  if fmt is None or fmt == 'auto':
+    fmt = sniff_report(filename)
+  if fmt not in PARSERS:
+    raise ValueError(f"Unknown report format '{fmt}', choose among {', '.join(PARSERS)}")
+  if stats is None:
+    return PARSERS[fmt](iter_report_lines(filename, use_mmap))
+  start = time.perf_counter()
+  columns = PARSERS[fmt](iter_report_lines(filename, use_mmap, stats))
+  stats['time'] = time.perf_counter() - start
+  stats['parse_time'] = stats['time'] - stats['read_time']
+  return columns
+
+
+class AreaIndex:
+  '''
+  Index of the areas of a report by name, built in a single streaming pass.
+  Every name followed by an area on a line of the report is indexed with the
+  first area found for it. Names can be queried:
+  - exactly, e.g. u_core/u_alu
+  - by suffix, e.g. u_alu or alu matches u_core/u_alu, through a sorted array of
+  the reversed names
+  - by regular expression matching the end of the name, e.g. u_alu_[0-9]+
+  When several names match, the first one in the report wins.
+  '''
+
+  def __init__(self, names, areas):
+    '''
+    @param names: list of str. Unique names, in order of first appearance in the report
+    @param areas: list of float. Area of each name
+    '''
+    self.names = names
+    self.areas = np.asarray(areas, dtype=np.float64)
+    self.rank = {name: i for i, name in enumerate(names)}
+    self._reversed = None
+
+  @classmethod
+  def from_report(cls, filename):
+    '''
+    @param filename: str. Name of the report, possibly compressed
+    @return: AreaIndex
+    '''
+    index = {}
+    with open_report(filename) as file:
+      tail = b''
+      # Whole blocks of lines are scanned at once, names are decoded once
+      for chunk in iter(lambda: file.read(READ_CHUNK), b''):
+        block, _, tail = (tail + chunk).rpartition(b'\n')
+        for name, area in AREA_PAIR.findall(block):
+          if name not in index:
+            index[name] = area
+      for name, area in AREA_PAIR.findall(tail):
+        if name not in index:
+          index[name] = area
+    areas = np.array(list(index.values()), dtype=np.bytes_).astype(np.float64)
+    return cls([name.decode(errors='replace') for name in index], areas)
+
+  def __len__(self):
+    return len(self.names)
+
+  def exact(self, name):
+    '''
+    @param name: str. Name as written in the report
+    @return: int. Rank of the name in the report, -1 if missing
+    '''
+    return self.rank.get(name, -1)
+
+  def suffix(self, name):
+    '''
+    @param name: str. End of the name, e.g. the instance name without its hierarchy
+    @return: int. Rank of the first name of the report ending with name, -1 if missing
+    '''
+    if self._reversed is None:
+      # Names sharing a suffix are contiguous once reversed and sorted
+      reversed_names = [n[::-1] for n in self.names]
+      order = sorted(range(len(reversed_names)), key=reversed_names.__getitem__)
+      self._reversed = ([reversed_names[i] for i in order], np.array(order, dtype=np.int64))
+    keys, order = self._reversed
+    key = name[::-1]
+    lo = bisect.bisect_left(keys, key)
+    hi = bisect.bisect_right(keys, key + '\U0010ffff', lo)
+    return int(order[lo:hi].min()) if hi > lo else -1
+
+  def regex(self, patterns):
+    '''
+    Match many regular expressions in a single pass over the names
+    @param patterns: list of str. Regular expressions matching the end of the names
+    @return: list of int. Rank of the first name of the report matching each pattern, -1 if missing
+    '''
+    pending = {i: re.compile(f'(?:{pattern})$') for i, pattern in enumerate(patterns)}
+    ranks = [-1] * len(patterns)
+    for rank, name in enumerate(self.names):
+      for i, pattern in list(pending.items()):
+        if pattern.search(name):
+          ranks[i] = rank
+          del pending[i]
+      if not pending:
+        break
+    return ranks
+
+  def lookup(self, names, match='auto'):
+    '''
+    @param names: list of str. Names to look up
+    @param match: str. exact, suffix, regex, or auto: regex for the names with
+    special characters, suffix for the others
+    @return: list of float. Area of each name, None if missing
+    '''
+    if match not in ('auto', 'exact', 'suffix', 'regex'):
+      raise ValueError(f"Unknown match '{match}', choose among auto, exact, suffix, regex")
+    ranks = [-1] * len(names)
+    patterns = []
+    for i, name in enumerate(names):
+      if match == 'regex' or (match == 'auto' and re.escape(name) != name):
+        patterns.append(i)
+      elif match == 'exact':
+        ranks[i] = self.exact(name)
+      else:
+        ranks[i] = self.suffix(name)
+    for i, rank in zip(patterns, self.regex([names[i] for i in patterns])):
+      ranks[i] = rank
+    return [float(self.areas[rank]) if rank >= 0 else None for rank in ranks]
+
+
+@functools.lru_cache(maxsize=8)
+def _cached_index(path, size, mtime_ns, inode):
+  return AreaIndex.from_report(path)
+
+
+def get_area_index(filename):
+  '''
+  Index of the areas of a report, cached in the process by file identity, so that
+  it is rebuilt only when the report changes
+  @param filename: str. Name of the report, possibly compressed
+  @return: AreaIndex
+  '''
+  path = os.path.realpath(filename)
+  stat = os.stat(path)
+  return _cached_index(path, stat.st_size, stat.st_mtime_ns, stat.st_ino)
@@ -0,0 +1,299 @@
+#Copyright 2024 Politecnico di Torino.
+#
+#File: serve.py
+#Description: Local HTTP server plotting the subtrees of a hierarchy on demand
+
+
+import argparse
+import functools
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import main as area_plot
+
+
+PAGE_TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script src="/plotly.min.js"></script>
+</head>
+<body style="margin: 0">
+<div id="nav" style="font: 14px sans-serif; padding: 8px"></div>
+<div id="plot"></div>
+<script>
+var gd = document.getElementById('plot');
+var nav = document.getElementById('nav');
+var root = {root};
+var current = null;
+var expandable = new Set();
+var bound = false;
+// Plot the subtree of a component, fetched from the server
+function show(id, push) {{
+  fetch('/api/subtree?id=' + encodeURIComponent(id)).then(function (response) {{
+    if (!response.ok) throw new Error(response.statusText);
+    return response.json();
+  }}).then(function (page) {{
+    current = id;
+    expandable = new Set(page.expandable);
+    Plotly.react(gd, page.figure.data, page.figure.layout);
+    nav.innerHTML = '';
+    page.ancestors.forEach(function (ancestor) {{
+      var link = document.createElement('a');
+      link.href = '?id=' + encodeURIComponent(ancestor[0]);
+      link.textContent = ancestor[1];
+      link.onclick = function () {{ show(ancestor[0], true); return false; }};
+      nav.appendChild(link);
+      nav.appendChild(document.createTextNode(' / '));
+    }});
+    nav.appendChild(document.createTextNode(page.label));
+    if (push) history.pushState({{id: id}}, '', '?id=' + encodeURIComponent(id));
+    if (!bound) {{
+      // Open the subtree of the deepest components instead of zooming into them
+      var follow = function (event) {{
+        var point = event.points && event.points[0];
+        if (point && point.id !== current && expandable.has(point.id)) {{
+          show(point.id, true);
+          return false;
+        }}
+      }};
+      gd.on('plotly_treemapclick', follow);
+      gd.on('plotly_sunburstclick', follow);
+      bound = true;
+    }}
+  }}).catch(function (error) {{ nav.textContent = 'Error: ' + error.message; }});
+}}
+window.onpopstate = function (event) {{ show(event.state ? event.state.id : root, false); }};
+show(new URLSearchParams(window.location.search).get('id') || root, false);
+</script>
+</body>
+</html>
+'''
+
+
+class SubtreeServer:
+  '''
+  Hierarchy loaded once in memory, plotted one subtree at a time: each response
+  holds the first max_levels_hier levels (at most max_nodes components) below a
+  component, styled as treemap_plot and colored with assign_colors from that
+  component. Responses are kept in an LRU cache, and those of the components
+  with the largest subtrees, the slowest ones, are precomputed in background.
+  '''
+
+  def __init__(self, df_tree, top_module, max_levels_hier=3, max_nodes=2000, plot_type='treemap',
+               plot_mode='total', colormap=None, cache_size=4096):
+    '''
+    @param df_tree: pd.DataFrame. DataFrame with the area of the components instance, with unique ids
+    @param top_module: str. Id of the top module
+    @param max_levels_hier: int. Levels of each subtree plot
+    @param max_nodes: int. Maximum number of components of each subtree plot
+    @param plot_type: str. treemap or sunburst
+    @param plot_mode: str. 'total' or 'remainder', see plotly branchvalues
+    @param colormap: list of str. Colors of the first level modules (default: area_plot.DEFAULT_COLORMAP)
+    @param cache_size: int. Number of responses kept in the LRU cache
+    '''
+    from .hier_tree import HierTree
+    self.df_tree = df_tree.reset_index(drop=True)
+    self.tree = HierTree.from_dataframe(self.df_tree)
+    self.index = {node_id: node for node, node_id in reversed(list(enumerate(self.tree.ids)))}
+    if top_module not in self.index:
+      raise ValueError(f"Top module '{top_module}' not found.")
+    self.top_module = top_module
+    self.max_levels_hier = max_levels_hier
+    self.max_nodes = max_nodes
+    self.figure = area_plot.treemap_figure if plot_type == 'treemap' else area_plot.sunburst_figure
+    self.plot_mode = plot_mode
+    self.colormap = colormap if colormap else area_plot.DEFAULT_COLORMAP
+    self.subtree = functools.lru_cache(maxsize=cache_size)(self._subtree)
+    self._template = None
+
+  def _page_frame(self, node):
+    from . import utils_area as utils
+    nodes, others = self.tree.level_of_detail(node, self.max_levels_hier, self.max_nodes)
+    df_page = utils.subtree_frame(self.df_tree, self.tree, nodes, others)
+    return nodes, utils.assign_colors(df_page, self.tree.ids[node], self.colormap)
+
+  def _figure(self, df_page, node_id):
+    '''
+    Figure of a page, as a plotly JSON dict. The figure of the top module is
+    built through the figure functions of area_plot and used as the template of
+    the other ones, which only replace the data, without validating them again.
+    '''
+    import plotly.io as pio
+    if self._template is None:
+      fig = self.figure(df_page, node_id, self.max_levels_hier, self.plot_mode, self.colormap)
+      self._template = json.loads(pio.to_json(fig, validate=False))
+      return self._template
+    customdata, _ = area_plot.breakdown_hover(df_page)
+    trace = dict(self._template['data'][0],
+      ids = df_page['id'].tolist(),
+      labels = df_page['label'].tolist(),
+      parents = df_page['parent'].tolist(),
+      values = [None if v != v else v for v in df_page['value'].tolist()],
+      level = node_id,
+      marker = dict(self._template['data'][0].get('marker', {}), colors = df_page['color'].tolist()),
+    )
+    if customdata is not None:
+      trace['customdata'] = [[None if v != v else v for v in row] for row in customdata.tolist()]
+    return {'data': [trace], 'layout': self._template['layout']}
+
+  def _subtree(self, node):
+    tree = self.tree
+    nodes, df_page = self._page_frame(node)
+    node_id = tree.ids[node]
+    # Deepest components of the page, with hidden children
+    boundary = nodes[(tree.depth[nodes] - tree.depth[node] >= self.max_levels_hier - 1) & (tree.size[nodes] > 1)]
+    ancestors = tree.ancestors(node)[::-1]
+    page = {
+      'id': node_id,
+      'label': tree.columns['label'][node],
+      'ancestors': [[tree.ids[a], tree.columns['label'][a]] for a in ancestors],
+      'expandable': tree.ids[boundary].tolist(),
+      'figure': self._figure(df_page, node_id),
+    }
+    return json.dumps(page).encode()
+
+  def response(self, node_id):
+    '''
+    @param node_id: str. Id of the component
+    @return: bytes. JSON with the figure of the subtree of the component, its
+    ancestors and the components with hidden children; None if not found
+    '''
+    node = self.index.get(node_id)
+    return None if node is None else self.subtree(node)
+
+  def warm_up(self, count):
+    '''
+    Precompute the responses of the components with the largest subtrees
+    @param count: int. Number of responses to precompute
+    '''
+    import numpy as np
+    top = self.index[self.top_module]
+    self.subtree(top)
+    expandable = np.flatnonzero(self.tree.size > 1)
+    for node in expandable[np.argsort(-self.tree.size[expandable], kind='stable')][:count].tolist():
+      self.subtree(node)
+
+
+def make_handler(server, page, plotlyjs):
+  '''
+  @param server: SubtreeServer. Hierarchy to serve
+  @param page: bytes. HTML page of the viewer
+  @param plotlyjs: bytes. plotly.js bundle
+  @return: type. Request handler class
+  '''
+  class Handler(BaseHTTPRequestHandler):
+    def _send(self, status, content_type, body, cache=False):
+      self.send_response(status)
+      self.send_header('Content-Type', content_type)
+      self.send_header('Content-Length', str(len(body)))
+      if cache:
+        self.send_header('Cache-Control', 'max-age=86400')
+      self.end_headers()
+      self.wfile.write(body)
+
+    def do_GET(self):
+      url = urllib.parse.urlsplit(self.path)
+      if url.path == '/':
+        self._send(200, 'text/html; charset=utf-8', page)
+      elif url.path == '/plotly.min.js':
+        self._send(200, 'application/javascript', plotlyjs, cache=True)
+      elif url.path == '/api/subtree':
+        node_id = urllib.parse.parse_qs(url.query).get('id', [server.top_module])[0]
+        body = server.response(node_id)
+        if body is None:
+          self._send(404, 'application/json', json.dumps({'error': f"Module '{node_id}' not found."}).encode())
+        else:
+          self._send(200, 'application/json', body)
+      else:
+        self._send(404, 'text/plain', b'Not found')
+
+    def log_message(self, format, *params):
+      pass
+
+  return Handler
+
+
+def get_args(argv = None):
+  parser = argparse.ArgumentParser(prog = 'area-plot serve', description = 'Serve the hierarchy of a report from a local HTTP server, plotting the subtree of each component on demand.')
+  group = parser.add_mutually_exclusive_group(required=True)
+  group.add_argument('--filename', '-f', type = str, help = 'Name of the report file to parse')
+  group.add_argument('--load-from-csv', type = str, help = 'Load the hierarchy from the specified csv file')
+  parser.add_argument('--report-format', choices=['auto', 'dc', 'genus', 'yosys', 'openroad'], help = 'Format of the report (default: detected from the first bytes)', default = 'auto')
+  parser.add_argument('--top-module', '-t', type = str, help = 'Name of the top module to plot')
+  parser.add_argument('--max-levels-hier', '-d', type = int, help = 'Number of levels of each subtree plot', default = 3)
+  parser.add_argument('--max-nodes', type = int, help = 'Maximum number of components of each subtree plot, the smallest ones are merged into "others"', default = 2000)
+  parser.add_argument('--collapse', type = str, nargs = '*', help = 'Remove the components whose id matches any of these patterns, moving their children to the nearest kept ancestor', default = ['wrapper'])
+  parser.add_argument('--collapse-match', choices = ['substring', 'regex', 'glob'], help = 'How the --collapse patterns are matched against the ids', default = 'substring')
+  parser.add_argument('--metric', choices=['total', 'combinational', 'sequential', 'black_box', 'buf_inv'], help = 'Area to plot: the total one or one of the breakdowns of the report', default = 'total')
+  parser.add_argument('--plot-mode', choices=['total','remainder'], default = 'total')
+  parser.add_argument('--plot-type', choices=['treemap', 'sunburst'], help = 'Type of plot', default = 'treemap')
+  parser.add_argument('--colormap', type = str, nargs="+", help = 'Colormap to use for the plot', default = area_plot.DEFAULT_COLORMAP)
+  parser.add_argument('--host', type = str, help = 'Address to listen on', default = '127.0.0.1')
+  parser.add_argument('--port', '-p', type = int, help = 'Port to listen on', default = 8050)
+  parser.add_argument('--cache-size', type = int, help = 'Number of subtree responses kept in memory', default = 4096)
+  parser.add_argument('--warm-up', type = int, help = 'Number of responses of the largest subtrees precomputed in background', default = 256)
+  parser.add_argument('--open', action = 'store_true', help = 'Open the viewer in the browser')
+  parser.add_argument('--no-cache', action = 'store_true', help = 'Do not read nor write the cache of the parsed reports')
+  parser.add_argument('--cache-dir', type = str, help = 'Directory of the cache of the parsed reports (default: ~/.cache/area-plot)')
+  parser.add_argument('--cache-max-size', type = int, help = 'Maximum size of the cache in MB', default = 2048)
+  return parser.parse_args(argv)
+
+
+def load_hierarchy(args):
+  '''
+  Load the hierarchy and process it as area_plot.run does before plotting
+  @param args: argparse.Namespace. Options as returned by get_args
+  @return: tuple. pd.DataFrame of the hierarchy and id of the top module
+  '''
+  import pandas as pd
+  from . import utils_area as utils
+  from .cache import ReportCache
+  if args.load_from_csv is not None:
+    df_tree = pd.read_csv(args.load_from_csv)
+  else:
+    cache = None if args.no_cache else ReportCache(args.cache_dir, args.cache_max_size << 20)
+    df_tree = area_plot.load_report(args.filename, False, cache, args.report_format)
+  if df_tree.empty:
+    raise ValueError(f"No component found in {args.filename or args.load_from_csv}")
+  top_module = args.top_module if args.top_module else df_tree['id'].iloc[0]
+  df_tree = utils.rename_duplicates(df_tree, top_module)
+  utils.check_top_module(df_tree, top_module)
+  df_tree['value'] = pd.to_numeric(df_tree['value'], errors='coerce')
+  df_tree = utils.hierarchical_metrics(df_tree)
+  if args.metric != 'total':
+    if args.metric not in df_tree.columns:
+      raise ValueError(f"No {args.metric} area found in {args.filename or args.load_from_csv}")
+    df_tree['value'] = df_tree[args.metric]
+  df_tree = utils.collapse_modules(df_tree, args.collapse, args.collapse_match)
+  return df_tree, top_module
+
+
+def main(argv = None):
+  args = get_args(argv)
+  from plotly.offline import get_plotlyjs
+  start = time.perf_counter()
+  df_tree, top_module = load_hierarchy(args)
+  server = SubtreeServer(df_tree, top_module, args.max_levels_hier, args.max_nodes, args.plot_type,
+                         args.plot_mode, args.colormap, args.cache_size)
+  server.response(top_module)
+  print(f"Loaded {len(df_tree)} components in {time.perf_counter() - start:.1f} s")
+  threading.Thread(target=server.warm_up, args=(args.warm_up,), daemon=True).start()
+  page = PAGE_TEMPLATE.format(title=f'{top_module} area', root=json.dumps(top_module)).encode()
+  httpd = ThreadingHTTPServer((args.host, args.port), make_handler(server, page, get_plotlyjs().encode()))
+  url = f'http://{args.host}:{httpd.server_address[1]}/'
+  print(f"Serving {top_module} on {url}, press Ctrl+C to stop")
+  if args.open:
+    import webbrowser
+    webbrowser.open(url)
+  try:
+    httpd.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    httpd.server_close()
+  return 0
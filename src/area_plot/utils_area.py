@@ -1,6 +1,13 @@
 import regex as re
 import pandas as pd
 import colorsys
+import numpy as np
+from . import report_parser
+from .hier_tree import HierTree, resolve_parents, resolve_path_parents
+
+
+INSTANCE_SUFFIX = re.compile(r'(_[iI])$')
+GENERATE_PREFIX = re.compile(r'gen_[a-zA-Z0-9_]*__')
 
 
 def prettify_name(name):
@@ -9,8 +16,8 @@ def prettify_name(name):
     @param name: str. Name of the component instance
     @return: str. Pretty name for the component instance
     '''
-    pretty_name = re.sub(r'(_[iI])$', '', name)
-    pretty_name = re.sub(r'gen_[a-zA-Z0-9_]*__', '', pretty_name)
+    pretty_name = INSTANCE_SUFFIX.sub('', name)
+    pretty_name = GENERATE_PREFIX.sub('', pretty_name)
     # Remove the 'u_' prefix and replace underscores with spaces
     pretty_name = pretty_name.replace('u_', '', 1).replace('_', ' ')
     # Capitalize the first letter of each word
@@ -24,12 +31,57 @@ def recursive_remove(df, parent_id):
   @param df: pd.DataFrame. DataFrame with the area of the components instance
   @param parent_id: str. Parent id to remove
   '''
-  df = df.copy()
-  children = df[df['parent'] == parent_id]
-  for child_id in children['id']:
-    df = df[df['id'] != child_id]
-    df = recursive_remove(df, child_id)
-  return df
+  tree = HierTree.from_dataframe(df)
+  keep = np.ones(len(tree), dtype=bool)
+  for node in tree.find(parent_id):
+    keep[tree.subtree(node)[1:]] = False
+  return df[keep]
+
+def match_ids(ids, patterns, match='substring'):
+  '''
+  Match the ids against many patterns at once, ignoring the case
+  @param ids: pd.Series of str. Ids of the component instances
+  @param patterns: str or list of str. Patterns to match
+  @param match: str. substring: the id contains the pattern, regex: the id contains
+  a match of the regular expression, glob: the whole id matches the shell pattern
+  @return: np.ndarray of bool. Ids matching any of the patterns
+  '''
+  if isinstance(patterns, str):
+    patterns = [patterns]
+  if not patterns:
+    return np.zeros(len(ids), dtype=bool)
+  ids = ids.astype(str)
+  if match == 'substring':
+    return ids.str.contains('|'.join(re.escape(p) for p in patterns), case=False, regex=True).to_numpy(dtype=bool)
+  if match == 'regex':
+    return ids.str.contains('|'.join(f'(?:{p})' for p in patterns), case=False, regex=True).to_numpy(dtype=bool)
+  if match == 'glob':
+    import fnmatch
+    return ids.str.match('|'.join(f'(?:{fnmatch.translate(p)})' for p in patterns), case=False).to_numpy(dtype=bool)
+  raise ValueError(f"Unknown match '{match}', choose among substring, regex, glob")
+
+def collapse_modules(df, patterns, match='substring'):
+  '''
+  Remove the components matching any of the patterns, moving their children to
+  the nearest ancestor that is kept, also across nested matching components.
+  The area of the kept components is not changed.
+  @param df: pd.DataFrame. DataFrame with the area of the components instance
+  @param patterns: str or list of str. Patterns of the ids to remove, see match_ids
+  @param match: str. How the patterns are matched: substring, regex or glob
+  @return: pd.DataFrame. DataFrame with the area of the components instance without the matching components
+  '''
+  removed = match_ids(df['id'], patterns, match)
+  if not removed.any():
+    return df
+  tree = HierTree.from_dataframe(df)
+  ancestor = tree.kept_ancestors(removed)
+  # Only the children of removed components change parent
+  moved = (tree.parent >= 0) & ~removed
+  moved[moved] = removed[tree.parent[moved]]
+  parents = df['parent'].to_numpy(dtype=object).copy()
+  parents[moved] = np.where(ancestor[moved] >= 0, tree.ids[ancestor[moved]], '')
+  df = df.assign(parent=parents)
+  return df[~removed]
 
 def remove_wrappers(df):
   '''
@@ -37,27 +89,16 @@ def remove_wrappers(df):
   @param df: pd.DataFrame. DataFrame with the area of the components instance
   @return: pd.DataFrame. DataFrame with the area of the components instance without the wrappers
   '''  
-  # Find all components containing "wrapper" in their name
-  wrappers = df[df['id'].str.contains('wrapper', case=False)]
-  # For all child of the wrapper id, rename parent to the same parent of the wrapper
-  children = df[df['parent'].isin(wrappers['id'])]
-  
-  for index, row in children.iterrows():
-    df.loc[index, 'parent'] = df.loc[df['id'] == row['parent'], 'parent'].values[0] 
-  # Remove the wrappers
-  df = df[~df['id'].str.contains('wrapper', case=False)]
-  return df
+  return collapse_modules(df, ['wrapper'])
 
 def remove_module(df, module_name):
-  module = df[df['id'].str.contains(module_name, case=False)]
-  # For all child of the wrapper id, rename parent to the same parent of the wrapper
-  children = df[df['parent'].isin(module['id'])]
-  
-  for index, row in children.iterrows():
-    df.loc[index, 'parent'] = df.loc[df['id'] == row['parent'], 'parent'].values[0] 
-  # Remove the wrappers
-  df = df[~df['id'].str.contains(module_name, case=False)]
-  return df
+  '''
+  Remove all components whose id contains a match of module_name, moving their children up
+  @param df: pd.DataFrame. DataFrame with the area of the components instance
+  @param module_name: str. Regular expression of the ids to remove
+  @return: pd.DataFrame. DataFrame with the area of the components instance without the module
+  '''
+  return collapse_modules(df, [module_name], 'regex')
 
 def add_module(df, module_name, parent_name, attr):
   '''
@@ -70,21 +111,22 @@ def add_module(df, module_name, parent_name, attr):
   # Ensure no changes to the original DataFrame
   df = df.copy()
   # Find parent ID
-  parent_row = df[df['id'].str.contains(parent_name, case=False)]
-  if parent_row.empty:
+  parent_rows = np.flatnonzero(df['id'].str.contains(parent_name, case=False, na=False))
+  if len(parent_rows) == 0:
       raise ValueError(f"Parent module '{parent_name}' not found.")
-  parent_id = parent_row.iloc[0]['id']
+  parent_node = parent_rows[0]
+  parent_id = df['id'].iloc[parent_node]
+  # Update the area of the parent and of all its ancestors
+  tree = HierTree.from_dataframe(df)
+  value_col = df.columns.get_loc('value')
+  for node in [parent_node] + tree.ancestors(parent_node):
+    df.iloc[node, value_col] += attr
   # Append the new module
-  new_row = {'id': module_name, 'parent': parent_id, 'label': module_name, 'value': attr,  'color': 'blue'}
+  new_row = {'id': module_name, 'parent': parent_id, 'label': module_name, 'value': attr}
+  if 'color' in df.columns:
+    # Colors are otherwise assigned at plot time, see assign_colors
+    new_row['color'] = 'blue'
   df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-  # Update parent values
-  parent = parent_id
-  while parent:
-      parent_row = df[df['id'] == parent]
-      if parent_row.empty:
-          break
-      df.loc[df['id'] == parent, 'value'] += attr
-      parent = parent_row['parent'].values[0] if not parent_row.empty else ''
   return df
 
 
@@ -95,49 +137,120 @@ def recursive_add(df, df_sub, parent_id):
   @param parent_id: str. Parent id whose children to add
   @param df_sub: pd.DataFrame. DataFrame to add the children to
   '''
-  df = df.copy()
-  children = df[df['parent'] == parent_id]
-  for _, child in children.iterrows():
-    # add child to the dataframe
-    df_sub = df_sub._append(child)
-    df_sub = recursive_add(df, df_sub, child['id'])
-  return df_sub
-
-def plot_threshold(df, top_module, threshold):
+  tree = HierTree.from_dataframe(df)
+  nodes = [tree.subtree(node)[1:] for node in tree.find(parent_id)]
+  children = df.iloc[np.concatenate(nodes)] if nodes else df.iloc[:0]
+  if df_sub.empty:
+    return children.copy()
+  return pd.concat([df_sub, children])
+
+def subtree_frame(df, tree, nodes, others):
+  '''
+  Build the DataFrame of a pruned subtree, adding an 'others' component for each
+  parent with removed children
+  @param df: pd.DataFrame. DataFrame the tree was built from
+  @param tree: HierTree. Tree of df
+  @param nodes: np.ndarray of int. Kept nodes, the first one is the top module
+  @param others: np.ndarray of float. Area of the removed children of each node
+  @return: pd.DataFrame. DataFrame of the subtree
+  '''
+  columns = ['id', 'parent', 'label', 'value', 'color']
+  if 'color' not in df.columns:
+    # Colors are assigned later, see assign_colors
+    columns.remove('color')
+  columns += [col for col in df.columns if col not in columns]
+  df_sub = df.iloc[nodes].reindex(columns=columns)
+  df_sub.iloc[0, df_sub.columns.get_loc('parent')] = ''
+
+  parents = nodes[others[nodes] > 0]
+  parent_ids = tree.ids[parents]
+  other_ids = np.array([parent_id + '_others' for parent_id in parent_ids], dtype=object)
+  # Merge into the 'others' components already in the subtree, e.g. from plot_threshold
+  existing = np.isin(other_ids, df_sub['id'].to_numpy(dtype=object))
+  if existing.any():
+    df_sub = df_sub.copy()
+    extra = pd.Series(others[parents[existing]], index=other_ids[existing])
+    is_other = df_sub['id'].isin(extra.index)
+    df_sub.loc[is_other, 'value'] += df_sub.loc[is_other, 'id'].map(extra).to_numpy()
+    parents, parent_ids, other_ids = parents[~existing], parent_ids[~existing], other_ids[~existing]
+  df_others = pd.DataFrame({
+    'id': other_ids,
+    'parent': parent_ids,
+    'label': 'others',
+    'value': others[parents],
+  }, columns=columns)
+  if 'color' in columns:
+    df_others['color'] = 'blue'
+  if df_others.empty:
+    return df_sub.reset_index(drop=True)
+  # The columns missing in the 'others' components are filled with NaN
+  return pd.concat([df_sub, df_others.dropna(axis=1, how='all')], ignore_index=True)
+
+def plot_threshold(df, top_module, threshold, tree=None):
   '''
   Remove all children with area < threshold * parent area
   @param df: pd.DataFrame. DataFrame with the area of the components instance
-  @param threshold: float. Threshold to remove children
+  @param threshold: float. Threshold to remove children, 0 to only extract the subtree of top_module
+  @param tree: HierTree. Tree of df, to share it among the calls on the same DataFrame (default: built from df)
   '''
-  df = df.copy()
-  
+  if tree is None:
+    tree = HierTree.from_dataframe(df)
+  top = tree.find(top_module)
+  if len(top) == 0:
+    return pd.DataFrame(columns=['id', 'parent', 'label', 'value'])
+
   # Look at the hierarchy starting from the top_module
-  df_sub = pd.DataFrame(columns=['id', 'parent', 'label', 'value', 'color'])
-  df_sub = df_sub._append(df.loc[df['id'] == top_module], ignore_index=True)
-  df_sub.loc[df_sub['id'] == top_module, 'parent'] = ''
-  df_sub = recursive_add(df, df_sub, top_module)
-  # Iterate over all parents
-  for parent_id in df_sub['parent'].unique():
-      other_value = 0.0
-      if pd.isna(parent_id) or parent_id == '':
-          continue
-      children = df_sub[df_sub['parent'] == parent_id]
-      for child_id in children['id']:
-        # find child value
-        child_attr = df_sub.loc[df_sub['id'] == child_id, 'value'].values[0]
-        parent_attr = df_sub.loc[df_sub['id'] == parent_id, 'value'].values[0]
-        # Remove child if child_attr < threshold * parent_attr
-        if child_attr < threshold * parent_attr:
-          other_value += child_attr
-          df_sub = df_sub[df_sub['id'] != child_id]
-          df_sub = recursive_remove(df_sub, child_id)
-
-      # Add the 'others' component
-      if other_value > 0:
-          df_sub = df_sub._append({'id': parent_id + '_others', 'parent': parent_id, 'label': 'others', 'value': other_value, 'color': 'blue'}, ignore_index=True)
-
-          
-  return df_sub
+  nodes, others = tree.threshold(top[0], threshold)
+  return subtree_frame(df, tree, nodes, others)
+
+def modules_at_depth(df, top_modules, depth, patterns=None, match='substring'):
+  '''
+  Find the components depth levels below the top modules, e.g. the subsystems of a SoC.
+  The components removed by collapse_modules are not counted as a level, nor returned.
+  @param df: pd.DataFrame. DataFrame with the area of the components instance, with unique ids
+  @param top_modules: list of str. Names of the top modules
+  @param depth: int. Number of levels below the top modules, 0 for the top modules themselves
+  @param patterns: str or list of str. Patterns of the collapsed components, see match_ids
+  @param match: str. How the patterns are matched: substring, regex or glob
+  @return: list of str. Ids of the components, in depth first order
+  '''
+  tree = HierTree.from_dataframe(df)
+  kept = ~match_ids(df['id'], patterns, match)
+  # Number of kept components from the root down to each component
+  level = np.zeros(len(tree), dtype=np.int64)
+  level[tree.roots] = kept[tree.roots]
+  for nodes in tree.levels[1:]:
+    level[nodes] = level[tree.parent[nodes]] + kept[nodes]
+  modules = {}
+  for top_module in top_modules:
+    top = tree.find(top_module)
+    if len(top) == 0:
+      raise ValueError(f"Top module '{top_module}' not found.")
+    nodes = tree.subtree(top[0])
+    nodes = nodes[kept[nodes] & (level[nodes] - level[top[0]] == depth)]
+    modules.update(dict.fromkeys(tree.ids[nodes].tolist()))
+  if not modules:
+    raise ValueError(f"No component found {depth} levels below {', '.join(map(str, top_modules))}.")
+  return list(modules)
+
+def level_of_detail(df, top_module, max_depth=None, max_nodes=None):
+  '''
+  Keep only the hierarchy that is displayed: the first max_depth levels starting
+  from the top_module and, among them, the largest components within a budget of
+  max_nodes. The area of the components left out of the budget is merged into an
+  'others' component of their parent.
+  @param df: pd.DataFrame. DataFrame with the area of the components instance
+  @param top_module: str. Name of the top module
+  @param max_depth: int. Number of levels to keep, top_module included (default: all)
+  @param max_nodes: int. Maximum number of components (default: no limit)
+  @return: pd.DataFrame. DataFrame with the area of the components instance
+  '''
+  tree = HierTree.from_dataframe(df)
+  top = tree.find(top_module)
+  if len(top) == 0:
+    return pd.DataFrame(columns=['id', 'parent', 'label', 'value'])
+  nodes, others = tree.level_of_detail(top[0], max_depth, max_nodes)
+  return subtree_frame(df, tree, nodes, others)
 
 
 def lighten_color(hex_color, amount=0.5):
@@ -190,50 +303,84 @@ def make_color_transparent(hex_color, amount=0.5):
     return f'#{r:02x}{g:02x}{b:02x}{a:02x}'
 
 
+def hex_to_rgba(hex_color):
+    '''
+    Parse a hexadecimal color code
+    @param hex_color: str. Hexadecimal color code, "#RRGGBB" or "#RRGGBBAA"
+    @return: tuple of int. Red, green, blue and alpha in [0, 255], None if not a valid color code
+    '''
+    hex_color = hex_color.lstrip('#') if isinstance(hex_color, str) else ''
+    if len(hex_color) not in (6, 8):
+        return None
+    try:
+        rgba = [int(hex_color[i:i + 2], 16) for i in range(0, len(hex_color), 2)]
+    except ValueError:
+        return None
+    return tuple(rgba) if len(rgba) == 4 else tuple(rgba) + (255,)
+
+
 def assign_colors(df, top_module, root_colors):  
     '''
     Starting from a df with columns: id, parent, label, value, color 
     assign a color to each component based on the parent-child relationship
     Assign a color of the root colors to all the children of the top_module, then each
-    subchild will have a color that is a lighter version of the parent color, based
-    on the hierarchical level
+    subchild will have a color that is a more transparent version of the parent color, based
+    on the hierarchical level below the top_module. Components outside of the top_module
+    subtree, or below a child with a color that is not a hex code, keep their color.
     @param df: pd.DataFrame. DataFrame with the area of the components instance
     @param root_colors: list of str. List of colors to assign to the first generation children
     @return: pd.DataFrame. DataFrame with the area of the components instance and the assigned colors
     '''
     df = df.copy()
-    
+    tree = HierTree.from_dataframe(df)
+    if 'color' in df.columns:
+        colors = df['color'].to_numpy(dtype=object).copy()
+    else:
+        colors = np.full(len(df), 'blue', dtype=object)
+    tops = tree.find(top_module)
     # Set the root node color
-    df.loc[df['id'] == top_module, 'color'] = root_colors[0]
-    # print line where id == top_module
-    #print(df.loc[df['id'] == top_module])
-    # Recursive color assignment based on parent-child relationships
+    colors[tops] = root_colors[0]
+
+    # Parse the root colors once, alpha is held numerically for all the levels:
+    # each level is 30% more transparent than its parent
+    n_colors = len(root_colors)
+    rgba = [hex_to_rgba(color) for color in root_colors]
+    max_depth = int(tree.depth.max()) + 1 if len(tree) else 1
+    alpha = np.empty((max_depth, n_colors), dtype=np.int64)
+    alpha[0] = [c[3] if c is not None else 0 for c in rgba]
+    for level in range(1, max_depth):
+        alpha[level] = np.maximum(0, (alpha[level - 1] * (1 - 0.3)).astype(np.int64))
+    hex_table = {}
+
+    # Nested top modules, if ids are duplicated, are colored after their ancestors
     c_idx = 1
-    eps = 1e-4
-    for parent_id in df['parent'].unique():
-        if pd.isna(parent_id) or parent_id == '':
+    for top in tops[np.argsort(tree.tin[tops], kind='stable')]:
+        branches = tree.children(top)
+        if len(branches) == 0:
             continue
-        elif parent_id == top_module:
-          # assign color in the list
-          # assign one color to each child
-          children = df[df['parent'] == parent_id]
-          for child_id in children['id']:
-            df.loc[df['id'] == child_id, 'color'] = root_colors[c_idx]
-            c_idx = (c_idx + 1) % len(root_colors)
-        else:
-          parent_color = df.loc[df['id'] == parent_id, 'color'].values[0]
-          # Find all children of the current parent
-          children = df[df['parent'] == parent_id]
-
-          # Assign color to each child based on its importance relative to the parent
-          for child_id in children['id']:
-            # TODO: improve, this serves when top_module != from top
-            try:
-              child_color = make_color_transparent(parent_color, amount=0.3)  # Scale lightening by ratio
-            except ValueError:
-              continue
-            df.loc[df['id'] == child_id, 'color'] = child_color
-
+        branch_colors = (c_idx + np.arange(len(branches))) % n_colors
+        c_idx = (c_idx + len(branches)) % n_colors
+        colors[branches] = np.asarray(root_colors, dtype=object)[branch_colors]
+        # Branch and level below the branch of each descendant, from the preorder intervals
+        descendants = tree.subtree(top)[1:]
+        order = np.argsort(tree.tin[branches], kind='stable')
+        branch = order[np.searchsorted(tree.tin[branches][order], tree.tin[descendants], side='right') - 1]
+        level = tree.depth[descendants] - tree.depth[top] - 1
+        deeper = level > 0
+        descendants, color_idx, level = descendants[deeper], branch_colors[branch[deeper]], level[deeper]
+        valid = np.array([c is not None for c in rgba])[color_idx]
+        descendants, color_idx, level = descendants[valid], color_idx[valid], level[valid]
+        # Convert to hex once per (color, level) pair
+        keys = level * n_colors + color_idx
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        for key in unique_keys.tolist():
+            if key not in hex_table:
+                lvl, col = divmod(key, n_colors)
+                r, g, b, _ = rgba[col]
+                hex_table[key] = f'#{r:02x}{g:02x}{b:02x}{alpha[lvl, col]:02x}'
+        colors[descendants] = np.array([hex_table[key] for key in unique_keys.tolist()], dtype=object)[inverse]
+
+    df['color'] = colors
     return df
 
 
@@ -244,17 +391,50 @@ def compute_area_percentage(df):
   @return: pd.DataFrame. DataFrame with the area of the components instance and the percentage of the area
   '''
   df = df.copy()
-  for parent_id in df['parent'].unique():
-    if pd.isna(parent_id) or parent_id == '':
-      continue
-    parent_value = df.loc[df['id'] == parent_id, 'value'].values[0]
-    children = df[df['parent'] == parent_id]
-    for child_id in children['id']:
-      child_value = df.loc[df['id'] == child_id, 'value'].values[0]
-      if parent_value == 0:
-        df.loc[df['id'] == child_id, 'percent'] = 0
-      else:
-        df.loc[df['id'] == child_id, 'percent'] = 100 * child_value / parent_value
+  tree = HierTree.from_dataframe(df)
+  has_parent = tree.parent >= 0
+  parent_value = tree.values[tree.parent[has_parent]]
+  percent = np.full(len(tree), np.nan)
+  percent[has_parent] = np.divide(100 * tree.values[has_parent], parent_value, out=np.zeros(len(parent_value)), where=parent_value != 0)
+  df['percent'] = percent
+  return df
+
+
+def compute_stats(df):
+  '''
+  Add the statistics of each component, computed with linear passes over the hierarchy:
+  - percent: float. Percentage of the area with respect to the parent area (NaN for the roots)
+  - percent_root: float. Percentage of the area with respect to the root area
+  - depth: int. Hierarchical level, 0 for the roots
+  - instances: int. Number of instances in the subtree, the component included
+  - self_value: float. Area of the component not accounted by its children (parent minus sum of children)
+  - rank: int. Rank of the area among the siblings, 1 for the largest
+  @param df: pd.DataFrame. DataFrame with the area of the components instance
+  @return: pd.DataFrame. DataFrame with the area of the components instance and the statistics
+  '''
+  df = compute_area_percentage(df)
+  tree = HierTree.from_dataframe(df)
+  n = len(tree)
+  has_parent = tree.parent >= 0
+  # Root of each node: the roots own disjoint preorder intervals
+  roots = tree.roots[np.argsort(tree.tin[tree.roots])]
+  root = roots[np.searchsorted(tree.tin[roots], tree.tin, side='right') - 1] if n else np.empty(0, dtype=np.int64)
+  root_value = tree.values[root]
+  children_value = np.bincount(tree.parent[has_parent], weights=tree.values[has_parent], minlength=n)
+  # Siblings are contiguous once sorted by parent, largest area first
+  order = np.lexsort((-tree.values, tree.parent))
+  sorted_parent = tree.parent[order]
+  group_start = np.flatnonzero(np.r_[True, sorted_parent[1:] != sorted_parent[:-1]]) if n else np.empty(0, dtype=np.int64)
+  group_size = np.diff(np.r_[group_start, n])
+  rank = np.empty(n, dtype=np.int64)
+  rank[order] = np.arange(n) - np.repeat(group_start, group_size) + 1
+  rank[~has_parent] = 1
+
+  df['percent_root'] = np.divide(100 * tree.values, root_value, out=np.zeros(n), where=root_value != 0)
+  df['depth'] = tree.depth
+  df['instances'] = tree.size
+  df['self_value'] = tree.values - children_value
+  df['rank'] = rank
   return df
 
 
@@ -324,158 +504,209 @@ def dict2df(component_dict, hier_levels, parent_inst=None, df_tree=None):
   '''
   # DataFrame to store the tree
   if df_tree is None:
-    df_tree = pd.DataFrame(columns=['id', 'parent', 'value', 'color'])
+    df_tree = pd.DataFrame(columns=['id', 'parent', 'value'])
   if hier_levels == 0:
     return df_tree
   for k, v in component_dict.items():
     # traverse the tree and recursively add id, parent, value, color
     if parent_inst is not None:
       if k == parent_inst:
-        df_tree = df_tree._append({'id': k, 'parent': '', 'value': v['attr'], 'color': 'blue'}, ignore_index=True)
+        df_tree = df_tree._append({'id': k, 'parent': '', 'value': v['attr']}, ignore_index=True)
         if isinstance(v, dict):
           #df_tree = df_tree._append({'id': k, 'parent': '', 'value': v['attr'], 'color': 'blue'}, ignore_index=True)
           df_tree = dict2df(v, hier_levels-1, k, df_tree)
       else:
         if isinstance(v, dict):
-          df_tree = df_tree._append({'id': k, 'parent': parent_inst, 'value': v['attr'], 'color': 'blue'}, ignore_index=True)
+          df_tree = df_tree._append({'id': k, 'parent': parent_inst, 'value': v['attr']}, ignore_index=True)
           df_tree = dict2df(v, hier_levels, k, df_tree)
 
   return df_tree
 
 def make_dataset_complete(df_tree):
-  # df_tree is a dataframe with columns: id, parent, value, color
-  # For each line of the dataframe find all lines with parent = id
-  for index, row in df_tree.iterrows():
-    curr_parent = row['id']
-    parent_area = row['value']
-    cum_area = 0
-    # Find all lines with parent = curr_parent
-    for index2, row2 in df_tree.iterrows():
-      if row2['parent'] == curr_parent:
-        # Accumulate the area of all children
-        cum_area += row2['value']
-    # Insert the line right after the parent
-    if cum_area > 0:
-      df_tree.loc[index+1] = [curr_parent +'_cum', curr_parent, curr_parent +'_cum', (parent_area-cum_area), 'blue']
-  return df_tree
-
-
-def get_area_from_component_name(component_name, filename):
+  '''
+  Add to each component with children a '{id}_cum' child with the area of the component
+  not accounted by its children, right after the component
+  @param df_tree: pd.DataFrame. DataFrame with the area of the components instance
+  @return: pd.DataFrame. DataFrame with the area of the components instance and the '_cum' components
+  '''
+  tree = HierTree.from_dataframe(df_tree)
+  has_parent = tree.parent >= 0
+  children_value = np.bincount(tree.parent[has_parent], weights=tree.values[has_parent], minlength=len(tree))
+  nodes = np.flatnonzero(children_value > 0)
+  cum_ids = np.array([f'{node_id}_cum' for node_id in tree.ids[nodes]], dtype=object)
+  df_cum = pd.DataFrame({col: pd.Series(dtype=df_tree[col].dtype) for col in df_tree.columns}, index=range(len(nodes)))
+  df_cum['id'] = cum_ids
+  df_cum['parent'] = tree.ids[nodes]
+  df_cum['label'] = cum_ids
+  df_cum['value'] = tree.values[nodes] - children_value[nodes]
+  if 'color' in df_cum.columns:
+    df_cum['color'] = 'blue'
+  # Insert each new row right after its parent
+  position = np.r_[np.arange(len(tree)), nodes + 0.5]
+  df_tree = pd.concat([df_tree, df_cum], ignore_index=True)
+  return df_tree.iloc[np.argsort(position, kind='stable')].reset_index(drop=True)
+
+
+def get_area_from_component_name(component_name, filename, match='auto'):
   '''
   Parse the report file to get the area of the component instance.
   This function does not account for any hierarchy in the design.
+  The report is indexed once, the index is reused by the following calls on the
+  same report, see report_parser.AreaIndex.
   @param component_name: str or list of string. Reduced name of the component instance
-  @param filename: str. Name of the report to parse
+  @param filename: str. Name of the report to parse, possibly compressed
+  @param match: str. How the names are matched: exact, suffix (e.g. u_alu matches
+  u_core/u_alu), regex, or auto: regex if the name has special characters, else suffix
   @return: List of float. Area of the components instance
   '''
   
-  file = open(filename, 'r')
-  lines = file.readlines()
-  file.close()
-  
   if type(component_name) == str:
     component_name = [component_name]
   
-  area = []
-  for name in component_name:
-    str_match = r'\w*' + name + r'\s+(\d+\.+\d+)'
-    for line in lines:
-      
-      match = re.search(str_match, line)
-      if match:
-        area.append(float(match.group(1)))
-        break
-    else:
+  area = report_parser.get_area_index(filename).lookup(component_name, match)
+  for name, value in zip(component_name, area):
+    if value is None:
       raise ValueError(f'No area found for {name} in {filename}')
 
   return area
   
 
 def rename_duplicates(df, top_module):
-    # Step 1: Find duplicates in the 'id' column
-    duplicates = df[df.duplicated(subset=['id'], keep=False)]
-
-    # Step 2: Iterate over duplicates and rename them uniquely
-    for idx, (id_val, parent, label, value, color) in enumerate(duplicates.values):
-        # Exit if the duplicate is the top module
-        if id_val == top_module:
-          raise NameError(f"Cannot choose among multiple instances of the top module '{id_val}'.")
-        
-        # Find all rows with this duplicate ID
-        matching_rows = df[df['id'] == id_val].index
-        # Find all children of a given id, they can go from the current idx to the next matching_rows element
-        for i, row_idx in enumerate(matching_rows):
-          try:
-            next_row_idx = matching_rows[i+1]
-          except IndexError:
-            # go to the end of the dataframe, if last duplicate
-            next_row_idx = len(df)-1
-          # go up to the nexxt index included for corner case of child with same name as parent (rare but possible)
-          for j in range(row_idx+1, next_row_idx+1):
-            if df.loc[j, 'parent'] == id_val:
-              #print(f"Found child {df.loc[j, 'id']} of {id_val}")
-              # substitute the parent with the new name
-              df.loc[j, 'parent'] = f"{id_val}_{i+1}"
-        # Rename all duplicate occurrences uniquely (e.g., append '_1', '_2', etc.)
-        for i, row_idx in enumerate(matching_rows):
-            new_id = f"{id_val}_{i+1}"
-            df.loc[row_idx, 'id'] = new_id
-        
+    '''
+    Rename the duplicated ids uniquely (e.g., append '_1', '_2', etc. in order of appearance)
+    and make the 'parent' field of their children point to the renamed parent.
+    Children are matched to their parent through the full hierarchical path, if the
+    'path' column is available, otherwise through the closest preceding ancestor with the parent id
+    (ambiguous when a leaf has the same name as its parent).
+    @param df: pd.DataFrame. DataFrame with the area of the components instance
+    @param top_module: str or list of str. Name of the top module(s), it cannot be duplicated
+    @return: pd.DataFrame. DataFrame with unique ids
+    '''
+    ids = df['id']
+    duplicated = ids.duplicated(keep=False)
+    if not duplicated.any():
+      return df
+    # Exit if the duplicate is a top module
+    top_modules = [top_module] if isinstance(top_module, str) or top_module is None else top_module
+    duplicated_tops = ids[duplicated & ids.isin(top_modules)]
+    if len(duplicated_tops):
+      raise NameError(f"Cannot choose among multiple instances of the top module '{duplicated_tops.iloc[0]}'.")
+
+    if 'path' in df.columns and df['path'].is_unique:
+      parent = resolve_path_parents(df['path'].to_numpy(dtype=object))
+    else:
+      parent = resolve_parents(ids.to_numpy(dtype=object), df['parent'].to_numpy(dtype=object))
+
+    # Number the occurrences of each duplicated id, in order of appearance
+    occurrence = ids.groupby(ids, sort=False).cumcount() + 1
+    new_ids = ids.to_numpy(dtype=object).copy()
+    renamed = np.flatnonzero(duplicated.to_numpy())
+    new_ids[renamed] = [f'{name}_{n}' for name, n in zip(new_ids[renamed].tolist(), occurrence.to_numpy()[renamed].tolist())]
+    parents = df['parent'].to_numpy(dtype=object).copy()
+    has_parent = parent >= 0
+    parents[has_parent] = new_ids[parent[has_parent]]
+
+    df = df.copy()
+    df['id'] = new_ids
+    df['parent'] = parents
     return df
 
-def get_df_from_report(filename:str):
+def check_top_module(df, top_module):
+    '''
+    Check that the top module is not one of the instances renamed by rename_duplicates
+    @param df: pd.DataFrame. DataFrame with the area of the components instance
+    @param top_module: str. Name of the top module
+    '''
+    if 'path' in df.columns and top_module not in df['id'].values:
+      names = df['path'].str.rpartition('/')[2]
+      if (names == top_module).sum() > 1:
+        raise NameError(f"Cannot choose among multiple instances of the top module '{top_module}'.")
+
+def get_df_from_report(filename:str, use_mmap=False, fmt=None):
   '''
   Parse the report file to get the area of the component instance.
 
-  @param filename: str. Name of the report to parse
+  @param filename: str. Name of the report to parse, possibly compressed (see report_parser.COMPRESSIONS)
+  @param use_mmap: bool. Read the report through a memory map instead of buffered reads
+  @param fmt: str. Format of the report, among report_parser.PARSERS (default: detected)
   @return: pd.DataFrame. DataFrame with the area of the components instance
   The DataFrame has the following columns:
-  - id: str. Name of the component instance
-  - parent: str. Name of the parent component instance
-  - label: str. Pretty name of the component instance (TO BE DEFINED IN A PRETTY WAY)
+  - id: str. Name of the component instance, instances with the same name share the string
+  - parent: str. Name of the parent component instance, the same string as the id of the parent:
+  a pointer per row, as small as an integer reference, that the plots use as is
+  - label: category. Pretty name of the component instance
   - value: float. Area of the component instance
-  - color: str. Color of the component instance (TO BE DEFINED IN A PRETTY WAY)
+  - path: str. Full hierarchical path of the component instance, unique
+  - the other numeric columns of the report (see report_parser.parse_report), e.g.
+  percent_total, combinational, sequential and black_box: float. Local area breakdown
+  of the component instance, not including its children
+  The colors are assigned at plot time, see assign_colors.
   '''
-  file = open(filename, 'r')
-  lines = file.readlines()
-  file.close()
+  # The parser backends return only the instances, the total rows are skipped
+  stats = {}
+  columns = report_parser.parse_report(filename, use_mmap, fmt, stats)
+  read = 'decompressed' if stats['compression'] else 'read'
+  print(f"Parsed {filename}: {stats['size'] / 1e6:.1f} MB {read} in {stats['read_time']:.3f} s, parsed in {stats['parse_time']:.3f} s")
+  paths = columns.pop('path')
+  values = columns.pop('value')
+  if not paths:
+    return pd.DataFrame(columns=['id', 'parent', 'label', 'value', 'path'])
+
+  # Instances of replicated blocks share their names: each name is stored once
+  # and the id and parent of all its instances reference the same string
+  names = {}
+  intern = names.setdefault
+  # The first match is the top module, first level modules are reported without it
+  top_name = paths[0].rpartition('/')[2]
+  top_name = intern(top_name, top_name)
+  print(f"Found top module {top_name}")
+  ids = [top_name]
+  parents = ['']
+  for path in paths[1:]:
+    # Last two levels of each path, without splitting the whole path
+    levels = path.rsplit('/', 2)
+    ids.append(intern(levels[-1], levels[-1]))
+    parents.append(intern(levels[-2], levels[-2]) if len(levels) > 1 else top_name)
+  ids = np.array(ids, dtype=object)
+
+  # Labels are prettified once per name and stored as categories
+  categories = pd.Categorical(ids)
+  labels, label_codes = np.unique([prettify_name(name) for name in categories.categories], return_inverse=True)
+  df = pd.DataFrame({
+    'id': ids,
+    'parent': np.array(parents, dtype=object),
+    'label': pd.Categorical.from_codes(label_codes[categories.codes], labels),
+    'value': values,
+    'path': paths,
+    **columns,
+  })
+  return df
 
-  df = pd.DataFrame(columns=['id', 'parent', 'label', 'value', 'color'])
-  
-  component_str = r'([[a-zA-Z\_]+[\/[a-zA-Z0-9\_]*]{0,})\s+(\d+\.+\d+)[\s+\d+\.+\d+]*[a-zA-Z\_]+'
-  first_match_is_top = False
-  
-  rows = []  # Store rows before adding them to df
-  
-  for line in lines:
-      match = re.search(component_str, line)
-      if match:
-          split_hier = match.group(1).split('/')
-          area = float(match.group(2))
-          label = prettify_name(split_hier[-1])
-  
-          if not first_match_is_top:
-              rows.append({'id': split_hier[-1], 'parent': '', 'label': label, 'value': area, 'color': 'blue'})
-              top_name = split_hier[-1]
-              first_match_is_top = True
-              print(f"Found top module {split_hier[-1]}")
-          elif len(split_hier) == 1:
-              print(f"Found module {split_hier[-1]}")
-              rows.append({'id': split_hier[-1], 'parent': top_name, 'label': label, 'value': area, 'color': 'blue'})
-          else:
-              rows.append({'id': split_hier[-1], 'parent': split_hier[-2], 'label': label, 'value': area, 'color': 'blue'})
-  
-  # Convert list of rows to DataFrame and concatenate in one operation
-  # Check for empty rows to avoid error in concatenation
-  if rows:
-      df = pd.concat([df, pd.DataFrame(rows)], ignore_index=True)
-  
-  # Remove last row (assumed to be the total)
-  # Careful!!!! this is true for the tested tools, may be a problem with others
-  # print last row
-  if not df.empty:
-      df = df[:-1]
-
-  # save to temp cvs
-  #df.to_csv('temp.csv', index=False, float_format='%.4f', columns=['id', 'parent', 'label', 'value', 'color'], header=True)
-  return df  
\ No newline at end of file
+
+def metric_columns(df):
+  '''
+  @param df: pd.DataFrame. DataFrame with the area of the components instance
+  @return: list of str. Columns of the local area breakdown, see report_parser.METRICS
+  '''
+  return [col for col in report_parser.METRICS if col in df.columns]
+
+
+def hierarchical_metrics(df):
+  '''
+  Turn the local area breakdown of each component into the breakdown of its whole
+  subtree, summing the children with one pass over the depth first order
+  @param df: pd.DataFrame. DataFrame with the area of the components instance
+  @return: pd.DataFrame. DataFrame with the breakdown columns including the children
+  '''
+  metrics = metric_columns(df)
+  if not metrics:
+    return df
+  df = df.copy()
+  tree = HierTree.from_dataframe(df)
+  # Subtree sum: difference of the prefix sums at the ends of the preorder interval
+  start, end = tree.tin, tree.tin + tree.size
+  for col in metrics:
+    local = np.nan_to_num(pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64))
+    prefix = np.r_[0.0, np.cumsum(local[tree.preorder])]
+    df[col] = prefix[end] - prefix[start]
+  return df
@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+from area_plot import batch
+
+
+@pytest.mark.parametrize('report, out', [
+  ('runs/r300b.rpt', 'r300b'),
+  ('runs/r300b.rpt.gz', 'r300b'),
+  ('runs/r300b.rpt.XZ', 'r300b'),
+  ('runs/r300b.rpt.zst', 'r300b'),
+  ('runs/r300b.gz', 'r300b'),
+  ('runs/r300b', 'r300b'),
+  ('runs/r300b.v1.rpt', 'r300b.v1'),
+])
+def test_report_out_dir(report, out):
+  assert batch.report_out_dir(report, [report, 'runs/other.rpt'], 'out') == os.path.join('out', out)
+
+
+def test_report_out_dir_mirrors_the_tree():
+  reports = ['runs/a/area.rpt.bz2', 'runs/b/area.rpt']
+  assert [batch.report_out_dir(report, reports, 'out') for report in reports] == [os.path.join('out', 'a', 'area'), os.path.join('out', 'b', 'area')]
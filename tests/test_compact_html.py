@@ -0,0 +1,40 @@
+import base64
+import json
+
+import numpy as np
+import pytest
+
+go = pytest.importorskip('plotly.graph_objects')
+
+from area_plot import compact_html
+
+
+def packed_trace(colors):
+  fig = go.Figure(go.Treemap(ids=['top', 'u_a', 'u_b'], parents=['', 'top', 'top'], labels=['Top', 'A', 'B'],
+                             values=[3.0, 1.0, 2.0], marker=dict(colors=colors)))
+  html = compact_html.to_compact_html(fig, compact_html.PLOTLYJS_NAME)
+  figure = html.split('var fig = ', 1)[1].split(';\n  function decode', 1)[0]
+  return json.loads(figure.replace('<\\/', '</'))['data'][0]
+
+
+def unpack_numbers(packed):
+  return np.frombuffer(base64.b64decode(packed['bdata']), dtype=packed['dtype']).tolist()
+
+
+def unpack_strings(packed):
+  index = np.frombuffer(base64.b64decode(packed['index']), dtype='<i4')
+  return [packed['table'][i] if i >= 0 else '' for i in index]
+
+
+@pytest.mark.parametrize('colors', [[-0.5, 0.0, 0.25], np.array([-0.5, 0.0, 0.25]), [-1, 0, 1]])
+def test_numeric_colors(colors):
+  # Colors mapped on a colorscale, e.g. by the diff, stay numbers
+  trace = packed_trace(colors)
+  assert unpack_numbers(trace['marker']['colors']) == [float(c) for c in colors]
+
+
+def test_string_colors():
+  trace = packed_trace(['#ff0000', '#00ff00', '#ff0000'])
+  assert unpack_strings(trace['marker']['colors']) == ['#ff0000', '#00ff00', '#ff0000']
+  assert unpack_strings(trace['labels']) == ['Top', 'A', 'B']
+  assert unpack_strings(dict(trace['parents'], table=trace['ids'])) == ['', 'top', 'top']
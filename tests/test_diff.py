@@ -0,0 +1,21 @@
+import os
+
+from area_plot import diff
+from area_plot import utils_area as utils
+from reports import write_report
+
+
+def test_top_sorting_after_children(tmp_path):
+  # The top module name sorts after the instance paths
+  old = write_report(tmp_path / 'old.rpt', [('zz_top', '10.0'), ('u_inst_1', '4.0'), ('u_inst_1/u_sub', '1.0'), ('u_inst_2', '5.0')])
+  new = write_report(tmp_path / 'new.rpt', [('zz_top', '12.0'), ('u_inst_1', '4.0'), ('u_inst_1/u_sub', '2.0'),
+                                            ('u_inst_2', '6.0'), ('u_inst_0', '1.0')])
+  df_diff = diff.diff_hierarchies(utils.get_df_from_report(old), utils.get_df_from_report(new))
+  assert df_diff['id'].tolist() == ['zz_top', 'u_inst_1', 'u_inst_1/u_sub', 'u_inst_2', 'u_inst_0']
+  parents = dict(zip(df_diff['id'], df_diff['parent']))
+  assert parents == {'zz_top': '', 'u_inst_1': 'zz_top', 'u_inst_1/u_sub': 'u_inst_1', 'u_inst_2': 'zz_top', 'u_inst_0': 'zz_top'}
+  assert df_diff['delta'].tolist() == [2.0, 0.0, 1.0, 1.0, 1.0]
+
+  out_dir = tmp_path / 'out'
+  diff.main([old, new, '--out-dir', str(out_dir), '--no-plot', '--no-cache'])
+  assert os.listdir(out_dir) == ['zz_top_regressions.csv']
@@ -0,0 +1,64 @@
+import pytest
+
+from area_plot import main as area_plot
+from area_plot import utils_area as utils
+from area_plot.hier_edit import EditableHierarchy
+from reports import write_report
+
+
+@pytest.fixture
+def hierarchy(tmp_path):
+  report = write_report(tmp_path / 'area.rpt', [('top', '10.0'), ('u_core', '4.0'), ('u_core/u_alu', '1.0'),
+                                                ('u_mem', '5.0'), ('u_mem/u_bank', '3.0')])
+  return EditableHierarchy(utils.get_df_from_report(report))
+
+
+def test_update_figure_keeps_colors(hierarchy):
+  df = utils.hierarchical_metrics(hierarchy.to_dataframe())
+  fig = area_plot.treemap_figure(df, 'top', 4, 'total', area_plot.DEFAULT_COLORMAP)
+  colors = dict(zip(fig.data[0].ids, fig.data[0].marker.colors))
+  assert colors['u_core'] == area_plot.DEFAULT_COLORMAP[1]
+
+  hierarchy.add('u_sram', 'u_mem', 2.0)
+  hierarchy.update_figure(fig)
+  updated = dict(zip(fig.data[0].ids, fig.data[0].marker.colors))
+  assert {node: updated[node] for node in colors} == colors
+  # Added modules take the color of their parent
+  assert updated['u_sram'] == updated['u_mem']
+
+
+COLORMAP = ['#112233', '#445566', '#778899']
+
+
+def test_update_figure_in_place(hierarchy):
+  # The traces of the figure are updated in place, without a widget
+  pytest.importorskip('plotly')
+  fig = hierarchy.figure(colormap=COLORMAP)
+  fig.update_layout(title='area', uirevision='keep')
+  trace = fig.data[0]
+  colors = dict(zip(trace.ids, trace.marker.colors))
+  assert colors['u_core'] == COLORMAP[1] and colors['u_mem'] == COLORMAP[2]
+
+  hierarchy.apply([('add', 'u_sram', 'u_mem', 2.0), ('remove', 'u_alu')])
+  assert hierarchy.update_figure(fig) is fig
+  assert fig.data[0] is trace
+  assert list(trace.ids) == ['top', 'u_core', 'u_mem', 'u_bank', 'u_sram']
+  assert list(trace.parents) == ['', 'top', 'top', 'u_mem', 'u_mem']
+  assert list(trace.values) == [11.0, 3.0, 7.0, 3.0, 2.0]
+  updated = dict(zip(trace.ids, trace.marker.colors))
+  assert updated == dict({node: colors[node] for node in updated if node in colors}, u_sram=colors['u_mem'])
+  # The hover breakdown follows the edits
+  assert len(trace.customdata) == len(trace.ids)
+  assert fig.layout.title.text == 'area' and fig.layout.uirevision == 'keep'
+
+  # A new colormap recolors the whole plot
+  hierarchy.update_figure(fig, colormap=['#000000', '#ff0000', '#00ff00'])
+  assert dict(zip(trace.ids, trace.marker.colors))['u_mem'] == '#00ff00'
+
+
+def test_update_figure_keeps_widget_colors(hierarchy):
+  pytest.importorskip('anywidget')
+  fig = hierarchy.figure_widget(colormap=COLORMAP)
+  colors = list(fig.data[0].marker.colors)
+  hierarchy.update_figure(fig)
+  assert list(fig.data[0].marker.colors) == colors
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from area_plot.hier_tree import HierTree, resolve_parents, resolve_path_parents
+
+
+def tree(rows):
+  return HierTree.from_dataframe(pd.DataFrame(rows, columns=['id', 'parent', 'value']))
+
+
+@pytest.mark.parametrize('rows, parents', [
+  # Unique ids, a missing parent and a node naming itself as parent are roots
+  ([('top', ''), ('u_a', 'top'), ('u_b', 'u_a'), ('u_c', 'u_none'), ('u_d', 'u_d')], [-1, 0, 1, -1, -1]),
+  # Duplicated ids: the closest row with the parent id among the ancestors of the previous row
+  ([('top', ''), ('u_core', 'top'), ('u_alu', 'u_core'), ('u_fpu', 'u_core'), ('u_core', 'top'), ('u_alu', 'u_core'),
+    ('u_alu', 'u_alu'), ('u_dbg', 'top')], [-1, 0, 1, 1, 0, 4, 5, 0]),
+  # Parents out of the chain of ancestors fall back to the last row with that id, else none
+  ([('top', ''), ('u_core', 'top'), ('u_alu', 'u_core'), ('u_core', 'top'), ('u_dbg', 'top'), ('u_x', 'u_alu'),
+    ('u_y', 'u_core'), ('u_z', 'u_none')], [-1, 0, 1, 0, 0, 2, 3, -1]),
+])
+def test_resolve_parents(rows, parents):
+  ids, parent_ids = (np.array(column, dtype=object) for column in zip(*rows))
+  assert resolve_parents(ids, parent_ids).tolist() == parents
+
+
+def test_resolve_path_parents():
+  # First level instances are reported without the top module
+  paths = np.array(['top', 'u_cpu0', 'u_cpu0/u_alu', 'u_cpu1', 'u_cpu1/u_alu', 'u_cpu1/u_alu/u_alu', 'u_x/u_y'], dtype=object)
+  assert resolve_path_parents(paths).tolist() == [-1, 0, 1, 0, 3, 4, -1]
+
+
+TREE = [('top', '', 100.0), ('u_a', 'top', 60.0), ('u_a1', 'u_a', 50.0), ('u_a2', 'u_a', 4.0), ('u_a2x', 'u_a2', 4.0),
+        ('u_a3', 'u_a', 3.0), ('u_b', 'top', 30.0), ('u_b1', 'u_b', 28.0), ('u_b2', 'u_b', 2.0), ('u_c', 'top', 5.0),
+        ('u_d', 'top', 5.0)]
+
+
+def test_structure():
+  hier = tree(TREE)
+  assert hier.depth.tolist() == [0, 1, 2, 2, 3, 2, 1, 2, 2, 1, 1]
+  assert hier.size.tolist() == [11, 5, 1, 2, 1, 1, 3, 1, 1, 1, 1]
+  assert hier.children(0).tolist() == [1, 6, 9, 10]
+  assert hier.subtree(1).tolist() == [1, 2, 3, 4, 5]
+  assert hier.ancestors(4) == [3, 1, 0]
+
+
+@pytest.mark.parametrize('top, threshold, nodes, others', [
+  # The pruned children are summed per parent, their descendants are dropped with them
+  (0, 0.1, [0, 1, 2, 6, 7], {0: 10.0, 1: 7.0, 6: 2.0}),
+  (1, 0.1, [1, 2], {1: 7.0}),
+  (0, 0.5, [0, 1, 2], {0: 40.0, 1: 7.0}),
+  (0, 0, list(range(11)), {}),
+])
+def test_threshold(top, threshold, nodes, others):
+  kept, pruned = tree(TREE).threshold(top, threshold)
+  assert kept.tolist() == nodes
+  assert {node: area for node, area in enumerate(pruned.tolist()) if area} == others
+
+
+@pytest.mark.parametrize('removed, ancestors', [
+  # Nested removed nodes are skipped up to the closest kept one, removed roots leave no ancestor
+  ([1, 3], [-1, 0, 0, 0, 0, 0, 0, 6, 6, 0, 0]),
+  ([0, 1], [-1, -1, -1, -1, 3, -1, -1, 6, 6, -1, -1]),
+])
+def test_kept_ancestors(removed, ancestors):
+  hier = tree(TREE)
+  mask = np.zeros(len(hier), dtype=bool)
+  mask[removed] = True
+  assert hier.kept_ancestors(mask).tolist() == ancestors
+
+
+def test_find():
+  hier = tree([('top', '', 3.0), ('u_a', 'top', 1.0), ('u_a', 'top', 1.0)])
+  assert hier.find('u_a').tolist() == [1, 2]
+  assert hier.find('top').tolist() == [0]
+  assert hier.find('u_none').tolist() == []
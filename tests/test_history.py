@@ -0,0 +1,26 @@
+import pytest
+
+from area_plot.history import AreaHistory
+
+
+REPORT = '''Hierarchical cell     Absolute Total  Percent Total  Combi-national  Noncombi-national  Black-boxes  Design
+--------------------  ----------------  -------------  ---------------  -----------------  -----------  ------
+top                   10.0              100.0          4.0              6.0                0.0          top
+u_core                6.0               60.0           2.0              4.0                0.0          core
+--------------------  ----------------  -------------  ---------------  -----------------  -----------  ------
+'''
+
+
+def test_replace_keeps_run_when_parsing_fails(tmp_path):
+  report = tmp_path / 'area.rpt'
+  report.write_text(REPORT)
+  with AreaHistory(str(tmp_path / 'history.db')) as history:
+    assert history.ingest(str(report), run='nightly') == 2
+    with pytest.raises(ValueError):
+      history.ingest(str(report), run='nightly', replace=True, fmt='unknown')
+    assert history.runs()['name'].tolist() == ['nightly']
+    df = history.query(['u_core'])
+    assert df['u_core'].tolist() == [6.0]
+    # A successful replace swaps the run
+    assert history.ingest(str(report), run='nightly', replace=True) == 2
+    assert len(history.runs()) == 1
@@ -0,0 +1,60 @@
+import json
+import re
+
+import pytest
+
+from area_plot import main
+from reports import write_report
+
+
+ROWS = [('top', '20.0'), ('u_a', '9.0'), ('u_a/u_x_wrapper', '5.0'), ('u_a/u_x_wrapper/u_x', '4.5'),
+        ('u_a/u_y', '0.1'), ('u_b', '10.0'), ('u_b/u_z', '6.0')]
+
+
+def plot(tmp_path, name, top_modules, options):
+  report = write_report(tmp_path / 'area.rpt', ROWS)
+  out_dir = tmp_path / name
+  main.run(main.get_args(['-f', report, '-t', *top_modules, '--out-dir', str(out_dir), '--no-cache', *options]))
+  return out_dir
+
+
+@pytest.mark.parametrize('options', [[], ['--threshold', '0.05'], ['--lod', '-d', '2']])
+def test_top_module_alone_or_among_others(tmp_path, options):
+  # A top module plots the same hierarchy whether it is plotted alone or with others
+  alone = plot(tmp_path, 'alone', ['u_a'], ['--no-plot', *options])
+  many = plot(tmp_path, 'many', ['u_a', 'u_b'], ['--no-plot', *options])
+  assert (alone / 'u_a.json').read_text() == (many / 'u_a.json').read_text()
+
+
+@pytest.mark.parametrize('top_modules', [['u_a'], ['u_a', 'u_b']])
+def test_top_module_subtree(tmp_path, top_modules):
+  # Each top module exports only its own subtree, rooted at the top module
+  out_dir = plot(tmp_path, 'out', top_modules, ['--no-plot'])
+  rows = json.loads((out_dir / 'u_a.json').read_text())
+  assert [(row['id'], row['parent']) for row in rows] == [('u_a', ''), ('u_x', 'u_a'), ('u_y', 'u_a')]
+
+
+def test_top_module_html_alone_or_among_others(tmp_path):
+  pytest.importorskip('plotly')
+  alone = plot(tmp_path, 'alone', ['u_a'], ['--formats', 'html'])
+  many = plot(tmp_path, 'many', ['u_a', 'u_b'], ['--formats', 'html'])
+  # Only the ids generated by plotly for the div differ
+  uuid = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+  html_alone, = alone.glob('u_a_*.html')
+  html_many, = many.glob('u_a_*.html')
+  assert uuid.sub('', html_alone.read_text()) == uuid.sub('', html_many.read_text())
+
+
+def test_drill_down_html_gzip(tmp_path):
+  # The links between the drill-down pages would point to files the browsers download
+  with pytest.raises(ValueError, match='--html-gzip'):
+    plot(tmp_path, 'out', ['top'], ['--formats', 'html', '--drill-down', '-d', '2', '--html-gzip'])
+
+
+def test_drill_down_links(tmp_path):
+  pytest.importorskip('plotly')
+  out_dir = plot(tmp_path, 'out', ['top'], ['--formats', 'html', '--drill-down', '-d', '2'])
+  # The deepest components of the top page link to the plain HTML pages of their subtree
+  html = (out_dir / 'top_treemap.html').read_text()
+  assert '"u_a": "top_treemap_pages/u_a.html"' in html
+  assert (out_dir / 'top_treemap_pages' / 'u_a.html').exists()
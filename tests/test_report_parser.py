@@ -0,0 +1,153 @@
+import gzip
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from area_plot import report_parser
+from area_plot import utils_area as utils
+from reports import write_report
+
+
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+
+
+def data(name):
+  return os.path.join(DATA, name)
+
+
+def expected(name):
+  return pd.read_csv(data(name), keep_default_na=False)
+
+
+@pytest.mark.parametrize('report, fmt', [('dc.rpt', 'dc'), ('dc_buf_inv.rpt', 'dc'), ('genus.rpt', 'genus'), ('yosys.rpt', 'yosys')])
+def test_sniff_report(report, fmt):
+  assert report_parser.sniff_report(data(report)) == fmt
+
+
+@pytest.mark.parametrize('head, fmt', [
+  (b'  Generated by:           Genus(TM) Synthesis Solution 21.14-s082_1\n', 'genus'),
+  (b'   Instance   Module   Cell Count  Cell Area  Net Area   Total Area\n', 'genus'),
+  (b"   Chip area for module '\\alu': 745.715200\n", 'yosys'),
+  (b'\n=== alu ===\n\n   Number of wires:   97\n', 'yosys'),
+  (b'Report : area\nDesign : soc_top\n', 'dc'),
+  (b'', 'dc'),
+])
+def test_detect_format(head, fmt):
+  assert report_parser.detect_format(head) == fmt
+
+
+@pytest.mark.parametrize('report', ['dc', 'dc_buf_inv', 'genus', 'yosys'])
+def test_parse_report(report):
+  # Each backend gives the hierarchy and the other numeric columns of its report
+  df = utils.get_df_from_report(data(report + '.rpt'))
+  df_expected = expected(report + '.csv')
+  assert list(df.columns) == ['id', 'parent', 'label', 'value', 'path'] + list(df_expected.columns[4:])
+  pd.testing.assert_frame_equal(df[df_expected.columns].astype({'id': str, 'parent': str}), df_expected, check_dtype=False)
+
+
+def test_parse_compressed_report(tmp_path):
+  # Compressed reports are detected from their content, not from the extension
+  compressed = tmp_path / 'area.rpt'
+  with open(data('dc.rpt'), 'rb') as source, gzip.open(compressed, 'wb') as target:
+    shutil.copyfileobj(source, target)
+  assert report_parser.sniff_report(str(compressed)) == 'dc'
+  df = utils.get_df_from_report(str(compressed))
+  pd.testing.assert_frame_equal(df[['path', 'value']], expected('dc.csv')[['path', 'value']])
+
+
+def test_forced_format():
+  with pytest.raises(ValueError, match='Unknown report format'):
+    report_parser.parse_report(data('dc.rpt'), fmt='vivado')
+  # OpenROAD reports are the Yosys ones
+  assert report_parser.parse_report(data('yosys.rpt'), fmt='openroad')['path'] == expected('yosys.csv')['path'].tolist()
+
+
+@pytest.mark.parametrize('header, names', [
+  # Two lines of titles, split as in the DC reports
+  ([b'Hierarchical cell  Absolute  Percent  Combi-    Noncombi-  Black-',
+    b'                   Total     Total    national  national   boxes   Design',
+    b'-----------------  --------  -------  --------  ---------  ------  ------'],
+   ['percent_total', 'combinational', 'sequential', 'black_box']),
+  # Unknown titles are kept, lowercase
+  ([b'Hierarchical cell  Absolute  Percent  Leakage',
+    b'                   Total     Total    Power',
+    b'-----------------  --------  -------  -------'],
+   ['percent_total', 'leakagepower']),
+  # Without a usable header the columns are named in the DC order
+  (None, ['percent_total', 'combinational', 'sequential', 'black_box']),
+])
+def test_column_names(header, names):
+  assert report_parser.column_names(header, len(names)) == names
+
+
+def test_metric_columns():
+  # The local breakdown of the report includes the children once aggregated
+  df = utils.hierarchical_metrics(utils.get_df_from_report(data('dc.rpt')))
+  sequential = dict(zip(df['id'], df['sequential']))
+  assert sequential['u_cpu'] == pytest.approx(208.4503 + 986.0749)
+  assert sequential['soc_top'] == pytest.approx(96.3217 + 208.4503 + 986.0749 + 807.268)
+  assert dict(zip(df['id'], df['black_box']))['soc_top'] == pytest.approx(800.0)
+
+
+LOOKUP_ROWS = [('top', '20.0'), ('u_core', '12.0'), ('u_core/u_alu', '5.0'), ('u_core/u_alu_1', '2.0'),
+               ('u_dsp', '6.0'), ('u_dsp/u_alu', '3.0'), ('u_dsp/u_salu', '1.0')]
+
+
+@pytest.fixture
+def index(tmp_path):
+  return report_parser.AreaIndex.from_report(write_report(tmp_path / 'area.rpt', LOOKUP_ROWS))
+
+
+@pytest.mark.parametrize('name, match, area', [
+  ('u_core/u_alu', 'exact', 5.0),
+  ('u_alu', 'exact', None),
+  # Suffixes of the hierarchical names, the first one in the report wins if ambiguous
+  ('u_alu', 'suffix', 5.0),
+  ('u_dsp/u_alu', 'suffix', 3.0),
+  ('salu', 'suffix', 1.0),
+  ('u_alu_1', 'auto', 2.0),
+  ('top', 'auto', 20.0),
+  ('u_fpu', 'suffix', None),
+  # Regular expressions match the end of the names
+  ('u_alu_[0-9]+', 'auto', 2.0),
+  ('u_dsp/.*alu', 'regex', 3.0),
+  ('u_s?alu', 'regex', 5.0),
+  ('u_fpu.*', 'regex', None),
+])
+def test_area_index_lookup(index, name, match, area):
+  assert index.lookup([name], match) == [area]
+
+
+def test_area_index_many(index):
+  # Exact, suffix and regex lookups in one call keep the order of the names
+  assert index.lookup(['u_dsp', 'u_alu_[0-9]+', 'u_missing', 'u_salu']) == [6.0, 2.0, None, 1.0]
+  with pytest.raises(ValueError, match='Unknown match'):
+    index.lookup(['u_alu'], 'glob')
+
+
+def test_get_area_from_component_name(tmp_path):
+  report = write_report(tmp_path / 'area.rpt', LOOKUP_ROWS)
+  assert utils.get_area_from_component_name('u_alu', report) == [5.0]
+  assert utils.get_area_from_component_name(['u_dsp/u_alu', 'u_salu'], report) == [3.0, 1.0]
+  with pytest.raises(ValueError, match='No area found for u_fpu'):
+    utils.get_area_from_component_name(['u_alu', 'u_fpu'], report)
+
+
+def test_area_index_cache(tmp_path):
+  report = write_report(tmp_path / 'area.rpt', LOOKUP_ROWS)
+  index = report_parser.get_area_index(report)
+  assert report_parser.get_area_index(report) is index
+  # Same size, new content and modification time: the report is indexed again
+  stat = os.stat(report)
+  write_report(tmp_path / 'area.rpt', [(name, '9.0' if name == 'u_core/u_alu' else value) for name, value in LOOKUP_ROWS])
+  assert os.stat(report).st_size == stat.st_size
+  os.utime(report, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+  changed = report_parser.get_area_index(report)
+  assert changed is not index
+  assert changed.lookup(['u_alu']) == [9.0]
+  # The cache is keyed by the real path of the report
+  link = tmp_path / 'link.rpt'
+  link.symlink_to(report)
+  assert report_parser.get_area_index(str(link)) is changed
@@ -0,0 +1,8 @@
+from area_plot import bench
+
+
+def test_startup():
+  # The CLI imports the heavy modules only in the stages using them
+  res = bench.bench_startup('area_plot.main', repeat=3)
+  assert res['heavy'] == []
+  assert res['seconds'] * 1e3 <= bench.STARTUP_BUDGET_MS
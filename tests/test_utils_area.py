@@ -0,0 +1,114 @@
+import pandas as pd
+import pytest
+
+from area_plot import utils_area as utils
+
+
+def frame(rows):
+  return pd.DataFrame(rows, columns=['id', 'parent', 'value']).assign(label=lambda df: df['id'])[['id', 'parent', 'label', 'value']]
+
+
+TREE = frame([('top', '', 10.0), ('u_a', 'top', 6.0), ('u_a1', 'u_a', 5.0), ('u_a2', 'u_a', 0.5), ('u_b', 'top', 3.0)])
+
+
+@pytest.mark.parametrize('transform', [
+  lambda df: utils.add_module(df, 'u_sram', 'u_b', 1.0),
+  lambda df: utils.make_dataset_complete(df),
+  lambda df: utils.plot_threshold(df, 'top', 0.2),
+  lambda df: utils.plot_threshold(df, 'u_missing', 0.2),
+  lambda df: utils.level_of_detail(df, 'top', 2),
+])
+def test_no_color_column(transform):
+  # The colors are assigned at plot time, the transforms do not add them
+  assert 'color' not in transform(TREE).columns
+
+
+def test_color_column_kept():
+  # Frames with colors keep them for the new components
+  df = utils.add_module(TREE.assign(color='#123456'), 'u_sram', 'u_b', 1.0)
+  assert df['color'].tolist() == ['#123456'] * 5 + ['blue']
+
+
+THRESHOLD_TREE = frame([('top', '', 100.0), ('u_a', 'top', 60.0), ('u_a1', 'u_a', 50.0), ('u_a2', 'u_a', 4.0),
+                        ('u_a2x', 'u_a2', 4.0), ('u_a3', 'u_a', 3.0), ('u_b', 'top', 30.0), ('u_b1', 'u_b', 28.0),
+                        ('u_b2', 'u_b', 2.0), ('u_c', 'top', 5.0), ('u_d', 'top', 5.0)])
+
+
+@pytest.mark.parametrize('top_module, threshold, rows', [
+  ('top', 0.1, [('top', '', 100.0), ('u_a', 'top', 60.0), ('u_a1', 'u_a', 50.0), ('u_b', 'top', 30.0), ('u_b1', 'u_b', 28.0),
+                ('top_others', 'top', 10.0), ('u_a_others', 'u_a', 7.0), ('u_b_others', 'u_b', 2.0)]),
+  ('u_a', 0.1, [('u_a', '', 60.0), ('u_a1', 'u_a', 50.0), ('u_a_others', 'u_a', 7.0)]),
+  ('u_a', 0, [('u_a', '', 60.0), ('u_a1', 'u_a', 50.0), ('u_a2', 'u_a', 4.0), ('u_a2x', 'u_a2', 4.0), ('u_a3', 'u_a', 3.0)]),
+])
+def test_plot_threshold(top_module, threshold, rows):
+  df = utils.plot_threshold(THRESHOLD_TREE, top_module, threshold)
+  assert list(df[['id', 'parent', 'value']].itertuples(index=False, name=None)) == rows
+  assert df.loc[df['id'].str.endswith('_others'), 'label'].eq('others').all()
+
+
+COLLAPSE_TREE = frame([('top', '', 10.0), ('u_w1_wrapper', 'top', 6.0), ('u_w2_wrapper', 'u_w1_wrapper', 5.0),
+                       ('u_x', 'u_w2_wrapper', 5.0), ('u_y', 'u_w1_wrapper', 1.0), ('u_dbg_0', 'top', 2.0),
+                       ('u_dbg_1', 'u_dbg_0', 1.0)])
+
+
+@pytest.mark.parametrize('patterns, match, rows', [
+  # Nested collapsed components move their children to the closest kept ancestor
+  (['wrapper'], 'substring', [('top', ''), ('u_x', 'top'), ('u_y', 'top'), ('u_dbg_0', 'top'), ('u_dbg_1', 'u_dbg_0')]),
+  (['WRAPPER', 'u_dbg_*'], 'glob', [('top', ''), ('u_w1_wrapper', 'top'), ('u_w2_wrapper', 'u_w1_wrapper'),
+                                    ('u_x', 'u_w2_wrapper'), ('u_y', 'u_w1_wrapper')]),
+  (['_w[0-9]_', 'dbg_0'], 'regex', [('top', ''), ('u_x', 'top'), ('u_y', 'top'), ('u_dbg_1', 'top')]),
+  # A collapsed top module leaves its children without parent
+  (['top', 'wrapper'], 'substring', [('u_x', ''), ('u_y', ''), ('u_dbg_0', ''), ('u_dbg_1', 'u_dbg_0')]),
+  ([], 'substring', list(COLLAPSE_TREE[['id', 'parent']].itertuples(index=False, name=None))),
+])
+def test_collapse_modules(patterns, match, rows):
+  df = utils.collapse_modules(COLLAPSE_TREE, patterns, match)
+  assert list(df[['id', 'parent']].itertuples(index=False, name=None)) == rows
+  # The area of the kept components is not changed
+  assert df['value'].tolist() == COLLAPSE_TREE.set_index('id').loc[df['id'], 'value'].tolist()
+
+
+def test_remove_wrappers_top():
+  df = utils.remove_wrappers(frame([('top_wrapper', '', 10.0), ('u_core_wrapper', 'top_wrapper', 6.0),
+                                    ('u_alu', 'u_core_wrapper', 5.0), ('u_dbg', 'top_wrapper', 4.0)]))
+  assert list(df[['id', 'parent']].itertuples(index=False, name=None)) == [('u_alu', ''), ('u_dbg', '')]
+
+
+DUPLICATES = frame([('top', '', 10.0), ('u_core', 'top', 5.0), ('u_alu', 'u_core', 3.0), ('u_fpu', 'u_core', 1.0),
+                    ('u_core', 'top', 4.0), ('u_alu', 'u_core', 3.0), ('u_dbg', 'top', 1.0)])
+RENAMED = [('top', ''), ('u_core_1', 'top'), ('u_alu_1', 'u_core_1'), ('u_fpu', 'u_core_1'), ('u_core_2', 'top'),
+           ('u_alu_2', 'u_core_2'), ('u_dbg', 'top')]
+
+
+@pytest.mark.parametrize('df', [
+  # Without paths, the parents are the closest preceding ancestors with the parent id
+  DUPLICATES,
+  DUPLICATES.assign(path=['top', 'u_core', 'u_core/u_alu', 'u_core/u_fpu', 'u_core_b', 'u_core_b/u_alu', 'u_dbg']),
+])
+def test_rename_duplicates(df):
+  renamed = utils.rename_duplicates(df, 'top')
+  assert list(renamed[['id', 'parent']].itertuples(index=False, name=None)) == RENAMED
+
+
+def test_rename_duplicates_child_named_as_parent():
+  # Only the paths tell a child named as its parent apart from a sibling of the parent
+  df = frame([('top', '', 3.0), ('u_alu', 'top', 2.0), ('u_alu', 'u_alu', 1.0)]).assign(path=['top', 'u_alu', 'u_alu/u_alu'])
+  renamed = utils.rename_duplicates(df, 'top')
+  assert list(renamed[['id', 'parent']].itertuples(index=False, name=None)) == [('top', ''), ('u_alu_1', 'top'), ('u_alu_2', 'u_alu_1')]
+  with pytest.raises(NameError):
+    utils.rename_duplicates(df, 'u_alu')
+
+
+COLORS = ['#000000', '#ff0000', '#00ff00cc']
+COLOR_TREE = frame([('top', '', 10.0), ('u_a', 'top', 6.0), ('u_a1', 'u_a', 5.0), ('u_a1x', 'u_a1', 5.0), ('u_b', 'top', 3.0),
+                    ('u_b1', 'u_b', 3.0), ('u_c', 'top', 1.0), ('out', '', 1.0)])
+
+
+@pytest.mark.parametrize('top_module, colors', [
+  # The children of the top module cycle over the colors, each level below is 30% more transparent
+  ('top', ['#000000', '#ff0000', '#ff0000b2', '#ff00007c', '#00ff00cc', '#00ff008e', '#000000', 'blue']),
+  # Components outside of the subtree of the top module keep their color
+  ('u_a', ['blue', '#000000', '#ff0000', '#ff0000b2', 'blue', 'blue', 'blue', 'blue']),
+])
+def test_assign_colors(top_module, colors):
+  assert utils.assign_colors(COLOR_TREE, top_module, COLORS)['color'].tolist() == colors